@@ -1,17 +1,34 @@
 from connexion import FlaskApp
+from connexion.jsonifier import Jsonifier
 from connexion.middleware import MiddlewarePosition
 from starlette.middleware.cors import CORSMiddleware
 import os
+from utils import instrumentation, serializer
+from utils.async_app import MIDDLEWARES, lifespan
+from utils.flask_app import BSONJSONProvider
+from utils.indexes import MONGODB_ENSURE_INDEXES, start_index_build
+from services.task_scheduler import TASK_RECONCILE_ON_START, scheduler
+from services.workflow_runner import DIFY_RECONCILE_ON_START, runner
+from utils.lazy_resolver import LazyResolver
+from utils.spec_cache import load_spec, prevalidated
 
 SWAGGER_PATH = os.environ["SWAGGER_PATH"]
-app = FlaskApp(__name__, specification_dir='.')
+# Responses are encoded in one pass by utils.serializer (orjson when installed)
+# Operations with an x-async-handler are served on the event loop (utils.async_app), the rest by Flask
+app = FlaskApp(__name__, specification_dir='.', jsonifier=Jsonifier(serializer),
+               middlewares=MIDDLEWARES, lifespan=lifespan)
+app.app.json = BSONJSONProvider(app.app)
+instrumentation.init_app(app.app)
 
 # Add static file serving for projects directory
 app.app.static_folder = 'projects'
 app.app.static_url_path = '/projects'
 
+# Parsed and validated once, then served from the spec cache until swagger.yml changes
+spec, _ = load_spec(os.path.join(os.path.dirname(os.path.abspath(__file__)), SWAGGER_PATH))
 # 🔧 Add a unique name to avoid blueprint conflict
-app.add_api(SWAGGER_PATH, name="main_api")
+with prevalidated():
+    app.add_api(spec, name="main_api", resolver=LazyResolver())
 
 # Add CORS middleware
 app.add_middleware(
@@ -23,5 +40,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Create missing MongoDB indexes without holding up startup
+if MONGODB_ENSURE_INDEXES:
+    start_index_build()
+
+# Requeue or fail task jobs left behind by a stopped worker process
+if TASK_RECONCILE_ON_START:
+    scheduler.start_reconciler()
+
+# Poll Dify for workflow executions whose stream died with a previous process
+if DIFY_RECONCILE_ON_START:
+    runner.start_reconciler()
+
+# Load the embedding model (or start the shared embedding worker) before the first import needs it
+if os.environ.get("EMBEDDING_PRELOAD", "true").lower() in ("1", "true", "yes"):
+    from services.embedding_service import embedding_service
+    embedding_service.preload()
+
 if __name__ == '__main__':
     app.run(host="0.0.0.0", port=5000)
@@ -1,10 +1,3 @@
 # Controllers package
-
-from . import ping
-from . import project
-from . import bug
-from . import config
-from . import document
-from . import scenario
-from . import task
-from . import workflow
\ No newline at end of file
+#
+# Controllers are imported by connexion (see utils.lazy_resolver) on first use.
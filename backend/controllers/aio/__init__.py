@@ -0,0 +1,5 @@
+# Async controllers
+#
+# Coroutine handlers for I/O-bound operations, named by the x-async-handler
+# extension in swagger.yml and served on the event loop by utils.async_app.
+# Each mirrors the sync controller of the same operation.
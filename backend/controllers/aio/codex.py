@@ -0,0 +1,34 @@
+from utils import return_status
+from utils.logger import logger
+from controllers.codex import _submission_status
+
+async def get_repos():
+    """GET /codex/repos - Get list of repositories from Codex"""
+    try:
+        from services.codex_service import CodexService
+        
+        repos = await CodexService().get_list_repos_async()
+        
+        return return_status(200, 'Success', {'repos': repos})
+    except Exception as e:
+        logger.error(f'Failed to get repos: {str(e)}')
+        return return_status(500, str(e))
+
+async def run_codex(body):
+    """POST /codex/run - Submit prompt to Codex with repo and environment"""
+    try:
+        from services.codex_service import CodexService
+        
+        prompt = body.get('prompt')
+        repo_label = body.get('repo_label')
+        environment_id = body.get('environment_id')
+        
+        if not (prompt and repo_label):
+            return return_status(400, 'prompt and repo_label are required')
+        
+        task_id = await CodexService().submit_prompt_async(prompt, repo_label)
+        return _submission_status(task_id, prompt, repo_label, environment_id)
+            
+    except Exception as e:
+        logger.error(f'Failed to run codex: {str(e)}')
+        return return_status(500, str(e))
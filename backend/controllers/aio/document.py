@@ -0,0 +1,14 @@
+from utils import return_status
+from utils import async_database
+from utils.logger import logger
+
+async def get_documents_by_workflow(workflow_id=None):
+    """List all documents for a given workflow_id."""
+    try:
+        if not workflow_id:
+            return return_status(400, "workflow_id is required")
+        docs = await async_database.get_documents_by_workflow(workflow_id)
+        return return_status(200, "Success", docs)
+    except Exception as e:
+        logger.error(f"Failed to get documents by workflow: {str(e)}")
+        return return_status(500, str(e))
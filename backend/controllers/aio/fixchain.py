@@ -0,0 +1,29 @@
+import asyncio
+from utils.common import return_status
+from utils import async_database
+from utils.logger import logger
+from controllers.fixchain import _bug_search_args
+
+async def search_similar_bugs(source_file=None, bug_type=None, query=None, bug_id=None, limit=10):
+    """Search for similar bugs."""
+    try:
+        filters, limit = _bug_search_args(source_file, bug_type, limit)
+        
+        if query or bug_id:
+            # k-NN search encodes the query on the CPU; keep it off the event loop
+            from services import fixchain
+            result = await asyncio.to_thread(fixchain.search_similar_bugs, filters, limit, query, bug_id)
+        else:
+            bugs = await async_database.find_bug_reports(filters, limit)
+            logger.info(f"[search_similar_bugs] Found {len(bugs)} similar bugs")
+            result = {
+                'bugs': bugs,
+                'total_found': len(bugs),
+                'filters_applied': filters
+            }
+        return return_status(200, "Similar bugs retrieved successfully", result)
+    except ValueError as e:
+        return return_status(400, str(e))
+    except Exception as e:
+        logger.error(f"Failed to search similar bugs: {str(e)}")
+        return return_status(500, str(e))
@@ -0,0 +1,51 @@
+from utils import return_status
+from utils import async_database
+from utils.logger import logger
+
+async def get_workflow(workflow_id=None):
+    try:
+        if not workflow_id:
+            return return_status(400, 'workflow_id is required')
+        wf = await async_database.get_workflow(workflow_id)
+        if not wf:
+            return return_status(404, 'Workflow not found')
+        return return_status(200, 'Success', wf)
+    except Exception as e:
+        logger.error(f'Failed to get workflow: {str(e)}')
+        return return_status(500, str(e))
+
+async def get_execution(execution_id=None):
+    try:
+        if not execution_id:
+            return return_status(400, 'execution_id is required')
+        execution = await async_database.get_workflow_execution(execution_id)
+        if execution:
+            return return_status(200, 'Success', execution)
+        else:
+            return return_status(404, 'Execution not found')
+    except Exception as e:
+        logger.error(f'Failed to get execution: {str(e)}')
+        return return_status(500, str(e))
+
+async def get_workflow_execution_detail(id=None):
+    try:
+        execution_id = id
+        if not execution_id:
+            return return_status(400, 'id (execution_id) is required')
+        execution = await async_database.get_workflow_execution(execution_id)
+        if not execution:
+            return return_status(404, 'Execution not found')
+        return return_status(200, 'Success', execution)
+    except Exception as e:
+        logger.error(f'Failed to get workflow execution detail: {str(e)}')
+        return return_status(500, str(e))
+
+async def list_workflow_executions_by_project(project_id=None):
+    try:
+        if not project_id:
+            return return_status(400, 'project_id is required')
+        executions = await async_database.get_workflow_executions(project_id)
+        return return_status(200, 'Success', executions)
+    except Exception as e:
+        logger.error(f'Failed to list workflow executions by project: {str(e)}')
+        return return_status(500, str(e))
@@ -0,0 +1,70 @@
+from flask import request, Response
+from utils.common import return_status
+from utils.logger import logger
+
+BLOB_CHUNK_SIZE = 64 * 1024
+
+
+def _stream(fileobj, start, length):
+    try:
+        fileobj.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = fileobj.read(min(BLOB_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        fileobj.close()
+
+
+def download():
+    """Stream a stored blob with ETag and single byte-range support."""
+    try:
+        from utils.blob_store import blob_store
+        blob_id = request.args.get('blob_id')
+        if not blob_id:
+            return return_status(400, "blob_id is required")
+
+        meta = blob_store.get_meta(blob_id)
+        if not meta:
+            return return_status(404, "Blob not found")
+
+        size = meta['size']
+        # Content-addressed, so the hash is a strong validator and the bytes never change
+        headers = {
+            'ETag': f'"{blob_id}"',
+            'Cache-Control': 'public, max-age=31536000, immutable',
+            'Accept-Ranges': 'bytes',
+            'X-Content-Type-Options': 'nosniff',
+            'Content-Security-Policy': "default-src 'none'; style-src 'unsafe-inline'; sandbox",
+        }
+        if request.if_none_match.contains(blob_id):
+            return Response(status=304, headers=headers)
+
+        start, end, status = 0, size, 200
+        byte_range = request.range
+        if byte_range is not None and request.if_range.etag in (None, blob_id):
+            bounds = byte_range.range_for_length(size)
+            if bounds is None:
+                headers['Content-Range'] = f'bytes */{size}'
+                return Response(status=416, headers=headers)
+            start, end = bounds
+            status = 206
+            headers['Content-Range'] = f'bytes {start}-{end - 1}/{size}'
+
+        headers['Content-Length'] = str(end - start)
+        fileobj = blob_store.open(blob_id)
+        return Response(
+            _stream(fileobj, start, end - start),
+            status=status,
+            headers=headers,
+            mimetype=meta.get('content_type', 'application/octet-stream'),
+            direct_passthrough=True,
+        )
+    except FileNotFoundError:
+        return return_status(404, "Blob content missing")
+    except Exception as e:
+        logger.error(f"Failed to download blob: {str(e)}")
+        return return_status(500, str(e))
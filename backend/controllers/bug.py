@@ -74,31 +74,80 @@ def create_bugs_batch():
         logger.error(f"Failed to create bugs batch: {str(e)}")
         return return_status(500, str(e))
 
+MAX_BUG_PAGE_SIZE = 500
+BUG_LIST_CONTROL_ARGS = ('project_id', 'limit', 'cursor', 'include_images', 'include_total')
+
+def _parse_bool_arg(name):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    return value.lower() in ('1', 'true', 'yes')
+
 def get_bugs():
-    """Get all bugs for a project with optional filters."""
+    """Get bugs for a project with optional filters and keyset pagination."""
     try:
         from services import bug
         project_id = request.args.get('project_id')
         if not project_id:
             return return_status(400, "project_id is required")
-        
-        # Optional filters
-        # filters = {
-        #     'status': request.args.get('status'),
-        #     'severity': request.args.get('severity'),
-        #     'task_id': request.args.get('task_id'),
-        #     'scenario_id': request.args.get('scenario_id')
-        # }
-        # Remove None values
-        # filters = {k: v for k, v in filters.items() if v is not None}
-        
 
-        bugs = bug.get_bugs(project_id, None)
+        limit = request.args.get('limit')
+        if limit is not None:
+            try:
+                limit = int(limit)
+            except ValueError:
+                return return_status(400, "limit must be a valid integer")
+            if limit <= 0 or limit > MAX_BUG_PAGE_SIZE:
+                return return_status(400, f"limit must be between 1 and {MAX_BUG_PAGE_SIZE}")
+        cursor = request.args.get('cursor') or None
+
+        # Every other query argument is a filter; the service rejects unknown ones
+        filters = {k: v for k, v in request.args.items() if k not in BUG_LIST_CONTROL_ARGS}
+
+        bugs = bug.get_bugs(
+            project_id,
+            filters,
+            limit=limit,
+            cursor=cursor,
+            include_images=bool(_parse_bool_arg('include_images')),
+            include_total=_parse_bool_arg('include_total'),
+        )
         return return_status(200, "Success", bugs)
+    except ValueError as e:
+        return return_status(400, str(e))
     except Exception as e:
         logger.error(f"Failed to get bugs: {str(e)}")
         return return_status(500, str(e))
 
+MAX_BATCH_BUG_IDS = 100
+RELATED_LIMIT_ARGS = {'fixes_limit': 'fixes', 'history_limit': 'history', 'executions_limit': 'executions'}
+
+def _parse_related_limit(values):
+    """Build the related_limit option from limit / <relation>_limit values."""
+    def positive_int(name, value):
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} must be a valid integer")
+        if value <= 0:
+            raise ValueError(f"{name} must be positive")
+        return value
+
+    default = values.get('limit')
+    default = positive_int('limit', default) if default is not None else None
+    related_limit = {relation: default for relation in RELATED_LIMIT_ARGS.values()}
+    for arg, relation in RELATED_LIMIT_ARGS.items():
+        if values.get(arg) is not None:
+            related_limit[relation] = positive_int(arg, values.get(arg))
+    return related_limit
+
+def _parse_exclude(value):
+    if not value:
+        return None
+    if isinstance(value, list):
+        return value
+    return [f.strip() for f in value.split(',') if f.strip()]
+
 def get_bug():
     """Get bug details by bug_id."""
     try:
@@ -107,15 +156,46 @@ def get_bug():
         if not bug_id:
             return return_status(400, "bug_id is required")
         
-        bug_detail = bug.get_bug(bug_id)
+        bug_detail = bug.get_bug(
+            bug_id,
+            related_limit=_parse_related_limit(request.args),
+            exclude_fields=_parse_exclude(request.args.get('exclude')),
+        )
         if not bug_detail:
             return return_status(404, "Bug not found")
         
         return return_status(200, "Success", bug_detail)
+    except ValueError as e:
+        return return_status(400, str(e))
     except Exception as e:
         logger.error(f"Failed to get bug: {str(e)}")
         return return_status(500, str(e))
 
+def get_bugs_batch():
+    """Get details for many bugs in one request (dashboard views)."""
+    try:
+        from services import bug
+        data = request.get_json() or {}
+        bug_ids = data.get('bug_ids')
+        if not isinstance(bug_ids, list) or not bug_ids:
+            return return_status(400, "bug_ids must be a non-empty array")
+        if len(bug_ids) > MAX_BATCH_BUG_IDS:
+            return return_status(400, f"Maximum {MAX_BATCH_BUG_IDS} bug_ids allowed")
+        if not all(isinstance(bug_id, str) for bug_id in bug_ids):
+            return return_status(400, "bug_ids must be strings")
+
+        bugs = bug.get_bugs_detail(
+            bug_ids,
+            related_limit=_parse_related_limit(data),
+            exclude_fields=_parse_exclude(data.get('exclude')),
+        )
+        return return_status(200, "Success", bugs)
+    except ValueError as e:
+        return return_status(400, str(e))
+    except Exception as e:
+        logger.error(f"Failed to get bugs batch: {str(e)}")
+        return return_status(500, str(e))
+
 def update_bug():
     """Update bug information."""
     try:
@@ -303,10 +383,13 @@ def get_bug_reports():
         # Optional filters for reports
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
-        group_by = request.args.get('group_by', 'status')  # status, severity, task, developer
+        group_by = request.args.get('group_by', 'status')  # status, severity
+        source = request.args.get('source', 'auto')  # auto, live, rollup
         
-        reports = bug.get_bug_reports(project_id, start_date, end_date, group_by)
+        reports = bug.get_bug_reports(project_id, start_date, end_date, group_by, source)
         return return_status(200, "Success", reports)
+    except ValueError as e:
+        return return_status(400, str(e))
     except Exception as e:
         logger.error(f"Failed to generate bug reports: {str(e)}")
         return return_status(500, str(e))
\ No newline at end of file
@@ -17,6 +17,20 @@ def get_repos():
         logger.error(f'Failed to get repos: {str(e)}')
         return return_status(500, str(e))
 
+def _submission_status(task_id, prompt, repo_label, environment_id):
+    """Response for a submitted prompt; shared with controllers.aio.codex"""
+    if task_id:
+        return return_status(200, 'Prompt submitted successfully', {
+            'task_id': task_id,
+            'prompt': prompt,
+            'repo_label': repo_label,
+            'environment_id': environment_id,
+            'status': 'submitted',
+            'created_at': datetime.now().isoformat()
+        })
+    else:
+        return return_status(500, 'Failed to submit prompt')
+
 def run_codex():
     """POST /codex/run - Submit prompt to Codex with repo and environment"""
     try:
@@ -34,18 +48,7 @@ def run_codex():
         
         # Submit the prompt
         task_id = codex_service.submit_prompt(prompt, repo_label)
-        
-        if task_id:
-            return return_status(200, 'Prompt submitted successfully', {
-                'task_id': task_id,
-                'prompt': prompt,
-                'repo_label': repo_label,
-                'environment_id': environment_id,
-                'status': 'submitted',
-                'created_at': datetime.now().isoformat()
-            })
-        else:
-            return return_status(500, 'Failed to submit prompt')
+        return _submission_status(task_id, prompt, repo_label, environment_id)
             
     except Exception as e:
         logger.error(f'Failed to run codex: {str(e)}')
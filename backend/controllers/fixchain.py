@@ -1,6 +1,34 @@
 from flask import request
 from utils.common import return_status
 from utils.logger import logger
+from utils.streaming import stream_format, stream_response
+
+MAX_EMBEDDING_BATCH_SIZE = 1024
+
+def _invalid_embedding_batch_size(options):
+    """Error message for a bad embedding_batch_size, or None."""
+    batch_size = options.get('embedding_batch_size')
+    if batch_size is None:
+        return None
+    if not isinstance(batch_size, int) or not (0 < batch_size <= MAX_EMBEDDING_BATCH_SIZE):
+        return f"embedding_batch_size must be between 1 and {MAX_EMBEDDING_BATCH_SIZE}"
+    return None
+
+def _bug_search_args(source_file, bug_type, limit):
+    """(filters, limit) for a bug search; raises ValueError for a bad limit."""
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise ValueError("limit must be a valid integer")
+    if limit <= 0 or limit > 100:
+        raise ValueError("limit must be between 1 and 100")
+    
+    filters = {}
+    if source_file:
+        filters['source_file'] = source_file
+    if bug_type:
+        filters['bug_type'] = bug_type
+    return filters, limit
 
 def import_bug():
     """Import bug data into SugoiApp collection."""
@@ -67,6 +95,10 @@ def import_bugs_batch():
                 if not bug_data.get(field):
                     return return_status(400, f"bugs[{i}].{field} is required")
         
+        error = _invalid_embedding_batch_size(data)
+        if error:
+            return return_status(400, error)
+        
         result = fixchain.import_bugs_batch(data)
         return return_status(200, "Bugs imported successfully", result)
     except Exception as e:
@@ -138,6 +170,10 @@ def import_vectordb_batch():
                 if not reasoning_data.get(field):
                     return return_status(400, f"reasoning_entries[{i}].{field} is required")
         
+        error = _invalid_embedding_batch_size(data)
+        if error:
+            return return_status(400, error)
+        
         result = fixchain.import_vectordb_batch(data)
         return return_status(200, "Reasoning entries imported successfully", result)
     except Exception as e:
@@ -205,12 +241,63 @@ def bulk_import():
         if not any(import_data.get(key) for key in ['bugs', 'reasoning_entries', 'sessions']):
             return return_status(400, "At least one of bugs, reasoning_entries, or sessions must be provided")
         
+        error = _invalid_embedding_batch_size(data.get('options') or {})
+        if error:
+            return return_status(400, error)
+        
         result = fixchain.bulk_import(data)
         return return_status(200, "Bulk import completed successfully", result)
     except Exception as e:
         logger.error(f"Failed to bulk import: {str(e)}")
         return return_status(500, str(e))
 
+def import_stream():
+    """Stream NDJSON records (bugs, reasoning, sessions) into FixChain, resumable by import_id."""
+    from services import fixchain
+    try:
+        try:
+            offset = int(request.args.get('offset', 0))
+            chunk_size = int(request.args.get('chunk_size', fixchain.STREAM_IMPORT_CHUNK_SIZE))
+            options = {}
+            if request.args.get('embedding_batch_size'):
+                options['embedding_batch_size'] = int(request.args['embedding_batch_size'])
+        except ValueError:
+            return return_status(400, "offset, chunk_size and embedding_batch_size must be valid integers")
+        
+        error = _invalid_embedding_batch_size(options)
+        if error:
+            return return_status(400, error)
+        generate_embeddings = request.args.get('generate_embeddings', 'true').lower() in ('1', 'true', 'yes')
+        
+        # request.stream yields the body line by line as it arrives
+        result = fixchain.import_stream(request.stream, request.args.get('import_id'), offset, chunk_size,
+                                        generate_embeddings, options.get('embedding_batch_size'))
+        return return_status(200, f"Import {result['status']}", result)
+    except fixchain.ImportInProgress as e:
+        return return_status(409, str(e))
+    except ValueError as e:
+        return return_status(400, str(e))
+    except Exception as e:
+        logger.error(f"Failed to stream import: {str(e)}")
+        return return_status(500, str(e))
+
+def get_import_status():
+    """Progress of a stream import, for resuming it."""
+    try:
+        from services import fixchain
+        
+        import_id = request.args.get('import_id')
+        if not import_id:
+            return return_status(400, "import_id parameter is required")
+        
+        result = fixchain.get_import_status(import_id)
+        if not result:
+            return return_status(404, f"Import {import_id} not found")
+        return return_status(200, "Import status retrieved successfully", result)
+    except Exception as e:
+        logger.error(f"Failed to get import status: {str(e)}")
+        return return_status(500, str(e))
+
 def search_similar_bugs():
     """Search for similar bugs."""
     try:
@@ -218,23 +305,15 @@ def search_similar_bugs():
         
         source_file = request.args.get('source_file')
         bug_type = request.args.get('bug_type')
+        query = request.args.get('query')
+        bug_id = request.args.get('bug_id')
         limit = request.args.get('limit', 10)
+        filters, limit = _bug_search_args(source_file, bug_type, limit)
         
-        try:
-            limit = int(limit)
-            if limit <= 0 or limit > 100:
-                return return_status(400, "limit must be between 1 and 100")
-        except ValueError:
-            return return_status(400, "limit must be a valid integer")
-        
-        filters = {}
-        if source_file:
-            filters['source_file'] = source_file
-        if bug_type:
-            filters['bug_type'] = bug_type
-        
-        result = fixchain.search_similar_bugs(filters, limit)
+        result = fixchain.search_similar_bugs(filters, limit, query, bug_id)
         return return_status(200, "Similar bugs retrieved successfully", result)
+    except ValueError as e:
+        return return_status(400, str(e))
     except Exception as e:
         logger.error(f"Failed to search similar bugs: {str(e)}")
         return return_status(500, str(e))
@@ -254,8 +333,15 @@ def get_reasoning_history():
         if test_name:
             filters['test_name'] = test_name
         
+        fmt = stream_format()
+        if fmt:
+            # Streams the reasoning_entries list itself; total_found is left out
+            return stream_response(fixchain.iter_reasoning_history(filters), fmt,
+                                   "Reasoning history retrieved successfully")
         result = fixchain.get_reasoning_history(filters)
         return return_status(200, "Reasoning history retrieved successfully", result)
+    except ValueError as e:
+        return return_status(400, str(e))
     except Exception as e:
         logger.error(f"Failed to get reasoning history: {str(e)}")
         return return_status(500, str(e))
@@ -272,14 +358,22 @@ def get_performance_analytics():
         if not source_file:
             return return_status(400, "source_file parameter is required")
         
+        try:
+            page = int(request.args.get('page', 1))
+            page_size = int(request.args.get('page_size', fixchain.PERFORMANCE_PAGE_SIZE))
+        except ValueError:
+            return return_status(400, "page and page_size must be valid integers")
+        
         filters = {'source_file': source_file}
         if from_date:
             filters['from_date'] = from_date
         if to_date:
             filters['to_date'] = to_date
         
-        result = fixchain.get_performance_analytics(filters)
+        result = fixchain.get_performance_analytics(filters, page, page_size, request.args.get('bucket'))
         return return_status(200, "Performance analytics retrieved successfully", result)
+    except ValueError as e:
+        return return_status(400, str(e))
     except Exception as e:
         logger.error(f"Failed to get performance analytics: {str(e)}")
         return return_status(500, str(e))
@@ -301,26 +395,62 @@ def add_reasoning():
 def search_reasoning():
     """Search for similar reasoning entries."""
     try:
+        from services import fixchain
         data = request.get_json()
-        if not data or 'query' not in data:
-            return return_status(400, "query is required")
+        if not data or not (data.get('query') or data.get('embedding')):
+            return return_status(400, "query or embedding is required")
         
-        # Mock implementation for now
-        results = []
+        k = data.get('k', 5)
+        if not isinstance(k, int) or k <= 0 or k > 100:
+            return return_status(400, "k must be between 1 and 100")
+        filter_criteria = data.get('filter_criteria') or {}
+        if not isinstance(filter_criteria, dict):
+            return return_status(400, "filter_criteria must be an object")
+        
+        results = fixchain.search_reasoning(data.get('query'), k, filter_criteria, data.get('embedding'))
         return return_status(200, "Search completed", results)
+    except ValueError as e:
+        return return_status(400, str(e))
     except Exception as e:
         logger.error(f"Failed to search reasoning: {str(e)}")
         return return_status(500, str(e))
 
+def hybrid_search_reasoning():
+    """Full-text plus vector search over reasoning entries, fused by reciprocal rank."""
+    try:
+        from services import fixchain
+        data = request.get_json()
+        if not data or not data.get('query'):
+            return return_status(400, "query is required")
+        
+        page = data.get('page', 1)
+        page_size = data.get('page_size', 10)
+        if not isinstance(page, int) or not isinstance(page_size, int):
+            return return_status(400, "page and page_size must be integers")
+        filter_criteria = data.get('filter_criteria') or {}
+        if not isinstance(filter_criteria, dict):
+            return return_status(400, "filter_criteria must be an object")
+        
+        results = fixchain.hybrid_search_reasoning(data['query'], page, page_size, filter_criteria,
+                                                   data.get('mode', 'hybrid'))
+        return return_status(200, "Search completed", results)
+    except ValueError as e:
+        return return_status(400, str(e))
+    except Exception as e:
+        logger.error(f"Failed to run hybrid reasoning search: {str(e)}")
+        return return_status(500, str(e))
+
 def get_stats():
     """Get RAG collection statistics."""
     try:
+        from services import fixchain
         # Mock implementation for now
         stats = {
             "total_documents": 0,
             "collection_name": "reasoning",
             "database_name": "fixchain",
-            "indexes": []
+            "indexes": [],
+            "embeddings": fixchain.get_embedding_stats()
         }
         return return_status(200, "Statistics retrieved", stats)
     except Exception as e:
@@ -330,10 +460,12 @@ def get_stats():
 def delete_reasoning(doc_id):
     """Delete a reasoning entry."""
     try:
+        from services import fixchain
         if not doc_id:
             return return_status(400, "doc_id is required")
         
-        # Mock implementation for now
+        if not fixchain.delete_reasoning(doc_id):
+            return return_status(404, "Entry not found")
         return return_status(200, "Entry deleted successfully", {"message": "Entry deleted"})
     except Exception as e:
         logger.error(f"Failed to delete reasoning: {str(e)}")
@@ -13,8 +13,47 @@ def health():
     """FixChain service health check endpoint."""
     logger.debug("Received health check request")
     from datetime import datetime
+    from utils.database import manager
     return {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
-        "rag_store_connected": True
-    }
\ No newline at end of file
+        "rag_store_connected": manager.ping() is not None
+    }
+
+def db_health():
+    """MongoDB connectivity and connection pool metrics for this worker."""
+    logger.debug("Received database health request")
+    from utils.mongo import manager, get_pool_stats
+    latency_ms = manager.ping()
+    body = {
+        "status": "healthy" if latency_ms is not None else "unavailable",
+        "ping_ms": latency_ms,
+        "pool": get_pool_stats()
+    }
+    return body, 200 if latency_ms is not None else 503
+
+def dify_health():
+    """Latency histograms of Dify API calls and metadata cache counters for this worker."""
+    logger.debug("Received Dify client stats request")
+    from services.dify_service import get_latency_stats, metadata_cache
+    return {"status": "ok", "latency": get_latency_stats(), "metadata_cache": metadata_cache.stats()}
+
+def task_health():
+    """Task scheduler slots, queue depth and browser pool counters for this worker."""
+    logger.debug("Received task scheduler stats request")
+    from services.task_scheduler import scheduler
+    return {"status": "ok", "scheduler": scheduler.stats()}, 200
+
+def metrics():
+    """Prometheus histograms of request, MongoDB and external call latency for this worker."""
+    logger.debug("Received metrics request")
+    from utils.metrics import render
+    return render(), 200
+
+def embedding_health():
+    """Readiness of the embedding model or shared embedding worker, plus encode/cache counters."""
+    logger.debug("Received embedding health request")
+    from services.embedding_service import embedding_service
+    status = embedding_service.status()
+    status["stats"] = embedding_service.stats()
+    return status, 200 if status["ready"] else 503
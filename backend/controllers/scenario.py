@@ -1,6 +1,7 @@
 from flask import request
 from utils import return_status
 from utils.logger import logger
+from utils.streaming import stream_format, stream_response
 from services.scenario import ScenarioService
 
 def save_scenarios():
@@ -43,8 +44,13 @@ def get_scenarios():
         project_id = request.args.get('project_id')
         if not project_id:
             return return_status(400, "project_id is required")
+        fmt = stream_format()
+        if fmt:
+            return stream_response(ScenarioService.iter_scenarios(project_id), fmt)
         scenarios = ScenarioService.get_scenarios(project_id)
         return return_status(200, "Success", scenarios)
+    except ValueError as e:
+        return return_status(400, str(e))
     except Exception as e:
         logger.error(f"Failed to get scenarios: {str(e)}")
         return return_status(500, str(e))
@@ -1,11 +1,38 @@
 from flask import request, send_file
 from utils import return_status
 from utils.logger import logger
+from utils.streaming import stream_format, stream_response
 from services import task
+from bson import ObjectId
 import os
 from pathlib import Path
 from datetime import datetime, timedelta
 
+MAX_PAGE_SIZE = 500
+# Task fields a listing may be narrowed to; test_scenarios are always joined in
+TASK_LIST_FIELDS = ('project_id', 'task_id', 'task_name', 'url', 'context', 'output', 'status',
+                    'created_at', 'updated_at')
+
+def _parse_list_args():
+    """Read optional fields/limit/cursor query args for task listing."""
+    fields = request.args.get('fields')
+    fields = [f.strip() for f in fields.split(',') if f.strip()] if fields else None
+    unknown = [f for f in fields or [] if f not in TASK_LIST_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown task field(s): {', '.join(unknown)}; allowed: {', '.join(TASK_LIST_FIELDS)}")
+    limit = request.args.get('limit')
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValueError("limit must be a valid integer")
+        if limit <= 0 or limit > MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    cursor = request.args.get('cursor')
+    if cursor and not ObjectId.is_valid(cursor):
+        raise ValueError("cursor is invalid")
+    return fields, limit, cursor
+
 def create():
     if request.method == "POST":
         try:
@@ -53,11 +80,30 @@ def ex_task():
                 return return_status(400, "Task ID is required")
             
             result = task.ex_task(data)
-            return return_status(200, "Success", result)
+            logger.info("Task %s queued as job %s", data['task_id'], result.get('job_id'))
+            return return_status(200, "Task execution queued", result)
         except Exception as e:
             return return_status(500, str(e))
     return return_status(405, "Method not allowed")
 
+def get_job():
+    """Get the status of a queued task execution."""
+    if request.method == "GET":
+        try:
+            job_id = request.args.get('job_id')
+            if not job_id:
+                logger.warning("Missing job_id in request")
+                return return_status(400, "Job ID is required")
+
+            job = task.get_job(job_id)
+            if not job:
+                return return_status(404, "Job not found")
+            return return_status(200, "Success", job)
+        except Exception as e:
+            logger.error("Error getting job %s: %s", job_id if 'job_id' in locals() else 'unknown', str(e))
+            return return_status(500, str(e))
+    return return_status(405, "Method not allowed")
+
 
 def get():
     if request.method == "GET":
@@ -67,9 +113,21 @@ def get():
                 logger.warning("Missing project_id in request")
                 return return_status(400, "Project ID is required")
 
+            try:
+                fields, limit, cursor = _parse_list_args()
+                fmt = stream_format()
+            except ValueError as e:
+                return return_status(400, str(e))
+
             logger.info("Getting tasks for project: %s", project_id)
-            result = task.get_all(project_id)
-            logger.info("Retrieved %d tasks for project %s", len(result) if result else 0, project_id)
+            if fmt and not (limit or cursor):
+                return stream_response(task.iter_all(project_id, fields), fmt)
+            if limit or cursor:
+                result = task.get_page(project_id, fields, limit or 50, cursor)
+                logger.info("Retrieved %d tasks for project %s", len(result["tasks"]), project_id)
+            else:
+                result = task.get_all(project_id, fields)
+                logger.info("Retrieved %d tasks for project %s", len(result) if result else 0, project_id)
             return return_status(200, "Success", result)
         except Exception as e:
             logger.error("Error getting tasks for project %s: %s",
@@ -85,9 +143,21 @@ def get_all():
                 logger.warning("Missing project_id in request")
                 return return_status(400, "Project ID is required")
             
+            try:
+                fields, limit, cursor = _parse_list_args()
+                fmt = stream_format()
+            except ValueError as e:
+                return return_status(400, str(e))
+
             logger.info("Getting tasks for project: %s", project_id)
-            result = task.get_all(project_id)
-            logger.info("Retrieved %d tasks for project %s", len(result) if result else 0, project_id)
+            if fmt and not (limit or cursor):
+                return stream_response(task.iter_all(project_id, fields), fmt)
+            if limit or cursor:
+                result = task.get_page(project_id, fields, limit or 50, cursor)
+                logger.info("Retrieved %d tasks for project %s", len(result["tasks"]), project_id)
+            else:
+                result = task.get_all(project_id, fields)
+                logger.info("Retrieved %d tasks for project %s", len(result) if result else 0, project_id)
             return return_status(200, "Success", result)
         except Exception as e:
             logger.error("Error getting tasks for project %s: %s", project_id if 'project_id' in locals() else 'unknown', str(e))
@@ -1,6 +1,7 @@
 from flask import request, jsonify
 from utils import return_status
 from utils.logger import logger
+from utils.streaming import stream_format, stream_response
 # from services import workflow  # Move this import inside each function
 # from services.workflow import (
 #     upload_file_to_dify, run_dify_workflow, get_dify_workflow_result,
@@ -72,8 +73,13 @@ def list_workflows():
     try:
         from services import workflow
         project_id = request.args.get('project_id')
+        fmt = stream_format()
+        if fmt:
+            return stream_response(workflow.iter_workflows(project_id), fmt)
         wfs = workflow.list_workflows(project_id)
         return return_status(200, 'Success', wfs)
+    except ValueError as e:
+        return return_status(400, str(e))
     except Exception as e:
         logger.error(f'Failed to list workflows: {str(e)}')
         return return_status(500, str(e))
@@ -82,8 +88,13 @@ def get_execution_history():
     try:
         from services import workflow
         workflow_id = request.args.get('workflow_id')
+        fmt = stream_format()
+        if fmt:
+            return stream_response(workflow.iter_execution_history(workflow_id), fmt)
         executions = workflow.get_execution_history(workflow_id)
         return return_status(200, 'Success', executions)
+    except ValueError as e:
+        return return_status(400, str(e))
     except Exception as e:
         logger.error(f'Failed to get execution history: {str(e)}')
         return return_status(500, str(e))
@@ -91,12 +102,11 @@ def get_execution_history():
 def get_execution():
     try:
         from services import workflow
-        from utils.database import get_connection, MONGODB_DATABASE
+        from utils.database import get_db
         execution_id = request.args.get('execution_id')
         if not execution_id:
             return return_status(400, 'execution_id is required')
-        client = get_connection()
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         execution = db.workflow_executions.find_one({'id': execution_id})
         if execution:
             execution.pop('_id', None)
@@ -167,21 +177,18 @@ def run_dify_workflow_controller():
         response_mode = data.get('response_mode', 'blocking')
         if not (project_id and workflow_id and inputs):
             return return_status(400, 'project_id, workflow_id, and inputs are required')
+        # Returns as soon as the run is queued; progress is written to the execution record
         result = run_dify_workflow_async(project_id, workflow_id, inputs, user=user, response_mode=response_mode)
-        
-        # Check if scenarios were auto-saved
-        scenarios_saved = False
-        if (result.get('dify_response', {}).get('data', {}).get('status') == 'succeeded' and 
-            result.get('dify_response', {}).get('data', {}).get('outputs', {}).get('structured_output')):
-            scenarios_saved = True
-        
         return jsonify({
             'status': 200,
-            'message': 'Dify workflow run successful',
+            'message': 'Dify workflow run queued',
             'dify_response': result.get('dify_response'),
             'execution_id': result.get('execution_id'),
-            'scenarios_saved': scenarios_saved
+            'execution_status': result.get('status'),
+            'scenarios_saved': False
         })
+    except ValueError as e:
+        return return_status(404, str(e))
     except Exception as e:
         logger.error(f'Failed to run Dify workflow: {str(e)}')
         return return_status(500, str(e)) 
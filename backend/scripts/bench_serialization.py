@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Serialization Micro-benchmark
+
+Times the old response path (recursive serialize_value copy, then
+json.dumps with indent=2 as connexion's default jsonifier did) against
+utils.serializer on generated documents shaped like the task, bug and
+scenario collections. No database is needed.
+
+Usage:
+    python scripts/bench_serialization.py [--documents N] [--repeat N]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+# Add the parent directory to the path to import utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+from utils import serializer
+
+
+def legacy_serialize(value):
+    """serialize_value as it was before utils.serializer."""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return {k: legacy_serialize(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [legacy_serialize(v) for v in value]
+    return value
+
+
+def legacy_dumps(value):
+    return json.dumps(legacy_serialize(value), indent=2)
+
+
+def task_document(i, now):
+    project_id = ObjectId()
+    return {
+        '_id': ObjectId(),
+        'project_id': project_id,
+        'name': f'Checkout flow {i}',
+        'description': 'Verify that a signed-in user can pay for the items in the cart. ' * 3,
+        'status': 'completed',
+        'created_at': now - timedelta(days=i % 30),
+        'updated_at': now,
+        'test_cases': [
+            {
+                '_id': ObjectId(),
+                'name': f'Case {j}',
+                'steps': [{'order': k, 'action': 'click', 'target': f'#button-{k}', 'value': None}
+                          for k in range(6)],
+                'expected_result': 'The order confirmation page is shown',
+                'status': 'passed' if j % 3 else 'failed',
+                'duration_ms': 1200 + j * 37,
+                'executed_at': now - timedelta(minutes=j),
+            }
+            for j in range(8)
+        ],
+    }
+
+
+def bug_document(i, now):
+    return {
+        '_id': ObjectId(),
+        'bug_id': f'BUG-{i:05d}',
+        'project_id': ObjectId(),
+        'task_id': ObjectId(),
+        'title': 'Payment button stays disabled after entering a valid card',
+        'description': 'Steps to reproduce are attached. ' * 10,
+        'severity': ('low', 'medium', 'high', 'critical')[i % 4],
+        'status': 'open',
+        'tags': ['checkout', 'payments', 'ui'],
+        'screenshots': [{'blob_id': ObjectId(), 'content_type': 'image/png'} for _ in range(2)],
+        'fixes': [{'fixed_by': 'qa', 'fixed_at': now, 'note': 'Validated the card form on blur'}],
+        'created_at': now - timedelta(hours=i),
+        'updated_at': now,
+    }
+
+
+def scenario_document(i, now):
+    return {
+        '_id': ObjectId(),
+        'scenario_id': f'scn-{i}',
+        'project_id': ObjectId(),
+        'title': f'Guest checkout scenario {i}',
+        'preconditions': ['Cart has at least one item', 'User is not signed in'],
+        'test_cases': [
+            {
+                'id': f'tc-{i}-{j}',
+                'title': f'Guest pays with saved card {j}',
+                'steps': [f'Step {k}: fill in field {k}' for k in range(10)],
+                'priority': 'P1',
+                'created_at': now,
+            }
+            for j in range(5)
+        ],
+        'metadata': {'source': 'import', 'version': 3, 'generated_at': now},
+        'created_at': now,
+        'updated_at': now,
+    }
+
+
+def bench(label, function, value, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(value)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the old and new JSON response paths")
+    parser.add_argument('--documents', type=int, default=1000, help="Documents per collection")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per measurement; the best is reported")
+    args = parser.parse_args()
+
+    now = datetime.now(timezone.utc)
+    builders = {'tasks': task_document, 'bugs': bug_document, 'scenarios': scenario_document}
+    print(f"JSON backend: {'orjson' if serializer.USE_ORJSON else 'json'}, {args.documents} documents per collection")
+    print(f"{'collection':<12}{'legacy ms':>12}{'serializer ms':>16}{'to_jsonable ms':>16}{'speedup':>10}")
+    for name, build in builders.items():
+        response = {'status_code': 'Success', 'status': 200, 'message': 'Success',
+                    'result': [build(i, now) for i in range(args.documents)]}
+        if json.loads(legacy_dumps(response)) != json.loads(serializer.dumps(response)):
+            print(f"{name}: output differs from the legacy path")
+            return False
+        legacy = bench('legacy', legacy_dumps, response, args.repeat)
+        fast = bench('serializer', serializer.dumps, response, args.repeat)
+        jsonable = bench('to_jsonable', serializer.to_jsonable, response, args.repeat)
+        print(f"{name:<12}{legacy * 1000:>12.1f}{fast * 1000:>16.1f}{jsonable * 1000:>16.1f}{legacy / fast:>9.1f}x")
+    return True
+
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Worker Start-up Benchmark
+
+Starts the app in fresh interpreters under `python -X importtime` and
+reports how long `import app` takes, how long the first request
+(GET /api/ping, which builds connexion's middleware stack) takes on top,
+which heavy dependencies were imported by then, and the modules with the
+largest cumulative import time.
+
+Index creation and the embedding preload are switched off so the numbers
+only cover imports and API set-up; MongoDB is not contacted.
+
+Usage:
+    python scripts/bench_startup.py [--runs N] [--top N] [--compare] [--profile PATH]
+
+--compare also runs with the spec cache and lazy controllers disabled.
+--profile writes the raw -X importtime output of the last run.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that should not be imported before they are needed
+HEAVY_MODULES = ('lavague', 'selenium', 'sentence_transformers', 'torch', 'numpy', 'services.fixchain')
+
+CHILD = r"""
+import asyncio, json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+
+async def first_request():
+    scope = {'type': 'http', 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+             'path': '/api/ping', 'raw_path': b'/api/ping', 'root_path': '', 'query_string': b'',
+             'headers': [], 'server': ('bench', 80), 'client': ('127.0.0.1', 0)}
+    status = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    await app.app(scope, receive, send)
+    return status[0] if status else None
+
+status = asyncio.run(first_request())
+ready = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'first_request_ms': (ready - imported) * 1000,
+    'status': status,
+    'loaded': [m for m in HEAVY_MODULES if m in sys.modules],
+}))
+"""
+
+
+def run_once(env):
+    child = f"HEAVY_MODULES = {HEAVY_MODULES!r}\n{CHILD}"
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', child], cwd=BACKEND_DIR, env=env,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"App failed to start:\n{proc.stderr[-4000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    return result, proc.stderr
+
+
+def parse_importtime(stderr):
+    """(module, self us, cumulative us) for each line of -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((name.rstrip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def bench(label, env, runs, top, profile):
+    results, stderr = [], ''
+    for _ in range(runs):
+        result, stderr = run_once(env)
+        results.append(result)
+    import_ms = statistics.median(r['import_ms'] for r in results)
+    request_ms = statistics.median(r['first_request_ms'] for r in results)
+    print(f"\n{label}")
+    print(f"  import app:       {import_ms:8.1f} ms")
+    print(f"  first request:    {request_ms:8.1f} ms (status {results[-1]['status']})")
+    print(f"  start to ready:   {import_ms + request_ms:8.1f} ms (median of {runs})")
+    print(f"  heavy modules:    {', '.join(results[-1]['loaded']) or 'none'}")
+    print(f"  top {top} by cumulative import time:")
+    for name, _, cumulative_us in sorted(parse_importtime(stderr), key=lambda row: -row[2])[:top]:
+        print(f"    {cumulative_us / 1000:8.1f} ms  {name}")
+    if profile:
+        with open(profile, 'w') as f:
+            f.write(stderr)
+        print(f"  importtime profile written to {profile}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure backend worker start-up time")
+    parser.add_argument('--runs', type=int, default=5, help="Fresh interpreters per configuration")
+    parser.add_argument('--top', type=int, default=15, help="Modules to list by cumulative import time")
+    parser.add_argument('--compare', action='store_true', help="Also run without the spec cache and lazy controllers")
+    parser.add_argument('--profile', help="Write the raw -X importtime output of the last run here")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault('SWAGGER_PATH', 'swagger/swagger.yml')
+    env.update(MONGODB_ENSURE_INDEXES='false', EMBEDDING_PRELOAD='false', ACCESS_LOG_ENABLED='false')
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [BACKEND_DIR, env.get('PYTHONPATH')]))
+
+    # Warm the spec cache and bytecode so every run measures a normal restart
+    run_once(env)
+    bench("Default (spec cache, lazy controllers)", env, args.runs, args.top, args.profile)
+    if args.compare:
+        eager = dict(env, SWAGGER_CACHE_ENABLED='false', LAZY_CONTROLLERS='false')
+        bench("SWAGGER_CACHE_ENABLED=false LAZY_CONTROLLERS=false", eager, args.runs, args.top, None)
+
+
+if __name__ == '__main__':
+    main()
@@ -15,7 +15,7 @@ from datetime import datetime
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 try:
-    from pymongo import MongoClient, ASCENDING, TEXT
+    from pymongo import MongoClient
 except ImportError:
     print("Error: pymongo not installed. Please run: pip install pymongo")
     sys.exit(1)
@@ -38,44 +38,17 @@ def get_mongo_client():
         return None
 
 def create_indexes(client):
-    """Create necessary indexes for FixChain collections"""
+    """Create necessary indexes for FixChain collections (defined in utils.indexes)"""
+    from utils.indexes import FIXCHAIN_COLLECTIONS, ensure_indexes
+
     print("\n🔧 Creating database indexes...")
-    
-    # SugoiApp database indexes
-    sugoi_db = client[SUGOI_DATABASE]
-    
-    # Bug reports collection indexes
-    bug_reports = sugoi_db['bug_reports']
-    bug_reports.create_index([('source_file', ASCENDING)])
-    bug_reports.create_index([('bug_type', ASCENDING)])
-    bug_reports.create_index([('severity', ASCENDING)])
-    bug_reports.create_index([('status', ASCENDING)])
-    bug_reports.create_index([('created_at', ASCENDING)])
-    bug_reports.create_index([('source_file', ASCENDING), ('bug_type', ASCENDING)])
-    print("  ✅ Created indexes for bug_reports collection")
-    
-    # Execution sessions collection indexes
-    execution_sessions = sugoi_db['execution_sessions']
-    execution_sessions.create_index([('source_file', ASCENDING)])
-    execution_sessions.create_index([('session_number', ASCENDING)])
-    execution_sessions.create_index([('start_time', ASCENDING)])
-    execution_sessions.create_index([('overall_status', ASCENDING)])
-    execution_sessions.create_index([('source_file', ASCENDING), ('session_number', ASCENDING)])
-    print("  ✅ Created indexes for execution_sessions collection")
-    
-    # FixChainRAG database indexes
-    rag_db = client[FIXCHAIN_RAG_DATABASE]
-    
-    # Test reasoning collection indexes
-    test_reasoning = rag_db['test_reasoning']
-    test_reasoning.create_index([('test_name', ASCENDING)])
-    test_reasoning.create_index([('source_file', ASCENDING)])
-    test_reasoning.create_index([('status', ASCENDING)])
-    test_reasoning.create_index([('created_at', ASCENDING)])
-    test_reasoning.create_index([('test_name', ASCENDING), ('attempt_id', ASCENDING)])
-    # Text index for full-text search
-    test_reasoning.create_index([('summary', TEXT), ('output', TEXT)])
-    print("  ✅ Created indexes for test_reasoning collection")
+    result = ensure_indexes(client, FIXCHAIN_COLLECTIONS)
+    for name in result['created']:
+        print(f"  ✅ Created index {name}")
+    for failure in result['failed']:
+        print(f"  ❌ {failure}")
+    if result['failed']:
+        raise RuntimeError(f"{len(result['failed'])} indexes could not be created")
     
     print("\n✅ All indexes created successfully!")
 
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Async Handler Load Test
+
+Starts one single-worker uvicorn server with the async handlers enabled
+and one with ASYNC_HANDLERS=false (every request through Flask's WSGI
+thread pool), drives the same endpoint at increasing concurrency and
+reports throughput, latency percentiles and errors for each.
+
+By default the endpoint is GET /api/codex/repos against a mock Codex API
+started by this script, which answers after --upstream-latency seconds,
+so the numbers show how many requests waiting on I/O a worker can hold
+open. Any other GET endpoint can be given with --path; endpoints that
+read MongoDB use MONGODB_URL from the environment.
+
+Usage:
+    python scripts/load_test_async.py [--path PATH] [--concurrency 10,50,200]
+                                      [--duration SECONDS] [--upstream-latency SECONDS]
+                                      [--modes async,sync] [--port PORT]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {'async': 'true', 'sync': 'false'}
+
+
+def start_mock_codex(latency):
+    """Serve GET /api/codex/repositories after `latency` seconds; returns the server."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True  # Headers and body are separate writes on a kept-alive socket
+
+        def do_GET(self):
+            time.sleep(latency)
+            body = json.dumps({'success': True, 'repositories': ['bye-bug-codex-hub']}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 1024  # The default backlog of 5 drops connections under load
+
+    server = Server(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_server(mode, port, codex_url):
+    env = dict(os.environ)
+    env.setdefault('SWAGGER_PATH', 'swagger/swagger.yml')
+    env.update(ASYNC_HANDLERS=MODES[mode], CODEX_API_BASE_URL=codex_url, MONGODB_ENSURE_INDEXES='false',
+               EMBEDDING_PRELOAD='false', ACCESS_LOG_ENABLED='false')
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [BACKEND_DIR, env.get('PYTHONPATH')]))
+    proc = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'app:app', '--port', str(port), '--workers', '1',
+                             '--log-level', 'warning'], cwd=BACKEND_DIR, env=env)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Server for {mode} exited with code {proc.returncode}")
+        try:
+            if httpx.get(f'http://127.0.0.1:{port}/api/ping', timeout=1).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError(f"Server for {mode} did not become ready")
+
+
+async def drive(url, concurrency, duration):
+    """Keep `concurrency` requests in flight for `duration` seconds."""
+    latencies, errors = [], 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        deadline = time.perf_counter() + duration
+
+        async def user():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(url)
+                    ok = response.status_code == 200 and response.json().get('status') == 200
+                except (httpx.HTTPError, ValueError):
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return latencies, errors, elapsed
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare async and sync request capacity of one worker")
+    parser.add_argument('--path', default='/api/codex/repos', help="GET endpoint to load, with its query string")
+    parser.add_argument('--concurrency', default='10,50,200', help="Comma-separated concurrent request levels")
+    parser.add_argument('--duration', type=float, default=10, help="Seconds per concurrency level")
+    parser.add_argument('--upstream-latency', type=float, default=0.2, help="Mock Codex API response delay")
+    parser.add_argument('--modes', default='async,sync', help="Comma-separated modes to run: async, sync")
+    parser.add_argument('--port', type=int, default=5055, help="Port for the server under test")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.concurrency.split(',')]
+    modes = [mode.strip() for mode in args.modes.split(',')]
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        parser.error(f"unknown mode(s): {', '.join(unknown)}")
+
+    codex = start_mock_codex(args.upstream_latency)
+    codex_url = f'http://127.0.0.1:{codex.server_port}/api/codex'
+    print(f"GET {args.path}, {args.duration:g}s per level, mock Codex latency {args.upstream_latency * 1000:.0f} ms")
+    print(f"\n{'mode':<6} {'conc':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    try:
+        for mode in modes:
+            proc = start_server(mode, args.port, codex_url)
+            try:
+                url = f'http://127.0.0.1:{args.port}{args.path}'
+                asyncio.run(drive(url, 2, 1))  # Warm up connections and imports
+                for level in levels:
+                    latencies, errors, elapsed = asyncio.run(drive(url, level, args.duration))
+                    print(f"{mode:<6} {level:>5} {len(latencies) / elapsed:>8.1f} "
+                          f"{statistics.median(latencies) * 1000 if latencies else float('nan'):>8.1f} "
+                          f"{percentile(latencies, 0.95) * 1000:>8.1f} {percentile(latencies, 0.99) * 1000:>8.1f} "
+                          f"{errors:>7}")
+            finally:
+                proc.terminate()
+                proc.wait(timeout=30)
+    finally:
+        codex.shutdown()
+
+
+if __name__ == '__main__':
+    main()
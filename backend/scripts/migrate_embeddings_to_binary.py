@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Embedding Storage Migration Script
+
+Rewrites embeddings stored as BSON arrays of doubles into the compact
+BinData format of utils.vector_codec, and records the model, dimensions
+and dtype next to each vector. Only array-valued vectors are touched, so
+the script can be re-run safely; vectors already in BinData are skipped
+unless --dtype asks for a different storage dtype (use --recode).
+
+Rewritten documents shrink, but WiredTiger keeps the freed pages in its
+data files. --compact runs MongoDB's compact command on every migrated
+collection afterwards to return that space to the OS. compact blocks
+writes to the collection while it runs (and on older servers the whole
+database) and can take minutes on large collections, so only use it in a
+maintenance window; without it the space is reused by later writes.
+
+Usage:
+    python scripts/migrate_embeddings_to_binary.py [--dry-run] [--batch-size N]
+        [--dtype float32|float16|int8] [--recode] [--compact]
+"""
+
+import argparse
+import os
+import sys
+
+# Add the parent directory to the path to import utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bson
+from pymongo import UpdateOne
+from utils.mongo import get_db, get_rag_db
+from utils.vector_codec import encode_vector, decode_vector, vector_dtype, VECTOR_STORAGE_DTYPE
+from services.embedding_service import EMBEDDING_MODEL_NAME
+
+# (database getter, collection, vector field, fixed dtype or None for --dtype, records embedding_* fields)
+COLLECTIONS = [
+    (get_rag_db, 'test_reasoning', 'embedding', None, True),
+    (get_db, 'bug_reports', 'embedding', None, True),
+    # The embedding cache keeps float32 so cache hits match a fresh encode
+    (get_rag_db, 'embedding_cache', 'vector', 'float32', False),
+]
+
+
+def field_size(value):
+    """Encoded BSON size of a value stored under a one-letter key."""
+    return len(bson.encode({'v': value}))
+
+
+def migrate_collection(collection, field, dtype, with_metadata, batch_size, dry_run, recode):
+    """Migrate one collection; returns (documents migrated, bytes before, bytes after, failures)."""
+    query = {field: {'$type': 'binData' if recode else 'array'}}
+    migrated = bytes_before = bytes_after = failures = 0
+    updates = []
+
+    cursor = collection.find(query, {field: 1, 'embedding_model': 1}).batch_size(batch_size)
+    for doc in cursor:
+        stored = doc[field]
+        if recode and vector_dtype(stored) == dtype:
+            continue
+        try:
+            vector = decode_vector(stored)
+            encoded = encode_vector(vector, dtype)
+        except (ValueError, TypeError) as e:
+            failures += 1
+            print(f"  ! {collection.name} {doc['_id']}: {e}")
+            continue
+        changes = {field: encoded}
+        if with_metadata:
+            changes.update({
+                'embedding_dimensions': int(vector.size),
+                'embedding_dtype': dtype,
+                'embedding_model': doc.get('embedding_model') or EMBEDDING_MODEL_NAME,
+            })
+        bytes_before += field_size(stored)
+        bytes_after += field_size(encoded)
+        migrated += 1
+        # Match the old value so a concurrent rewrite of the vector is not clobbered
+        updates.append(UpdateOne({'_id': doc['_id'], field: stored}, {'$set': changes}))
+        if len(updates) >= batch_size:
+            if not dry_run:
+                collection.bulk_write(updates, ordered=False)
+            updates = []
+            print(f"  {collection.name}: {migrated} documents processed")
+    if updates and not dry_run:
+        collection.bulk_write(updates, ordered=False)
+    return migrated, bytes_before, bytes_after, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Store embeddings as compact binary vectors")
+    parser.add_argument('--dry-run', action='store_true', help="Report the savings without changing documents")
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--dtype', choices=['float32', 'float16', 'int8'], default=VECTOR_STORAGE_DTYPE)
+    parser.add_argument('--recode', action='store_true', help="Re-encode binary vectors stored with another dtype")
+    parser.add_argument('--compact', action='store_true',
+                        help="Run compact on migrated collections to release disk space (blocks writes)")
+    args = parser.parse_args()
+
+    print(f"Vector storage dtype: {args.dtype}{' (dry run)' if args.dry_run else ''}")
+    total_failures = 0
+    for get_database, name, field, fixed_dtype, with_metadata in COLLECTIONS:
+        dtype = fixed_dtype or args.dtype
+        if args.recode and fixed_dtype:
+            continue
+        db = get_database()
+        migrated, before, after, failures = migrate_collection(
+            db[name], field, dtype, with_metadata, args.batch_size, args.dry_run, args.recode
+        )
+        total_failures += failures
+        ratio = f", {before / after:.1f}x smaller" if after else ""
+        print(f"{name}: {migrated} documents, {before} -> {after} vector bytes{ratio}, {failures} failures")
+        if args.compact and migrated and not args.dry_run:
+            # Reclaim the space freed by the array payloads
+            try:
+                db.command('compact', name)
+            except Exception as e:
+                print(f"compact {name} skipped: {e}")
+    return total_failures == 0
+
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
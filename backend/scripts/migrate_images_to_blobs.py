@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Bug Image Migration Script
+
+Moves base64 images embedded in bugs and bug_fixes documents into the
+content-addressed blob store and replaces them with blob references.
+Documents that already hold references are left untouched, so the script
+can be re-run safely. Legacy http(s) image URLs are kept as they are.
+
+--compact runs MongoDB's compact command on each collection afterwards to
+return the space freed by the base64 payloads to the OS. compact blocks
+writes to the collection while it runs (and on older servers the whole
+database), so only use it in a maintenance window.
+
+Usage:
+    python scripts/migrate_images_to_blobs.py [--dry-run] [--batch-size N] [--compact]
+"""
+
+import argparse
+import os
+import sys
+
+# Add the parent directory to the path to import utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.mongo import get_db
+from utils.blob_store import store_images, BLOB_STORE_BACKEND
+
+COLLECTIONS = {
+    'bugs': 'bug_id',
+    'bug_fixes': 'fix_id',
+}
+
+
+def migrate_collection(db, name, key_field, batch_size, dry_run):
+    """Migrate one collection; returns (documents migrated, images moved, failures)."""
+    collection = db[name]
+    # Only documents with at least one inline base64 image
+    query = {'images': {'$elemMatch': {'$regex': '^data:'}}}
+    migrated = images_moved = failures = 0
+
+    cursor = collection.find(query, {'_id': 1, key_field: 1, 'images': 1}).batch_size(batch_size)
+    for doc in cursor:
+        try:
+            refs = None if dry_run else store_images(doc['images'])
+        except ValueError as e:
+            failures += 1
+            print(f"  ! {name} {doc.get(key_field)}: {e}")
+            continue
+        inline = sum(1 for img in doc['images'] if isinstance(img, str) and img.startswith('data:'))
+        if not dry_run:
+            collection.update_one({'_id': doc['_id'], 'images': doc['images']}, {'$set': {'images': refs}})
+        migrated += 1
+        images_moved += inline
+        if migrated % batch_size == 0:
+            print(f"  {name}: {migrated} documents processed")
+    return migrated, images_moved, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move embedded bug/fix images into the blob store")
+    parser.add_argument('--dry-run', action='store_true', help="Count affected documents without changing them")
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--compact', action='store_true',
+                        help="Run compact on the collections afterwards to release disk space (blocks writes)")
+    args = parser.parse_args()
+
+    print(f"Blob store backend: {BLOB_STORE_BACKEND}{' (dry run)' if args.dry_run else ''}")
+    db = get_db()
+    total_failures = 0
+    for name, key_field in COLLECTIONS.items():
+        migrated, images_moved, failures = migrate_collection(
+            db, name, key_field, args.batch_size, args.dry_run
+        )
+        total_failures += failures
+        print(f"{name}: {migrated} documents, {images_moved} images, {failures} failures")
+
+    if args.compact and not args.dry_run:
+        # Reclaim the space freed by the removed base64 payloads
+        for name in COLLECTIONS:
+            try:
+                db.command('compact', name)
+            except Exception as e:
+                print(f"compact {name} skipped: {e}")
+    return total_failures == 0
+
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Mock Dify API Server
+
+A small local stand-in for the Dify workflow API, for exercising the
+backend without a Dify instance:
+- GET  /v1/info, /v1/site, /v1/parameters, /v1/workflows/logs
+- GET  /v1/workflows/run/<workflow_run_id>
+- POST /v1/files/upload
+- POST /v1/workflows/run (blocking or streaming SSE)
+
+Point the backend at it with DIFY_BASE_URL_LOCAL=http://localhost:5005/v1
+and a workflow in LOCAL mode. --fail-rate injects 503/429 responses to
+exercise client retries, --latency adds a fixed delay to every request.
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+NODES = [
+    ("start", "start", "Start"),
+    ("llm", "llm", "Generate test scenarios"),
+    ("end", "end", "End"),
+]
+
+STRUCTURED_OUTPUT = {
+    "test_scenarios": [
+        {
+            "scenario_name": "Login with valid credentials",
+            "description": "User signs in with a registered account",
+            "test_cases": [
+                {"test_case_name": "Valid login", "steps": ["Open login page", "Submit valid credentials"]}
+            ],
+        }
+    ]
+}
+
+runs = {}
+runs_lock = threading.Lock()
+
+
+class MockDifyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    fail_rate = 0.0
+    latency = 0.0
+    node_delay = 0.2
+
+    def log_message(self, format, *args):
+        sys.stderr.write("[mock-dify] %s\n" % (format % args))
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _preflight(self):
+        """Apply artificial latency and failures; returns False if a failure was sent."""
+        if self.latency:
+            time.sleep(self.latency)
+        if not self.headers.get("Authorization", "").startswith("Bearer "):
+            self._send_json(401, {"code": "unauthorized", "message": "Missing API key"})
+            return False
+        if self.fail_rate and random.random() < self.fail_rate:
+            status = random.choice((429, 503))
+            self.send_response(status)
+            self.send_header("Content-Length", "0")
+            if status == 429:
+                self.send_header("Retry-After", "0")
+            self.end_headers()
+            return False
+        return True
+
+    def do_GET(self):
+        self._read_body()
+        if not self._preflight():
+            return
+        path = self.path.split("?", 1)[0]
+        if path == "/v1/info":
+            self._send_json(200, {"name": "Mock workflow", "description": "Local mock Dify app", "tags": []})
+        elif path == "/v1/site":
+            self._send_json(200, {"title": "Mock workflow", "icon": None, "description": "Local mock Dify app"})
+        elif path == "/v1/parameters":
+            self._send_json(200, {
+                "user_input_form": [
+                    {"text-input": {"variable": "requirement", "label": "Requirement", "required": True}},
+                    {"file": {"variable": "document", "label": "Document", "required": False,
+                              "allowed_file_types": ["document"]}},
+                ]
+            })
+        elif path == "/v1/workflows/logs":
+            with runs_lock:
+                data = list(runs.values())
+            self._send_json(200, {"page": 1, "limit": 20, "total": len(data), "has_more": False, "data": data})
+        elif path.startswith("/v1/workflows/run/"):
+            with runs_lock:
+                run = runs.get(path.rsplit("/", 1)[-1])
+            if run:
+                self._send_json(200, run)
+            else:
+                self._send_json(404, {"code": "not_found", "message": "Workflow run not found"})
+        else:
+            self._send_json(404, {"code": "not_found", "message": path})
+
+    def do_POST(self):
+        body = self._read_body()
+        if not self._preflight():
+            return
+        path = self.path.split("?", 1)[0]
+        if path == "/v1/files/upload":
+            self._send_json(201, {"id": str(uuid.uuid4()), "size": len(body), "created_at": int(time.time())})
+        elif path == "/v1/workflows/run":
+            payload = json.loads(body or b"{}")
+            if payload.get("response_mode") == "streaming":
+                self._stream_run(payload)
+            else:
+                self._send_json(200, self._finish_run(self._start_run(payload)))
+        else:
+            self._send_json(404, {"code": "not_found", "message": path})
+
+    def _start_run(self, payload):
+        run = {
+            "id": str(uuid.uuid4()),
+            "task_id": str(uuid.uuid4()),
+            "inputs": payload.get("inputs", {}),
+            "status": "running",
+            "outputs": None,
+            "error": None,
+            "total_steps": 0,
+            "total_tokens": 0,
+            "elapsed_time": 0,
+            "created_at": int(time.time()),
+            "finished_at": None,
+        }
+        with runs_lock:
+            runs[run["id"]] = run
+        return run
+
+    def _finish_run(self, run):
+        with runs_lock:
+            run.update({
+                "status": "succeeded",
+                "outputs": {"structured_output": STRUCTURED_OUTPUT},
+                "total_steps": len(NODES),
+                "total_tokens": 1234,
+                "elapsed_time": time.time() - run["created_at"],
+                "finished_at": int(time.time()),
+            })
+        return {"workflow_run_id": run["id"], "task_id": run["task_id"], "data": dict(run)}
+
+    def _stream_run(self, payload):
+        run = self._start_run(payload)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def send(event, data):
+            message = {"event": event, "task_id": run["task_id"], "workflow_run_id": run["id"], "data": data}
+            self.wfile.write(f"data: {json.dumps(message)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        try:
+            send("workflow_started", {"id": run["id"], "created_at": run["created_at"]})
+            for index, (node_id, node_type, title) in enumerate(NODES, start=1):
+                node = {"node_id": node_id, "node_type": node_type, "title": title, "index": index}
+                send("node_started", node)
+                time.sleep(self.node_delay)
+                self.wfile.write(b"event: ping\n\n")
+                send("node_finished", dict(node, status="succeeded", elapsed_time=self.node_delay))
+            finished = self._finish_run(run)
+            send("workflow_finished", finished["data"])
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local mock Dify API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5005)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of requests answered with 429/503")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds of delay added to every request")
+    parser.add_argument("--node-delay", type=float, default=0.2, help="Seconds each streamed node takes")
+    args = parser.parse_args()
+
+    MockDifyHandler.fail_rate = args.fail_rate
+    MockDifyHandler.latency = args.latency
+    MockDifyHandler.node_delay = args.node_delay
+    server = ThreadingHTTPServer((args.host, args.port), MockDifyHandler)
+    print(f"Mock Dify API listening on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
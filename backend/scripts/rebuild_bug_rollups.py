@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Bug Report Rollup Rebuild Script
+
+Recounts the bug_daily_rollups documents that back fast bug reports, for
+one project or for every project that has bugs. Rollups are kept current
+on each bug/fix write; run this after bulk edits made outside the API or
+to repair drift. Reports keep answering from the current rollups (or the
+bugs themselves) until a recount is complete, and a project whose bugs
+change during its recount is counted again. Projects already being
+rebuilt elsewhere are skipped.
+
+Usage:
+    python scripts/rebuild_bug_rollups.py [--project-id ID]
+"""
+
+import argparse
+import os
+import sys
+
+# Add the parent directory to the path to import utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.mongo import get_db
+from utils.database import rebuild_bug_rollups
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild daily bug report rollups")
+    parser.add_argument('--project-id', help="Only rebuild this project")
+    args = parser.parse_args()
+
+    project_ids = [args.project_id] if args.project_id else get_db().bugs.distinct('project_id')
+    failures = 0
+    for project_id in project_ids:
+        try:
+            days = rebuild_bug_rollups(project_id)
+            print(f"{project_id}: {'already being rebuilt' if days is None else f'{days} days'}")
+        except Exception as e:
+            failures += 1
+            print(f"  ! {project_id}: {e}")
+    print(f"Rebuilt rollups for {len(project_ids) - failures} of {len(project_ids)} projects")
+    return failures == 0
+
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
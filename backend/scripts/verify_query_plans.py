@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Query Plan Verification Script
+
+Runs explain() on every query shape used by utils/database.py and the
+services, with sample values, and fails if any of them is planned as a
+collection scan (COLLSCAN). $lookup stages are checked against the index
+registry, since their inner plans are not part of a queryPlanner explain.
+Shapes that read a whole collection by design are listed but allowed.
+
+Registry indexes are created first (utils.indexes.ensure_indexes) unless
+--skip-create is given, so the script also works on an empty database.
+
+Usage:
+    python scripts/verify_query_plans.py [--skip-create] [--verbose]
+"""
+
+import argparse
+import os
+import sys
+from collections import namedtuple
+from datetime import datetime
+
+# Add the parent directory to the path to import utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+from utils.indexes import INDEXES, ensure_indexes, index_keys
+from utils.mongo import MONGODB_DATABASE, FIXCHAIN_RAG_DATABASE, manager
+
+QueryShape = namedtuple('QueryShape', 'source collection filter sort pipeline database full_scan')
+
+
+def shape(source, collection, filter=None, sort=None, pipeline=None, database=MONGODB_DATABASE, full_scan=False):
+    return QueryShape(source, collection, filter or {}, sort, pipeline, database, full_scan)
+
+
+NOW = datetime.utcnow()
+OID = ObjectId()
+BUG_ROLLUP_LOOKUPS = [
+    {'$lookup': {'from': 'bug_fixes', 'localField': 'bug_id', 'foreignField': 'bug_id', 'as': 'fixes'}},
+    {'$lookup': {'from': 'bug_histories', 'localField': 'bug_id', 'foreignField': 'bug_id', 'as': 'history'}},
+    {'$lookup': {'from': 'bug_executions', 'localField': 'bug_id', 'foreignField': 'bug_id', 'as': 'executions'}},
+]
+
+QUERY_SHAPES = [
+    # Projects
+    shape('get_all_projects', 'projects', full_scan=True),
+    shape('get_project / update_project / delete_project', 'projects', {'project_id': 'p1'}),
+    shape('get_project (ObjectId fallback)', 'projects', {'_id': OID}),
+    # Tasks and test cases
+    shape('get_project_tasks / delete_project', 'tasks', {'project_id': 'p1'}),
+    shape('iter_project_tasks_with_test_cases', 'tasks', pipeline=[
+        {'$match': {'project_id': 'p1', '_id': {'$gt': OID}}}, {'$sort': {'_id': 1}}, {'$limit': 50},
+        {'$lookup': {'from': 'test_cases', 'localField': 'task_id', 'foreignField': 'task_id', 'as': 'test_scenarios'}},
+    ]),
+    shape('get_task', 'tasks', {'project_id': 'p1', 'task_id': 't1'}),
+    shape('update_task / update_task_status', 'tasks', {'task_id': 't1'}),
+    shape('get_test_cases / save_test_scenarios', 'test_cases', {'task_id': 't1'}),
+    shape('get_task_job / update_task_job / claim_task_job', 'task_jobs', {'job_id': 'j1'}),
+    shape('claim_task_for_queue', 'tasks', {'project_id': 'p1', 'task_id': 't1', 'status': {'$nin': ['queued', 'running']}}),
+    shape('find_orphaned_task_jobs', 'task_jobs', {'status': {'$in': ['queued', 'running']}, '$or': [
+        {'heartbeat_at': {'$lt': NOW}}, {'heartbeat_at': None, 'updated_at': {'$lt': NOW}}]}),
+    # Documents and workflows
+    shape('get_documents / create_document', 'documents', {'workflow_id': 'w1'}),
+    shape('get_document / update_document / delete_document', 'documents', {'document_id': 'd1'}),
+    shape('get_workflow / update_workflow / delete_workflow', 'workflows', {'workflow_id': 'w1'}),
+    shape('iter_workflows(project_id)', 'workflows', {'project_id': 'p1'}),
+    shape('iter_workflows()', 'workflows', full_scan=True),
+    shape('get_workflow_config / save_workflow_config', 'workflow_configs', {'project_id': 'p1'}),
+    # Workflow executions
+    shape('get_workflow_execution / update_workflow_execution', 'workflow_executions', {'execution_id': 'e1'}),
+    shape('get_workflow_executions', 'workflow_executions', {'project_id': 'p1'}, sort=[('created_at', -1)]),
+    shape('get_workflow_execution / record_workflow_execution_event', 'workflow_executions', {'id': 'e1'}),
+    shape('iter_workflow_executions(workflow_id)', 'workflow_executions', {'workflow_id': 'w1'}),
+    shape('iter_workflow_executions()', 'workflow_executions', full_scan=True),
+    shape('find_stale_workflow_executions', 'workflow_executions', {
+        'status': {'$in': ['pending', 'running']},
+        '$or': [{'stream_lost': True}, {'last_event_at': {'$lt': NOW}}],
+    }),
+    shape('claim_workflow_execution', 'workflow_executions', {
+        'id': 'e1', '$or': [{'reconcile_claimed_at': {'$exists': False}}, {'reconcile_claimed_at': {'$lt': NOW}}],
+    }),
+    # Scenarios
+    shape('ScenarioService.get_scenarios / iter_scenarios', 'scenarios', {'project_id': 'p1'}),
+    shape('ScenarioService.update_scenario / delete_scenario', 'scenarios', {'project_id': 'p1', 'id': 's1'}),
+    shape('ScenarioService.delete_scenarios_by_workflow', 'scenarios', {'workflow_id': 'w1'}),
+    # Bugs
+    shape('BugService.get_bugs', 'bugs', {'project_id': 'p1', 'status': 'open'},
+          sort=[('created_at', -1), ('_id', -1)]),
+    shape('BugService.get_bugs (next page)', 'bugs', {
+        'project_id': 'p1',
+        '$or': [{'created_at': {'$lt': NOW}}, {'created_at': NOW, '_id': {'$lt': OID}}],
+    }, sort=[('created_at', -1), ('_id', -1)]),
+    shape('get_bugs_by_project (severity)', 'bugs', {'project_id': 'p1', 'severity': 'high'}, sort=[('created_at', -1)]),
+    shape('BugService.get_bug / get_bugs_detail', 'bugs', pipeline=[{'$match': {'bug_id': {'$in': ['b1', 'b2']}}}]
+          + BUG_ROLLUP_LOOKUPS),
+    shape('BugService.get_bug_reports (live)', 'bugs', pipeline=[
+        {'$match': {'project_id': 'p1', 'created_at': {'$gte': NOW}}},
+        {'$group': {'_id': '$status', 'count': {'$sum': 1}}},
+    ]),
+    shape('compute_bug_rollups', 'bugs', pipeline=[{'$match': {'project_id': 'p1'}}]),
+    shape('get_bug_fixes / delete_bug', 'bug_fixes', {'bug_id': 'b1'}, sort=[('fixed_at', -1)]),
+    shape('update_bug_fix', 'bug_fixes', {'fix_id': 'f1'}),
+    shape('get_bug_history', 'bug_histories', {'bug_id': 'b1'}, sort=[('captured_at', -1)]),
+    shape('get_bug_executions', 'bug_executions', {'bug_id': 'b1'}, sort=[('executed_at', -1)]),
+    shape('BugService.get_execution_bugs', 'bug_executions', pipeline=[
+        {'$match': {'execution_id': 'x1'}},
+        {'$lookup': {'from': 'bugs', 'localField': 'bug_id', 'foreignField': 'bug_id', 'as': 'bug_info'}},
+    ]),
+    shape('create_bug_execution', 'bug_executions', {'execution_id': 'x1', 'bug_id': 'b1'}),
+    shape('BugService.get_bug_reports (rollups)', 'bug_daily_rollups', pipeline=[
+        {'$match': {'project_id': 'p1', 'version': 'v1', 'day': {'$gte': NOW}}},
+    ]),
+    shape('rebuild_bug_rollups', 'bug_daily_rollups', {'project_id': 'p1', 'version': {'$ne': 'v1'}}),
+    # Caches
+    shape('get_dify_metadata_cache', 'dify_metadata_cache', {'_id': 'k1'}),
+    shape('delete_dify_metadata_cache', 'dify_metadata_cache', {'api_key_hash': 'h1'}),
+    shape('get_embedding_cache_entries', 'embedding_cache', {'_id': {'$in': ['k1', 'k2']}},
+          database=FIXCHAIN_RAG_DATABASE),
+    # FixChain
+    shape('FixChainService.search_similar_bugs', 'bug_reports', {'source_file': 'a.py', 'bug_type': 'logic'},
+          sort=[('created_at', -1)]),
+    shape('FixChainService.search_similar_bugs (no filters)', 'bug_reports', sort=[('created_at', -1)]),
+    shape('FixChainService.search_similar_bugs (reference)', 'bug_reports', {'bug_id': 'b1'}),
+    shape('VectorIndex.sync (bug_reports)', 'bug_reports', {'updated_at': {'$gte': NOW}}, sort=[('updated_at', 1)]),
+    shape('FixChainService.get_performance_analytics', 'execution_sessions', {'source_file': 'a.py'},
+          sort=[('created_at', -1)]),
+    shape('FixChainService.import_stream (sessions)', 'execution_sessions', {'session_id': 's1'}),
+    shape('claim_import_job / get_import_job', 'fixchain_imports', {'import_id': 'i1'}),
+    shape('FixChainService.iter_reasoning_history', 'test_reasoning', {'source_file': 'a.py'},
+          sort=[('created_at', -1)], database=FIXCHAIN_RAG_DATABASE),
+    shape('FixChainService.hybrid_search_reasoning (text)', 'test_reasoning', {'$text': {'$search': 'timeout'}},
+          database=FIXCHAIN_RAG_DATABASE),
+    shape('FixChainService.hybrid_search_reasoning (page)', 'test_reasoning', {'entry_id': {'$in': ['r1', 'r2']}},
+          database=FIXCHAIN_RAG_DATABASE),
+    shape('FixChainService.delete_reasoning', 'test_reasoning', {'entry_id': 'r1'}, database=FIXCHAIN_RAG_DATABASE),
+    shape('VectorIndex.sync (test_reasoning)', 'test_reasoning', {'updated_at': {'$gte': NOW}},
+          sort=[('updated_at', 1)], database=FIXCHAIN_RAG_DATABASE),
+]
+
+
+def plan_stages(explain):
+    """(stage names, index names) of every winning plan in an explain document."""
+    stages, indexes = [], []
+
+    def walk(node, in_plan):
+        if isinstance(node, dict):
+            if in_plan and 'stage' in node:
+                stages.append(node['stage'])
+                if node.get('indexName'):
+                    indexes.append(node['indexName'])
+            for key, value in node.items():
+                walk(value, in_plan or key in ('winningPlan', 'queryPlan'))
+        elif isinstance(node, list):
+            for item in node:
+                walk(item, in_plan)
+
+    walk(explain, False)
+    return stages, indexes
+
+
+def lookup_problems(query_shape):
+    """$lookup stages whose foreignField does not lead an index in the registry."""
+    problems = []
+    for stage in query_shape.pipeline or []:
+        lookup = stage.get('$lookup')
+        if not lookup:
+            continue
+        models = INDEXES.get(query_shape.database, {}).get(lookup['from'], [])
+        if not any(index_keys(model)[0][0] == lookup['foreignField'] for model in models):
+            problems.append(f"$lookup on {lookup['from']}.{lookup['foreignField']} has no index")
+    return problems
+
+
+def explain(client, query_shape):
+    database = client[query_shape.database]
+    if query_shape.pipeline is not None:
+        return database.command('aggregate', query_shape.collection, pipeline=query_shape.pipeline, explain=True)
+    cursor = database[query_shape.collection].find(query_shape.filter)
+    if query_shape.sort:
+        cursor = cursor.sort(query_shape.sort)
+    return cursor.explain()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail if any known query shape is a collection scan")
+    parser.add_argument('--skip-create', action='store_true', help="Do not create missing registry indexes first")
+    parser.add_argument('--verbose', action='store_true', help="Print the plan stages of every shape")
+    args = parser.parse_args()
+
+    client = manager.client
+    if not args.skip_create:
+        result = ensure_indexes(client)
+        print(f"Indexes: {len(result['created'])} created, {len(result['failed'])} failed")
+
+    failures = 0
+    for query_shape in QUERY_SHAPES:
+        target = f"{query_shape.database}.{query_shape.collection}"
+        try:
+            stages, indexes = plan_stages(explain(client, query_shape))
+        except Exception as e:
+            failures += 1
+            print(f"ERROR     {target:<40} {query_shape.source}: {e}")
+            continue
+        problems = lookup_problems(query_shape)
+        if 'COLLSCAN' in stages and not query_shape.full_scan:
+            problems.insert(0, 'COLLSCAN')
+        if problems:
+            failures += 1
+            status = 'FAIL'
+        else:
+            status = 'SCAN OK' if 'COLLSCAN' in stages else 'OK'
+        detail = ', '.join(problems) if problems else ', '.join(dict.fromkeys(indexes)) or ', '.join(stages)
+        print(f"{status:<9} {target:<40} {query_shape.source}: {detail}")
+        if args.verbose:
+            print(f"          stages: {' > '.join(stages)}")
+
+    print(f"\n{len(QUERY_SHAPES)} query shapes, {failures} failing")
+    return failures == 0
+
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
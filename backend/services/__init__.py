@@ -1,10 +1,4 @@
 # Services package
-
-from . import project
-from . import bug
-from . import config
-from . import document
-from . import scenario
-from . import task
-from . import workflow
-from . import dify_service
\ No newline at end of file
+#
+# Submodules are imported on demand (from services import project); importing
+# them all here would load every service's dependencies on first import.
@@ -1,19 +1,55 @@
+import base64
 import uuid
-from datetime import datetime
-from utils.database import get_connection, MONGODB_DATABASE
+from bson import ObjectId
+from datetime import datetime, timedelta, timezone
+from pymongo import ReturnDocument
+from utils.database import (
+    get_db,
+    BUG_ROLLUP_PROJECTION,
+    apply_bug_rollup,
+    bug_rollup_increments,
+    fixer_rollup_increments,
+    merge_rollup_increments,
+    update_bug_rollup,
+    decode_rollup_key,
+    get_bug_rollup_state,
+    start_bug_rollup_rebuild,
+)
+from utils.blob_store import store_images, image_urls
 from utils.logger import logger
 from collections import defaultdict
 
+BUG_LIST_FILTERS = ('status', 'severity', 'task_id', 'scenario_id', 'created_by', 'created_after', 'created_before')
+BUG_MULTI_VALUE_FILTERS = ('status', 'severity')
+MAX_FILTER_VALUE_LENGTH = 200
+DEFAULT_BUG_PAGE_SIZE = 50
+
+# Related collections joined into bug details: name -> (collection, newest-first sort field)
+BUG_DETAIL_RELATIONS = {
+    'fixes': ('bug_fixes', 'fixed_at'),
+    'history': ('bug_histories', 'captured_at'),
+    'executions': ('bug_executions', 'executed_at'),
+}
+
+BUG_REPORT_GROUP_FIELDS = ('status', 'severity')
+BUG_REPORT_SOURCES = ('auto', 'live', 'rollup')
+BUG_REPORT_TOP_N = 10
+
 class BugService:
     """Service class for managing bugs and related operations."""
+
+    @staticmethod
+    def present_images(doc):
+        """Replace stored image references with download URLs for API responses."""
+        if doc is not None and 'images' in doc:
+            doc['images'] = image_urls(doc['images'])
+        return doc
     
     @staticmethod
     def create_bug(data):
         """Create a new bug."""
         try:
-            client = get_connection()
-            db = client[MONGODB_DATABASE]
-            logger.debug(f"[create_bug] Connected to DB: {MONGODB_DATABASE} at {client.address}")
+            db = get_db()
 
             bug_id = str(uuid.uuid4())
             now = datetime.utcnow()
@@ -30,7 +66,7 @@ class BugService:
                 'description': data['description'],
                 'status': data.get('status', 'open'),
                 'severity': data['severity'],
-                'images': data.get('images', []),  # Array of base64 images
+                'images': store_images(data.get('images', [])),  # Blob references
                 'created_at': now,
                 'updated_at': now,
                 'created_by': data.get('created_by', 'system'),
@@ -40,9 +76,10 @@ class BugService:
             logger.debug(f"[create_bug] Inserting bug: {bug_doc}")
             result = db.bugs.insert_one(bug_doc)
             bug_doc['_id'] = str(result.inserted_id)
+            apply_bug_rollup(bug_doc, bug_rollup_increments(bug_doc))
 
             logger.info(f"[create_bug] Bug created successfully with ID: {bug_id}")
-            return bug_doc
+            return BugService.present_images(bug_doc)
         except Exception as e:
             logger.error(f"[create_bug] Error creating bug: {e}", exc_info=True)
             raise e
@@ -51,9 +88,7 @@ class BugService:
     def create_bugs_batch(data):
         """Create multiple bugs in batch."""
         try:
-            client = get_connection()
-            db = client[MONGODB_DATABASE]
-            logger.debug(f"[create_bugs_batch] Connected to DB: {MONGODB_DATABASE} at {client.address}")
+            db = get_db()
 
             now = datetime.utcnow()
             project_id = str(data['project_id'])
@@ -74,7 +109,7 @@ class BugService:
                     'description': bug_data['description'],
                     'status': bug_data.get('status', 'open'),
                     'severity': bug_data['severity'],
-                    'images': bug_data.get('images', []),  # Array of base64 images
+                    'images': store_images(bug_data.get('images', [])),  # Blob references
                     'created_at': now,
                     'updated_at': now,
                     'created_by': bug_data.get('created_by', 'system'),
@@ -84,10 +119,14 @@ class BugService:
 
             logger.debug(f"[create_bugs_batch] Inserting {len(bug_docs)} bugs")
             result = db.bugs.insert_many(bug_docs)
+            # One shared creation time, so the whole batch lands in a single rollup day
+            apply_bug_rollup(bug_docs[0] if bug_docs else None,
+                             merge_rollup_increments(*[bug_rollup_increments(doc) for doc in bug_docs]))
             
             # Add _id to each document
             for i, inserted_id in enumerate(result.inserted_ids):
                 bug_docs[i]['_id'] = str(inserted_id)
+                BugService.present_images(bug_docs[i])
 
             logger.info(f"[create_bugs_batch] {len(bug_docs)} bugs created successfully")
             return {
@@ -103,76 +142,212 @@ class BugService:
 
 
     @staticmethod
-    def get_bugs(project_id, filters=None):
-        """Get all bugs for a project with optional filters."""
-        try:
-            client = get_connection()
-            db = client[MONGODB_DATABASE]
-            logger.debug(f"[get_bugs] Connected to DB: {MONGODB_DATABASE} at {client.address}")
+    def build_bug_query(project_id, filters=None):
+        """Validate listing filters and build the Mongo query; raises ValueError on bad input."""
+        query = {'project_id': str(project_id)}
+        created_range = {}
+        for key, value in (filters or {}).items():
+            if value is None or value == '':
+                continue
+            if key not in BUG_LIST_FILTERS:
+                raise ValueError(f"Unsupported filter: {key}")
+            # Only plain strings, so operator documents can never reach the query
+            if not isinstance(value, str) or len(value) > MAX_FILTER_VALUE_LENGTH:
+                raise ValueError(f"Invalid value for filter: {key}")
+            if key in ('created_after', 'created_before'):
+                try:
+                    moment = datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+                except ValueError:
+                    raise ValueError(f"{key} must be an ISO 8601 date")
+                created_range['$gte' if key == 'created_after' else '$lt'] = moment
+            elif key in BUG_MULTI_VALUE_FILTERS:
+                values = [v.strip() for v in value.split(',') if v.strip()]
+                query[key] = values[0] if len(values) == 1 else {'$in': values}
+            else:
+                query[key] = value
+        if created_range:
+            query['created_at'] = created_range
+        return query
 
-            # Ensure project_id is str
-            project_id = str(project_id)
-            query = {'project_id': project_id}
+    @staticmethod
+    def encode_bug_cursor(bug):
+        """Opaque keyset cursor for the (created_at, _id) position of a bug."""
+        created_at = bug.get('created_at')
+        stamp = created_at.isoformat() if isinstance(created_at, datetime) else ''
+        raw = f"{stamp}|{bug['_id']}"
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
 
-            if filters:
-                query.update({k: v for k, v in filters.items() if v is not None})
+    @staticmethod
+    def decode_bug_cursor(cursor):
+        try:
+            stamp, oid = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|', 1)
+            return (datetime.fromisoformat(stamp) if stamp else None), ObjectId(oid)
+        except Exception:
+            raise ValueError("cursor is invalid")
 
+    @staticmethod
+    def get_bugs(project_id, filters=None, limit=None, cursor=None, include_images=False, include_total=None):
+        """
+        Get bugs for a project, newest first.
+
+        Without limit/cursor the full (filtered) list is returned. Otherwise
+        one page is returned as {'bugs', 'next_cursor', 'total'}; total is
+        counted on the first page only unless include_total is set.
+        Base64 images are left out unless include_images is true.
+        """
+        try:
+            db = get_db()
+            query = BugService.build_bug_query(project_id, filters)
+            projection = None if include_images else {'images': 0}
+            sort = [('created_at', -1), ('_id', -1)]
             logger.debug(f"[get_bugs] Query: {query}")
-            bugs = list(db.bugs.find(query, {'_id': 0}).sort('created_at', -1))
-            logger.debug(f"[get_bugs] Total bugs returned: {len(bugs)}")
-
-            # Optional: log existing bugs for verification
-            all_bugs = list(db.bugs.find({}, {'_id': 0}))
-            logger.debug(f"[get_bugs] Current bugs in DB: {all_bugs}")
 
-            return bugs
+            if limit is None and cursor is None:
+                bugs = list(db.bugs.find(query, projection).sort(sort))
+                for bug in bugs:
+                    bug.pop('_id', None)
+                    BugService.present_images(bug)
+                logger.debug(f"[get_bugs] Total bugs returned: {len(bugs)}")
+                return bugs
+
+            limit = limit or DEFAULT_BUG_PAGE_SIZE
+            page_query = dict(query)
+            if cursor:
+                created_at, oid = BugService.decode_bug_cursor(cursor)
+                # Keyset: strictly after the last (created_at, _id) seen, in descending order
+                page_query['$or'] = [
+                    {'created_at': {'$lt': created_at}},
+                    {'created_at': created_at, '_id': {'$lt': oid}},
+                ] if created_at else [{'created_at': None, '_id': {'$lt': oid}}]
+            bugs = list(db.bugs.find(page_query, projection).sort(sort).limit(limit + 1))
+
+            next_cursor = None
+            if len(bugs) > limit:
+                bugs = bugs[:limit]
+                next_cursor = BugService.encode_bug_cursor(bugs[-1])
+            for bug in bugs:
+                bug.pop('_id', None)
+                BugService.present_images(bug)
+
+            result = {'bugs': bugs, 'next_cursor': next_cursor}
+            if include_total or (include_total is None and not cursor):
+                result['total'] = db.bugs.count_documents(query)
+            return result
+        except ValueError:
+            raise
         except Exception as e:
             logger.error(f"[get_bugs] Error fetching bugs: {e}", exc_info=True)
-            return []
+            if limit is None and cursor is None:
+                return []
+            raise
+
 
+    @staticmethod
+    def _related_limit(related_limit, relation):
+        if isinstance(related_limit, dict):
+            return related_limit.get(relation)
+        return related_limit
 
     @staticmethod
-    def get_bug(bug_id):
-        """Get detailed information for a single bug."""
+    def bug_detail_pipeline(match, related_limit=None, exclude_fields=None):
+        """
+        Aggregation returning bugs with their fixes, history and executions.
+
+        related_limit caps each related list (newest first); it is an int for
+        all lists or a dict keyed by relation name. exclude_fields are field
+        paths to drop, e.g. 'images', 'history.before_state' or a whole
+        relation such as 'executions'.
+        """
+        exclude_fields = list(exclude_fields or [])
+        for field in exclude_fields:
+            if not isinstance(field, str) or not field or field.startswith('$'):
+                raise ValueError(f"Invalid exclude field: {field}")
+
+        pipeline = [{'$match': match}]
+        for relation, (collection, sort_field) in BUG_DETAIL_RELATIONS.items():
+            if relation in exclude_fields:
+                continue  # Skip the join entirely
+            sub_pipeline = [{'$sort': {sort_field: -1}}]
+            limit = BugService._related_limit(related_limit, relation)
+            if limit:
+                sub_pipeline.append({'$limit': int(limit)})
+            projection = {'_id': 0}
+            prefix = relation + '.'
+            projection.update({f[len(prefix):]: 0 for f in exclude_fields if f.startswith(prefix)})
+            sub_pipeline.append({'$project': projection})
+            pipeline.append({
+                '$lookup': {
+                    'from': collection,
+                    'localField': 'bug_id',
+                    'foreignField': 'bug_id',
+                    'pipeline': sub_pipeline,
+                    'as': relation,
+                }
+            })
+
+        projection = {'_id': 0}
+        projection.update({
+            f: 0 for f in exclude_fields
+            if f.split('.', 1)[0] not in BUG_DETAIL_RELATIONS and f != '_id'
+        })
+        pipeline.append({'$project': projection})
+        return pipeline
+
+    @staticmethod
+    def _present_detail(bug):
+        BugService.present_images(bug)
+        for fix in bug.get('fixes', []):
+            BugService.present_images(fix)
+        return bug
+
+    @staticmethod
+    def get_bug(bug_id, related_limit=None, exclude_fields=None):
+        """Get a bug with its fixes, history and executions in a single aggregation."""
         logger.info(f"Fetching bug details for: {bug_id}")
         try:
-            client = get_connection()
-            db = client[MONGODB_DATABASE]
-            
-            bug = db.bugs.find_one({'bug_id': bug_id}, {'_id': 0})
-            if bug:
-                # Get related fixes
-                bug['fixes'] = list(db.bug_fixes.find({'bug_id': bug_id}, {'_id': 0}))
-                # Get history
-                bug['history'] = list(db.bug_histories.find({'bug_id': bug_id}, {'_id': 0}))
-                # Get executions
-                bug['executions'] = list(db.bug_executions.find({'bug_id': bug_id}, {'_id': 0}))
-            
-            return bug
+            db = get_db()
+            pipeline = BugService.bug_detail_pipeline({'bug_id': bug_id}, related_limit, exclude_fields)
+            bugs = list(db.bugs.aggregate(pipeline))
+            return BugService._present_detail(bugs[0]) if bugs else None
+        except ValueError:
+            raise
         except Exception as e:
             logger.error(f"Error fetching bug details: {e}")
             return None
 
+    @staticmethod
+    def get_bugs_detail(bug_ids, related_limit=None, exclude_fields=None):
+        """Get details for many bugs at once, in the order of bug_ids (missing ones are skipped)."""
+        logger.info(f"Fetching bug details for {len(bug_ids)} bugs")
+        db = get_db()
+        pipeline = BugService.bug_detail_pipeline({'bug_id': {'$in': list(bug_ids)}}, related_limit, exclude_fields)
+        by_id = {bug['bug_id']: BugService._present_detail(bug) for bug in db.bugs.aggregate(pipeline)}
+        return [by_id[bug_id] for bug_id in bug_ids if bug_id in by_id]
+
     @staticmethod
     def update_bug(bug_id, data):
         """Update bug information."""
         logger.info(f"Updating bug: {bug_id}")
         try:
-            client = get_connection()
-            db = client[MONGODB_DATABASE]
+            db = get_db()
             
             # Remove bug_id from update data to avoid conflicts
             update_data = {k: v for k, v in data.items() if k != 'bug_id'}
+            if 'images' in update_data:
+                update_data['images'] = store_images(update_data['images'])
             update_data['updated_at'] = datetime.utcnow()
             
-            result = db.bugs.update_one(
+            before = db.bugs.find_one_and_update(
                 {'bug_id': bug_id},
-                {'$set': update_data}
+                {'$set': update_data},
+                projection=BUG_ROLLUP_PROJECTION,
+                return_document=ReturnDocument.BEFORE
             )
             
-            if result.modified_count > 0:
+            if before:
+                update_bug_rollup(before, {**before, **update_data})
                 # Return updated bug
-                return db.bugs.find_one({'bug_id': bug_id}, {'_id': 0})
+                return BugService.present_images(db.bugs.find_one({'bug_id': bug_id}, {'_id': 0}))
             return None
         except Exception as e:
             logger.error(f"Error updating bug: {e}")
@@ -183,19 +358,23 @@ class BugService:
         """Delete a bug and all related data."""
         logger.info(f"Deleting bug: {bug_id}")
         try:
-            client = get_connection()
-            db = client[MONGODB_DATABASE]
+            db = get_db()
             
             # Delete related records first
+            fixers = [fix.get('fixed_by') for fix in db.bug_fixes.find({'bug_id': bug_id}, {'_id': 0, 'fixed_by': 1})]
             db.bug_executions.delete_many({'bug_id': bug_id})
             db.bug_histories.delete_many({'bug_id': bug_id})
             db.bug_fixes.delete_many({'bug_id': bug_id})
             
             # Delete the bug
-            result = db.bugs.delete_one({'bug_id': bug_id})
+            bug = db.bugs.find_one_and_delete({'bug_id': bug_id}, projection=BUG_ROLLUP_PROJECTION)
+            if bug:
+                apply_bug_rollup(bug, merge_rollup_increments(
+                    bug_rollup_increments(bug, -1), *[fixer_rollup_increments(f, -1) for f in fixers]
+                ))
             
             logger.info(f"Bug {bug_id} deleted successfully")
-            return result.deleted_count > 0
+            return bug is not None
         except Exception as e:
             logger.error(f"Error deleting bug: {e}")
             return False
@@ -205,8 +384,7 @@ class BugService:
         """Create a bug fix record."""
         logger.info(f"Creating bug fix for bug: {data.get('bug_id')}")
         try:
-            client = get_connection()
-            db = client[MONGODB_DATABASE]
+            db = get_db()
             
             fix_id = str(uuid.uuid4())
             now = datetime.utcnow()
@@ -218,7 +396,7 @@ class BugService:
                 'fix_status': data.get('fix_status', 'pending'),
                 'fixed_by': data['fixed_by'],
                 'verified_by': data.get('verified_by'),
-                'images': data.get('images', []),  # Array of base64 images
+                'images': store_images(data.get('images', [])),  # Blob references
                 'fixed_at': now,
                 'verified_at': None
             }
@@ -227,7 +405,7 @@ class BugService:
             fix_doc['_id'] = str(result.inserted_id)
             
             # Update bug status to 'fixed' if it's currently 'open' or 'in_progress'
-            db.bugs.update_one(
+            before = db.bugs.find_one_and_update(
                 {
                     'bug_id': data['bug_id'],
                     'status': {'$in': ['open', 'in_progress']}
@@ -237,11 +415,22 @@ class BugService:
                         'status': 'fixed',
                         'updated_at': now
                     }
-                }
+                },
+                projection=BUG_ROLLUP_PROJECTION,
+                return_document=ReturnDocument.BEFORE
             )
+            fixer_increments = fixer_rollup_increments(fix_doc['fixed_by'])
+            if before:
+                apply_bug_rollup(before, merge_rollup_increments(
+                    bug_rollup_increments(before, -1),
+                    bug_rollup_increments({**before, 'status': 'fixed'}),
+                    fixer_increments
+                ))
+            else:
+                apply_bug_rollup(db.bugs.find_one({'bug_id': data['bug_id']}, BUG_ROLLUP_PROJECTION), fixer_increments)
             
             logger.info(f"Bug fix created successfully with ID: {fix_id}")
-            return fix_doc
+            return BugService.present_images(fix_doc)
         except Exception as e:
             logger.error(f"Error creating bug fix: {e}")
             raise e
@@ -251,8 +440,7 @@ class BugService:
         """Verify a bug fix."""
         logger.info(f"Verifying bug fix: {fix_id}")
         try:
-            client = get_connection()
-            db = client[MONGODB_DATABASE]
+            db = get_db()
             
             now = datetime.utcnow()
             result = db.bug_fixes.update_one(
@@ -271,15 +459,18 @@ class BugService:
                 fix_record = db.bug_fixes.find_one({'fix_id': fix_id})
                 if fix_record:
                     bug_status = 'closed' if fix_status == 'verified' else 'open'
-                    db.bugs.update_one(
+                    before = db.bugs.find_one_and_update(
                         {'bug_id': fix_record['bug_id']},
                         {
                             '$set': {
                                 'status': bug_status,
                                 'updated_at': now
                             }
-                        }
+                        },
+                        projection=BUG_ROLLUP_PROJECTION,
+                        return_document=ReturnDocument.BEFORE
                     )
+                    update_bug_rollup(before, {**(before or {}), 'status': bug_status})
                 
                 return db.bug_fixes.find_one({'fix_id': fix_id}, {'_id': 0})
             return None
@@ -292,11 +483,10 @@ class BugService:
         """Get all fixes for a bug."""
         logger.info(f"Fetching fixes for bug: {bug_id}")
         try:
-            client = get_connection()
-            db = client[MONGODB_DATABASE]
+            db = get_db()
             
             fixes = list(db.bug_fixes.find({'bug_id': bug_id}, {'_id': 0}).sort('fixed_at', -1))
-            return fixes
+            return [BugService.present_images(fix) for fix in fixes]
         except Exception as e:
             logger.error(f"Error fetching bug fixes: {e}")
             return []
@@ -306,8 +496,7 @@ class BugService:
         """Create bug history record."""
         logger.info(f"Creating bug history for bug: {data.get('bug_id')}")
         try:
-            client = get_connection()
-            db = client[MONGODB_DATABASE]
+            db = get_db()
             
             history_id = str(uuid.uuid4())
             now = datetime.utcnow()
@@ -335,8 +524,7 @@ class BugService:
         """Get history for a bug."""
         logger.info(f"Fetching history for bug: {bug_id}")
         try:
-            client = get_connection()
-            db = client[MONGODB_DATABASE]
+            db = get_db()
             
             history = list(db.bug_histories.find({'bug_id': bug_id}, {'_id': 0}).sort('captured_at', -1))
             return history
@@ -349,8 +537,7 @@ class BugService:
         """Execute bug test in an execution."""
         logger.info(f"Executing bug test for bug: {data.get('bug_id')} in execution: {data.get('execution_id')}")
         try:
-            client = get_connection()
-            db = client[MONGODB_DATABASE]
+            db = get_db()
             
             now = datetime.utcnow()
             
@@ -384,8 +571,7 @@ class BugService:
         """Get all executions for a bug."""
         logger.info(f"Fetching executions for bug: {bug_id}")
         try:
-            client = get_connection()
-            db = client[MONGODB_DATABASE]
+            db = get_db()
             
             executions = list(db.bug_executions.find({'bug_id': bug_id}, {'_id': 0}).sort('executed_at', -1))
             return executions
@@ -398,8 +584,7 @@ class BugService:
         """Get all bugs tested in an execution."""
         logger.info(f"Fetching bugs for execution: {execution_id}")
         try:
-            client = get_connection()
-            db = client[MONGODB_DATABASE]
+            db = get_db()
             
             # Get bug executions with bug details
             pipeline = [
@@ -436,95 +621,152 @@ class BugService:
             return []
 
     @staticmethod
-    def get_bug_reports(project_id, start_date=None, end_date=None, group_by='status'):
-        """Generate bug reports with statistics."""
-        logger.info(f"Generating bug reports for project: {project_id}")
-        try:
-            client = get_connection()
-            db = client[MONGODB_DATABASE]
-            
-            # Build match query
-            match_query = {'project_id': project_id}
-            if start_date or end_date:
-                date_filter = {}
-                if start_date:
-                    date_filter['$gte'] = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-                if end_date:
-                    date_filter['$lte'] = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-                match_query['created_at'] = date_filter
-            
-            # Group by specified field
-            group_field = f'${group_by}' if group_by in ['status', 'severity'] else '$status'
-            
-            pipeline = [
-                {'$match': match_query},
-                {
-                    '$group': {
-                        '_id': group_field,
-                        'count': {'$sum': 1},
-                        'bugs': {'$push': '$$ROOT'}
-                    }
-                },
-                {'$sort': {'count': -1}}
+    def _parse_report_date(value, end=False):
+        """Parse a report bound into (naive UTC datetime, day_aligned).
+
+        A date-only end bound covers that whole day, so it becomes the next midnight.
+        """
+        if not value:
+            return None, True
+        date_only = len(value) == 10
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        if date_only and end:
+            return parsed + timedelta(days=1), True
+        day_aligned = parsed == datetime(parsed.year, parsed.month, parsed.day) and (date_only or not end)
+        return parsed, day_aligned
+
+    @staticmethod
+    def _counter_facet(value_field, count_expr, top_n=None):
+        stages = [
+            {'$group': {'_id': value_field, 'count': {'$sum': count_expr}}},
+            {'$match': {'count': {'$gt': 0}}},
+            {'$sort': {'count': -1, '_id': 1}}
+        ]
+        if top_n:
+            stages.append({'$limit': top_n})
+        return stages
+
+    @staticmethod
+    def live_report_pipeline(match_query):
+        """One pass over the matching bugs; only the counted fields are carried through $facet."""
+        return [
+            {'$match': match_query},
+            {'$project': {'_id': 0, 'bug_id': 1, 'status': 1, 'severity': 1, 'created_by': 1}},
+            {
+                '$facet': {
+                    'status': BugService._counter_facet('$status', 1),
+                    'severity': BugService._counter_facet('$severity', 1),
+                    'reporters': BugService._counter_facet('$created_by', 1, BUG_REPORT_TOP_N),
+                    'fixers': [
+                        {
+                            '$lookup': {
+                                'from': 'bug_fixes',
+                                'localField': 'bug_id',
+                                'foreignField': 'bug_id',
+                                'pipeline': [{'$project': {'_id': 0, 'fixed_by': 1}}],
+                                'as': 'fixes'
+                            }
+                        },
+                        {'$unwind': '$fixes'},
+                        *BugService._counter_facet('$fixes.fixed_by', 1, BUG_REPORT_TOP_N)
+                    ]
+                }
+            }
+        ]
+
+    @staticmethod
+    def rollup_report_pipeline(match_query):
+        """Sum the per-day counter maps of bug_daily_rollups in one $facet pass."""
+        def counter(field, top_n=None):
+            return [
+                {'$project': {'kv': {'$objectToArray': {'$ifNull': [f'${field}', {}]}}}},
+                {'$unwind': '$kv'},
+                *BugService._counter_facet('$kv.k', '$kv.v', top_n)
             ]
-            
-            grouped_data = list(db.bugs.aggregate(pipeline))
-            
-            # Generate summary statistics
-            total_bugs = db.bugs.count_documents(match_query)
-            open_bugs = db.bugs.count_documents({**match_query, 'status': 'open'})
-            fixed_bugs = db.bugs.count_documents({**match_query, 'status': 'fixed'})
-            closed_bugs = db.bugs.count_documents({**match_query, 'status': 'closed'})
-            
-            # Bug severity distribution
-            severity_stats = list(db.bugs.aggregate([
-                {'$match': match_query},
-                {
-                    '$group': {
-                        '_id': '$severity',
-                        'count': {'$sum': 1}
-                    }
+
+        return [
+            {'$match': match_query},
+            {
+                '$facet': {
+                    'status': counter('status'),
+                    'severity': counter('severity'),
+                    'reporters': counter('reporters', BUG_REPORT_TOP_N),
+                    'fixers': counter('fixers', BUG_REPORT_TOP_N)
                 }
-            ]))
-            
-            # Top contributors (bug reporters and fixers)
-            created_by_stats = list(db.bugs.aggregate([
-                {'$match': match_query},
-                {
-                    '$group': {
-                        '_id': '$created_by',
-                        'reported_count': {'$sum': 1}
-                    }
-                },
-                {'$sort': {'reported_count': -1}},
-                {'$limit': 10}
-            ]))
-            
-            fixed_by_stats = list(db.bug_fixes.aggregate([
-                {
-                    '$lookup': {
-                        'from': 'bugs',
-                        'localField': 'bug_id',
-                        'foreignField': 'bug_id',
-                        'as': 'bug_info'
-                    }
-                },
-                {'$unwind': '$bug_info'},
-                {'$match': {'bug_info.project_id': project_id}},
-                {
-                    '$group': {
-                        '_id': '$fixed_by',
-                        'fixed_count': {'$sum': 1}
-                    }
-                },
-                {'$sort': {'fixed_count': -1}},
-                {'$limit': 10}
-            ]))
-            
+            }
+        ]
+
+    @staticmethod
+    def _rollup_version(project_id):
+        """Current rollup version of a project; without one, a rebuild starts in the background."""
+        state = get_bug_rollup_state(project_id)
+        if state and state.get('version'):
+            return state['version']
+        start_bug_rollup_rebuild(project_id)
+        return None
+
+    @staticmethod
+    def get_bug_reports(project_id, start_date=None, end_date=None, group_by='status', source='auto'):
+        """Generate bug reports with statistics.
+
+        source='rollup' reads the daily rollups (day-aligned ranges only), 'live'
+        aggregates the bugs themselves, and 'auto' prefers rollups when possible.
+        Until a project's rollups are built, both 'auto' and 'rollup' answer live
+        while the rollups are rebuilt in the background.
+        """
+        logger.info(f"Generating bug reports for project: {project_id}")
+        if source not in BUG_REPORT_SOURCES:
+            raise ValueError(f"source must be one of: {', '.join(BUG_REPORT_SOURCES)}")
+        try:
+            start, start_aligned = BugService._parse_report_date(start_date)
+            end, end_aligned = BugService._parse_report_date(end_date, end=True)
+        except ValueError:
+            raise ValueError("start_date and end_date must be ISO dates")
+        day_aligned = start_aligned and end_aligned
+        if source == 'rollup' and not day_aligned:
+            raise ValueError("Rollup reports need whole-day date ranges")
+        try:
+            db = get_db()
+            version = BugService._rollup_version(project_id) if source != 'live' and day_aligned else None
+            use_rollups = version is not None
+
+            if use_rollups:
+                match_query = {'project_id': project_id, 'version': version}
+                if start or end:
+                    match_query['day'] = {}
+                    if start:
+                        match_query['day']['$gte'] = start
+                    if end:
+                        match_query['day']['$lt'] = end
+                facets = next(db.bug_daily_rollups.aggregate(BugService.rollup_report_pipeline(match_query)))
+                for counts in facets.values():
+                    for item in counts:
+                        item['_id'] = decode_rollup_key(item['_id'])
+            else:
+                match_query = {'project_id': project_id}
+                if start or end:
+                    match_query['created_at'] = {}
+                    if start:
+                        match_query['created_at']['$gte'] = start
+                    if end:
+                        # A date-only end was already moved to the following midnight
+                        match_query['created_at']['$lt' if end_aligned else '$lte'] = end
+                facets = next(db.bugs.aggregate(BugService.live_report_pipeline(match_query)))
+
+            status_counts = {item['_id']: item['count'] for item in facets['status']}
+            total_bugs = sum(status_counts.values())
+            open_bugs = status_counts.get('open', 0)
+            fixed_bugs = status_counts.get('fixed', 0)
+            closed_bugs = status_counts.get('closed', 0)
+            group_field = group_by if group_by in BUG_REPORT_GROUP_FIELDS else 'status'
+
             report = {
                 'project_id': project_id,
                 'generated_at': datetime.utcnow(),
                 'date_range': {'start': start_date, 'end': end_date},
+                'source': 'rollup' if use_rollups else 'live',
                 'summary': {
                     'total_bugs': total_bugs,
                     'open_bugs': open_bugs,
@@ -532,10 +774,10 @@ class BugService:
                     'closed_bugs': closed_bugs,
                     'fix_rate': round((fixed_bugs + closed_bugs) / total_bugs * 100, 2) if total_bugs > 0 else 0
                 },
-                'grouped_data': grouped_data,
-                'severity_distribution': severity_stats,
-                'top_reporters': created_by_stats,
-                'top_fixers': fixed_by_stats
+                'grouped_data': facets[group_field],
+                'severity_distribution': facets['severity'],
+                'top_reporters': [{'_id': r['_id'], 'reported_count': r['count']} for r in facets['reporters']],
+                'top_fixers': [{'_id': f['_id'], 'fixed_count': f['count']} for f in facets['fixers']]
             }
             
             return report
@@ -547,11 +789,14 @@ class BugService:
 def create_bug(data):
     return BugService.create_bug(data)
 
-def get_bugs(project_id, filters=None):
-    return BugService.get_bugs(project_id, filters)
+def get_bugs(project_id, filters=None, limit=None, cursor=None, include_images=False, include_total=None):
+    return BugService.get_bugs(project_id, filters, limit, cursor, include_images, include_total)
+
+def get_bug(bug_id, related_limit=None, exclude_fields=None):
+    return BugService.get_bug(bug_id, related_limit, exclude_fields)
 
-def get_bug(bug_id):
-    return BugService.get_bug(bug_id)
+def get_bugs_detail(bug_ids, related_limit=None, exclude_fields=None):
+    return BugService.get_bugs_detail(bug_ids, related_limit, exclude_fields)
 
 def update_bug(bug_id, data):
     return BugService.update_bug(bug_id, data)
@@ -583,8 +828,8 @@ def get_bug_executions(bug_id):
 def get_execution_bugs(execution_id):
     return BugService.get_execution_bugs(execution_id)
 
-def get_bug_reports(project_id, start_date=None, end_date=None, group_by='status'):
-    return BugService.get_bug_reports(project_id, start_date, end_date, group_by)
+def get_bug_reports(project_id, start_date=None, end_date=None, group_by='status', source='auto'):
+    return BugService.get_bug_reports(project_id, start_date, end_date, group_by, source)
 
 def create_bugs_batch(data):
     return BugService.create_bugs_batch(data)
\ No newline at end of file
@@ -1,13 +1,18 @@
 import json
 import logging
 import os
+import httpx
 import requests
 import time
 from datetime import datetime, timezone
 from typing import List, Dict, Optional
+from utils.async_http import get_client
+from utils.request_timing import external_call
 
 # Configuration for Codex API service
-CODEX_API_BASE_URL = "http://192.168.5.11:5137/api/codex"
+CODEX_API_BASE_URL = os.environ.get("CODEX_API_BASE_URL", "http://192.168.5.11:5137/api/codex")
+CODEX_GET_TIMEOUT = 30
+CODEX_SUBMIT_TIMEOUT = 300
 LOGS_DIR = "logs"
 
 class CodexService:
@@ -51,12 +56,13 @@ class CodexService:
         """Make HTTP request to Codex API service"""
         url = f"{self.api_base_url}/{endpoint}"
         try:
-            if method == "GET":
-                response = requests.get(url, timeout=30)
-            elif method == "POST":
-                response = requests.post(url, json=data, timeout=300)
-            else:
-                raise ValueError(f"Unsupported HTTP method: {method}")
+            with external_call("codex", f"{method} /{endpoint}"):
+                if method == "GET":
+                    response = requests.get(url, timeout=CODEX_GET_TIMEOUT)
+                elif method == "POST":
+                    response = requests.post(url, json=data, timeout=CODEX_SUBMIT_TIMEOUT)
+                else:
+                    raise ValueError(f"Unsupported HTTP method: {method}")
             
             response.raise_for_status()
             return response.json()
@@ -67,76 +73,113 @@ class CodexService:
             self.logger.error(f"Unexpected error in API request: {e}")
             return {"success": False, "error": str(e)}
     
-    def get_list_repos(self) -> List[Dict[str, str]]:
-        """Get list of repositories from Codex API"""
+    async def _make_api_request_async(self, endpoint: str, method: str = "GET", data: dict = None) -> dict:
+        """Make HTTP request to Codex API service on the pooled async client"""
+        client = get_client("codex", self.api_base_url, CODEX_GET_TIMEOUT)
+        try:
+            with external_call("codex", f"{method} /{endpoint}"):
+                if method == "GET":
+                    response = await client.get(f"/{endpoint}")
+                elif method == "POST":
+                    response = await client.post(f"/{endpoint}", json=data, timeout=CODEX_SUBMIT_TIMEOUT)
+                else:
+                    raise ValueError(f"Unsupported HTTP method: {method}")
+            
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPError as e:
+            self.logger.error(f"API request failed: {e}")
+            return {"success": False, "error": str(e)}
+        except Exception as e:
+            self.logger.error(f"Unexpected error in API request: {e}")
+            return {"success": False, "error": str(e)}
+    
+    def _start_log(self, message: str) -> str:
+        """Log the start of an operation; returns its JSON log path"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         json_log_path = os.path.join(LOGS_DIR, f"codex_{timestamp}.json")
-        
+        self.logger.info(f"{message} via API")
+        self._log_json(json_log_path, message)
+        return json_log_path
+    
+    def _repos_result(self, response: dict, json_log_path: str) -> List[Dict[str, str]]:
+        if response.get("success", False):
+            repositories = response.get("repositories", [])
+            self.logger.info(f"Found {len(repositories)} repositories")
+            self._log_json(json_log_path, f"Found {len(repositories)} repositories")
+            return repositories
+        else:
+            error_msg = response.get("error", "Unknown error")
+            self.logger.error(f"API request failed: {error_msg}")
+            self._log_json(json_log_path, f"API Error: {error_msg}")
+            return []
+    
+    def _repos_error(self, e: Exception, json_log_path: str) -> List[Dict[str, str]]:
+        self.logger.error(f"Error getting repository list: {e}")
+        self._log_json(json_log_path, f"Error: {str(e)}")
+        return []
+    
+    def _submit_result(self, response: dict, json_log_path: str) -> Dict[str, any]:
+        if response.get("success", False):
+            self.logger.info("Prompt submitted successfully")
+            self._log_json(json_log_path, "Prompt submitted successfully")
+            return response
+        else:
+            error_msg = response.get("error", "Unknown error")
+            self.logger.error(f"API request failed: {error_msg}")
+            self._log_json(json_log_path, f"API Error: {error_msg}")
+            return {
+                "success": False,
+                "message": f"Failed to submit prompt: {error_msg}",
+                "error": error_msg
+            }
+    
+    def _submit_error(self, e: Exception, json_log_path: str) -> Dict[str, any]:
+        self.logger.error(f"Error submitting prompt: {e}")
+        self._log_json(json_log_path, f"Error: {str(e)}")
+        return {
+            "success": False,
+            "message": f"Error submitting prompt: {str(e)}",
+            "error": str(e)
+        }
+    
+    def get_list_repos(self) -> List[Dict[str, str]]:
+        """Get list of repositories from Codex API"""
+        json_log_path = self._start_log("Codex repository list retrieval started")
         try:
-            self.logger.info("Starting Codex repository list retrieval via API")
-            self._log_json(json_log_path, "Codex repository list retrieval started")
-            
-            # Make API request to get repositories
             response = self._make_api_request("repositories")
-            
-            if response.get("success", False):
-                repositories = response.get("repositories", [])
-                self.logger.info(f"Found {len(repositories)} repositories")
-                self._log_json(json_log_path, f"Found {len(repositories)} repositories")
-                return repositories
-            else:
-                error_msg = response.get("error", "Unknown error")
-                self.logger.error(f"API request failed: {error_msg}")
-                self._log_json(json_log_path, f"API Error: {error_msg}")
-                return []
-            
+            return self._repos_result(response, json_log_path)
         except Exception as e:
-            self.logger.error(f"Error getting repository list: {e}")
-            self._log_json(json_log_path, f"Error: {str(e)}")
-            return []
-        
-
+            return self._repos_error(e, json_log_path)
+    
+    async def get_list_repos_async(self) -> List[Dict[str, str]]:
+        """Get list of repositories from Codex API without blocking the event loop"""
+        json_log_path = self._start_log("Codex repository list retrieval started")
+        try:
+            response = await self._make_api_request_async("repositories")
+            return self._repos_result(response, json_log_path)
+        except Exception as e:
+            return self._repos_error(e, json_log_path)
     
     def submit_prompt(self, prompt: str, repo_label: str) -> Dict[str, any]:
         """Submit prompt to Codex API with specified repository"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        json_log_path = os.path.join(LOGS_DIR, f"codex_{timestamp}.json")
-        
+        json_log_path = self._start_log(f"Submitting prompt to repository: {repo_label}")
         try:
-            self.logger.info(f"Submitting prompt to repository: {repo_label} via API")
-            self._log_json(json_log_path, f"Submitting prompt to repository: {repo_label}")
-            
-            # Prepare API request data
-            request_data = {
-                "prompt": prompt,
-                "repository": repo_label
-            }
-            
-            # Make API request to submit prompt
+            request_data = {"prompt": prompt, "repository": repo_label}
             response = self._make_api_request("submit", method="POST", data=request_data)
-            
-            if response.get("success", False):
-                self.logger.info("Prompt submitted successfully")
-                self._log_json(json_log_path, "Prompt submitted successfully")
-                return response
-            else:
-                error_msg = response.get("error", "Unknown error")
-                self.logger.error(f"API request failed: {error_msg}")
-                self._log_json(json_log_path, f"API Error: {error_msg}")
-                return {
-                    "success": False,
-                    "message": f"Failed to submit prompt: {error_msg}",
-                    "error": error_msg
-                }
-            
+            return self._submit_result(response, json_log_path)
         except Exception as e:
-            self.logger.error(f"Error submitting prompt: {e}")
-            self._log_json(json_log_path, f"Error: {str(e)}")
-            return {
-                "success": False,
-                "message": f"Error submitting prompt: {str(e)}",
-                "error": str(e)
-            }
+            return self._submit_error(e, json_log_path)
+    
+    async def submit_prompt_async(self, prompt: str, repo_label: str) -> Dict[str, any]:
+        """Submit prompt to Codex API without blocking the event loop"""
+        json_log_path = self._start_log(f"Submitting prompt to repository: {repo_label}")
+        try:
+            request_data = {"prompt": prompt, "repository": repo_label}
+            response = await self._make_api_request_async("submit", method="POST", data=request_data)
+            return self._submit_result(response, json_log_path)
+        except Exception as e:
+            return self._submit_error(e, json_log_path)
     
 
 
@@ -1,10 +1,40 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
 import requests
-from backend.services.scenario import ScenarioService
+from bisect import bisect_left
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from requests.adapters import HTTPAdapter
+from services.scenario import ScenarioService
 from utils.logger import logger
+from utils.request_timing import record_external
 from enum import Enum
 
-DIFY_BASE_URL = "https://api.dify.ai/v1"
-DIFY_BASE_URL_LOCAL = "http://api:5001/v1"
+DIFY_BASE_URL = os.environ.get("DIFY_BASE_URL", "https://api.dify.ai/v1")
+DIFY_BASE_URL_LOCAL = os.environ.get("DIFY_BASE_URL_LOCAL", "http://api:5001/v1")
+
+DIFY_TIMEOUT = float(os.environ.get("DIFY_TIMEOUT", "30"))
+DIFY_CONNECT_TIMEOUT = float(os.environ.get("DIFY_CONNECT_TIMEOUT", "10"))
+# Dify sends a ping event every ~10s, so a silent stream for this long is dead
+DIFY_STREAM_READ_TIMEOUT = float(os.environ.get("DIFY_STREAM_READ_TIMEOUT", "120"))
+DIFY_MAX_RETRIES = int(os.environ.get("DIFY_MAX_RETRIES", "3"))
+DIFY_RETRY_BACKOFF = float(os.environ.get("DIFY_RETRY_BACKOFF", "0.5"))
+DIFY_RETRY_BACKOFF_MAX = float(os.environ.get("DIFY_RETRY_BACKOFF_MAX", "8"))
+DIFY_POOL_MAXSIZE = int(os.environ.get("DIFY_POOL_MAXSIZE", "20"))
+
+DIFY_METADATA_TTL = float(os.environ.get("DIFY_METADATA_TTL", "300"))
+DIFY_METADATA_STALE_TTL = float(os.environ.get("DIFY_METADATA_STALE_TTL", "3600"))
+DIFY_METADATA_CACHE_MONGO = os.environ.get("DIFY_METADATA_CACHE_MONGO", "true").lower() in ("1", "true", "yes")
+DIFY_METADATA_CACHE_MAX_ENTRIES = int(os.environ.get("DIFY_METADATA_CACHE_MAX_ENTRIES", "1000"))
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+TERMINAL_RUN_STATUSES = ("succeeded", "failed", "stopped")
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
 
 
 class DifyMode(Enum):
@@ -20,73 +50,390 @@ def get_dify_base_url(mode):
 
 def get_headers(api_key):
     masked = api_key[:6] + "..." if api_key else "None"
-    logger.info(f"Generating Dify headers for api_key: {masked}")
+    logger.debug(f"Generating Dify headers for api_key: {masked}")
     return {"Authorization": f"Bearer {api_key}"}
 
 
-def fetch_info(api_key, mode=DifyMode.CLOUD):
-    try:
-        base_url = get_dify_base_url(mode)
-        resp = requests.get(
-            f"{base_url}/info", headers=get_headers(api_key), timeout=30
-        )
-        resp.raise_for_status()
-        return resp.json()
-    except requests.exceptions.Timeout:
-        logger.error("Dify API request timed out (info endpoint).")
-        raise
-    except Exception as e:
-        logger.error(f"Failed to fetch Dify info: {e}")
-        raise
+class LatencyHistogram:
+    """Fixed-bucket latency histogram for one Dify endpoint."""
 
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
 
-def fetch_site(api_key, mode=DifyMode.CLOUD):
-    try:
-        base_url = get_dify_base_url(mode)
-        resp = requests.get(
-            f"{base_url}/site", headers=get_headers(api_key), timeout=30
+    def observe(self, elapsed_ms, ok=True):
+        self.counts[bisect_left(self.buckets, elapsed_ms)] += 1
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        if not ok:
+            self.errors += 1
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th percentile."""
+        if not self.count:
+            return 0
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else round(self.max_ms, 1)
+        return round(self.max_ms, 1)
+
+    def snapshot(self):
+        buckets = {f"le_{b}": c for b, c in zip(self.buckets, self.counts)}
+        buckets["le_inf"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "avg_ms": round(self.total_ms / self.count, 1) if self.count else 0,
+            "max_ms": round(self.max_ms, 1),
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "buckets": buckets,
+        }
+
+
+class DifyClient:
+    """
+    HTTP client for one Dify base URL.
+
+    A single requests.Session keeps connections alive across calls. Requests
+    are retried with jittered exponential backoff on 429/5xx and connection
+    errors; non-idempotent calls are only retried when Dify did not accept
+    them (429 or connect failure).
+    """
+
+    def __init__(self, base_url, timeout=DIFY_TIMEOUT, max_retries=DIFY_MAX_RETRIES,
+                 backoff=DIFY_RETRY_BACKOFF, backoff_max=DIFY_RETRY_BACKOFF_MAX,
+                 pool_maxsize=DIFY_POOL_MAXSIZE):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._latency = defaultdict(LatencyHistogram)
+        self._lock = threading.Lock()
+
+    def _observe(self, endpoint, start, ok):
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self._latency[endpoint].observe(elapsed_ms, ok)
+        record_external("dify", endpoint, elapsed_ms / 1000)
+
+    def _retry_delay(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        # Full jitter keeps concurrent callers from retrying in lockstep
+        return random.uniform(0, min(self.backoff_max, self.backoff * (2 ** attempt)))
+
+    def request(self, method, path, api_key, endpoint=None, idempotent=True, **kwargs):
+        """Send a request, retrying transient failures; returns the final Response."""
+        url = f"{self.base_url}{path}"
+        endpoint = endpoint or f"{method} {path}"
+        headers = get_headers(api_key)
+        headers.update(kwargs.pop("headers", None) or {})
+        kwargs.setdefault("timeout", self.timeout)
+        retry_statuses = RETRY_STATUS_CODES if idempotent else (429,)
+        retry_errors = (
+            (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+            if idempotent else (requests.exceptions.ConnectTimeout,)
         )
-        resp.raise_for_status()
-        return resp.json()
-    except requests.exceptions.Timeout:
-        logger.error("Dify API request timed out (site endpoint).")
-        raise
-    except Exception as e:
-        logger.error(f"Failed to fetch Dify site: {e}")
-        raise
+
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, headers=headers, **kwargs)
+            except retry_errors as e:
+                self._observe(endpoint, start, False)
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._retry_delay(attempt)
+                logger.warning(f"Dify {endpoint} failed ({type(e).__name__}), retrying in {delay:.2f}s")
+            except Exception:
+                self._observe(endpoint, start, False)
+                raise
+            else:
+                # For streamed responses this is the time to response headers
+                self._observe(endpoint, start, response.status_code < 400)
+                if response.status_code not in retry_statuses or attempt >= self.max_retries:
+                    return response
+                delay = self._retry_delay(attempt, response)
+                logger.warning(f"Dify {endpoint} returned {response.status_code}, retrying in {delay:.2f}s")
+                response.close()
+            attempt += 1
+            time.sleep(delay)
+
+    def get_json(self, path, api_key, endpoint=None, **kwargs):
+        response = self.request("GET", path, api_key, endpoint=endpoint, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def latency_stats(self):
+        with self._lock:
+            return {endpoint: hist.snapshot() for endpoint, hist in self._latency.items()}
+
+    def close(self):
+        self.session.close()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
 
 
-def fetch_parameters(api_key, mode=DifyMode.CLOUD):
+def _reset_clients_after_fork():
+    # Never share keep-alive sockets with the parent process
+    global _clients, _clients_lock
+    _clients = {}
+    _clients_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_clients_after_fork)
+
+
+def get_client(mode=DifyMode.CLOUD):
+    """Return the shared DifyClient for the base URL of this mode."""
+    base_url = get_dify_base_url(mode)
+    client = _clients.get(base_url)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(base_url)
+            if client is None:
+                client = DifyClient(base_url)
+                _clients[base_url] = client
+    return client
+
+
+def get_latency_stats():
+    """Per-endpoint latency histograms for every Dify base URL used by this process."""
+    return {base_url: client.latency_stats() for base_url, client in list(_clients.items())}
+
+
+class MetadataCache:
+    """
+    Cache of Dify app metadata (info/site/parameters) keyed by api_key.
+
+    Entries are fresh for ttl seconds. Until stale_ttl they are still served
+    while a single background refresh runs (stale-while-revalidate); older
+    entries are fetched synchronously, one fetch per key at a time. With
+    use_mongo, entries are also kept in the dify_metadata_cache collection so
+    every backend worker shares them. Only a hash of the api_key is stored.
+    """
+
+    def __init__(self, ttl=DIFY_METADATA_TTL, stale_ttl=DIFY_METADATA_STALE_TTL,
+                 use_mongo=DIFY_METADATA_CACHE_MONGO, max_entries=DIFY_METADATA_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl, ttl)
+        self.use_mongo = use_mongo
+        self.max_entries = max_entries
+        self._entries = {}
+        self._key_locks = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._stats = defaultdict(int)
+
+    @staticmethod
+    def api_key_hash(api_key):
+        return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()
+
+    def _key(self, api_key, mode, kind):
+        return f"{self.api_key_hash(api_key)}:{get_dify_base_url(mode)}:{kind}"
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _load(self, key):
+        """Local entry, or the shared one if it is newer and the local one is not fresh."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if not self.use_mongo or (entry is not None and time.time() - entry[1] < self.ttl):
+            return entry
+        try:
+            from utils import database
+
+            doc = database.get_dify_metadata_cache(key)
+        except Exception as e:
+            logger.warning(f"Dify metadata cache lookup failed: {e}")
+            return entry
+        if not doc or (entry is not None and doc["fetched_at"] <= entry[1]):
+            return entry
+        shared = (doc["value"], doc["fetched_at"])
+        with self._lock:
+            self._entries[key] = shared
+            self._stats["mongo_hits"] += 1
+        return shared
+
+    def _store(self, key, value, fetched_at):
+        with self._lock:
+            self._entries[key] = (value, fetched_at)
+            if len(self._entries) > self.max_entries:
+                oldest = min(self._entries, key=lambda k: self._entries[k][1])
+                self._entries.pop(oldest, None)
+        if self.use_mongo:
+            try:
+                from utils import database
+
+                database.set_dify_metadata_cache(key, key.split(":", 1)[0], value, fetched_at)
+            except Exception as e:
+                logger.warning(f"Dify metadata cache write failed: {e}")
+
+    def _refresh_async(self, key, fetcher):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                entry = self._load(key)
+                if entry is not None and time.time() - entry[1] < self.ttl:
+                    return  # Another worker already refreshed it
+                self._store(key, fetcher(), time.time())
+                self._count("refreshes")
+            except Exception as e:
+                self._count("refresh_errors")
+                logger.warning(f"Background refresh of Dify metadata failed: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, name="dify-meta-refresh", daemon=True).start()
+
+    def get(self, api_key, mode, kind, fetcher):
+        key = self._key(api_key, mode, kind)
+        entry = self._load(key)
+        if entry is not None:
+            age = time.time() - entry[1]
+            if age < self.ttl:
+                self._count("hits")
+                return entry[0]
+            if age < self.stale_ttl:
+                self._count("stale_hits")
+                self._refresh_async(key, fetcher)
+                return entry[0]
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            # Another caller or worker may have fetched it while we waited
+            entry = self._load(key)
+            if entry is not None and time.time() - entry[1] < self.ttl:
+                self._count("hits")
+                return entry[0]
+            self._count("misses")
+            value = fetcher()
+            self._store(key, value, time.time())
+            return value
+
+    def put(self, api_key, mode, kind, value):
+        self._store(self._key(api_key, mode, kind), value, time.time())
+
+    def invalidate(self, api_key):
+        """Drop every cached entry for this api_key, in both tiers."""
+        prefix = self.api_key_hash(api_key) + ":"
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+                self._key_locks.pop(key, None)
+            self._stats["invalidations"] += 1
+        if self.use_mongo:
+            try:
+                from utils import database
+
+                database.delete_dify_metadata_cache(prefix[:-1])
+            except Exception as e:
+                logger.warning(f"Dify metadata cache invalidation failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "ttl": self.ttl,
+                "stale_ttl": self.stale_ttl,
+                "mongo": self.use_mongo,
+                **self._stats,
+            }
+
+
+metadata_cache = MetadataCache()
+
+
+def invalidate_metadata(api_key):
+    metadata_cache.invalidate(api_key)
+
+
+def _request_metadata(api_key, mode, kind):
     try:
-        base_url = get_dify_base_url(mode)
-        resp = requests.get(
-            f"{base_url}/parameters", headers=get_headers(api_key), timeout=30
-        )
-        resp.raise_for_status()
-        return resp.json()
+        return get_client(mode).get_json(f"/{kind}", api_key)
     except requests.exceptions.Timeout:
-        logger.error("Dify API request timed out (parameters endpoint).")
+        logger.error(f"Dify API request timed out ({kind} endpoint).")
         raise
     except Exception as e:
-        logger.error(f"Failed to fetch Dify parameters: {e}")
+        logger.error(f"Failed to fetch Dify {kind}: {e}")
         raise
 
 
+def _fetch_metadata_endpoint(api_key, mode, kind, use_cache):
+    if not use_cache:
+        value = _request_metadata(api_key, mode, kind)
+        metadata_cache.put(api_key, mode, kind, value)
+        return value
+    return metadata_cache.get(api_key, mode, kind, lambda: _request_metadata(api_key, mode, kind))
+
+
+def fetch_info(api_key, mode=DifyMode.CLOUD, use_cache=True):
+    return _fetch_metadata_endpoint(api_key, mode, "info", use_cache)
+
+
+def fetch_site(api_key, mode=DifyMode.CLOUD, use_cache=True):
+    return _fetch_metadata_endpoint(api_key, mode, "site", use_cache)
+
+
+def fetch_parameters(api_key, mode=DifyMode.CLOUD, use_cache=True):
+    return _fetch_metadata_endpoint(api_key, mode, "parameters", use_cache)
+
+
+def fetch_metadata(api_key, mode=DifyMode.CLOUD, include_site=False, use_cache=True):
+    """Fetch info and parameters (and optionally site) concurrently."""
+    calls = {"info": fetch_info, "parameters": fetch_parameters}
+    if include_site:
+        calls["site"] = fetch_site
+    with ThreadPoolExecutor(max_workers=len(calls), thread_name_prefix="dify-meta") as executor:
+        futures = {key: executor.submit(fn, api_key, mode, use_cache) for key, fn in calls.items()}
+        return {key: future.result() for key, future in futures.items()}
+
+
 def upload_document_to_dify(
     api_key, filepath, filename, mimetype, user, mode=DifyMode.CLOUD
 ):
     """Upload a document to Dify using the /upload endpoint and return the Dify document ID."""
     try:
         logger.info(f"Uploading file to Dify /upload endpoint: {filename}")
-        base_url = get_dify_base_url(mode)
-        url = f"{base_url}/files/upload"
-        headers = get_headers(api_key)
-        files = {"file": (filename, open(filepath, "rb"), mimetype)}
+        client = get_client(mode)
+        # Read once so a retried request can resend the same body
+        with open(filepath, "rb") as f:
+            files = {"file": (filename, f.read(), mimetype)}
         data = {"user": user or "hieult", "type": "document"}
-        logger.info(f"POST {url} with user={user} and type=document")
+        logger.info(f"POST {client.base_url}/files/upload with user={user} and type=document")
 
-        response = requests.post(
-            url, headers=headers, files=files, data=data, timeout=30
+        response = client.request(
+            "POST", "/files/upload", api_key, files=files, data=data, idempotent=False
         )
 
         logger.info(f"Dify upload response status: {response.status_code}")
@@ -109,13 +456,10 @@ def upload_document_to_dify(
 def run_workflow_with_dify(api_key, inputs, user, response_mode, mode=DifyMode.CLOUD):
     """Run a workflow via Dify API using the workflow's api_key."""
     try:
-        base_url = get_dify_base_url(mode)
-        url = f"{base_url}/workflows/run"
-        headers = get_headers(api_key)
-        headers["Content-Type"] = "application/json"
+        client = get_client(mode)
         payload = {"inputs": inputs, "user": user, "response_mode": response_mode}
-        logger.info(f"POST {url} with payload: {payload}")
-        response = requests.post(url, headers=headers, json=payload, timeout=30)
+        logger.info(f"POST {client.base_url}/workflows/run with payload: {payload}")
+        response = client.request("POST", "/workflows/run", api_key, json=payload, idempotent=False)
         logger.info(f"Dify workflow run response status: {response.status_code}")
         logger.info(f"Dify workflow run response: {response.text}")
         response.raise_for_status()
@@ -128,17 +472,67 @@ def run_workflow_with_dify(api_key, inputs, user, response_mode, mode=DifyMode.C
         raise
 
 
+def iter_sse_events(lines):
+    """Parse Server-Sent Events lines into JSON payload dicts."""
+    data_lines = []
+    for line in lines:
+        if line is None:
+            continue
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        if not line:
+            # A blank line terminates the current event
+            if data_lines:
+                payload = "\n".join(data_lines)
+                data_lines = []
+                try:
+                    yield json.loads(payload)
+                except ValueError:
+                    logger.warning(f"Skipping malformed Dify stream event: {payload[:200]}")
+            continue
+        if line.startswith(":"):
+            continue
+        field, _, value = line.partition(":")
+        if field == "data":
+            data_lines.append(value[1:] if value.startswith(" ") else value)
+    if data_lines:
+        try:
+            yield json.loads("\n".join(data_lines))
+        except ValueError:
+            logger.warning("Skipping malformed trailing Dify stream event")
+
+
+def stream_workflow_with_dify(api_key, inputs, user, mode=DifyMode.CLOUD):
+    """Run a workflow in streaming mode and yield each event as it arrives."""
+    client = get_client(mode)
+    payload = {"inputs": inputs, "user": user, "response_mode": "streaming"}
+    logger.info(f"POST {client.base_url}/workflows/run (streaming)")
+    with client.request(
+        "POST",
+        "/workflows/run",
+        api_key,
+        endpoint="POST /workflows/run (stream)",
+        idempotent=False,
+        headers={"Accept": "text/event-stream"},
+        json=payload,
+        stream=True,
+        timeout=(DIFY_CONNECT_TIMEOUT, DIFY_STREAM_READ_TIMEOUT),
+    ) as response:
+        logger.info(f"Dify workflow stream response status: {response.status_code}")
+        response.raise_for_status()
+        response.encoding = "utf-8"
+        yield from iter_sse_events(response.iter_lines(decode_unicode=True))
+
+
 # Hàm lấy logs workflow
 
 
 def get_workflow_logs(api_key, mode=DifyMode.CLOUD):
     """Get workflow logs from Dify API."""
     try:
-        base_url = get_dify_base_url(mode)
-        url = f"{base_url}/workflows/logs"
-        headers = get_headers(api_key)
-        logger.info(f"GET {url} for workflow logs")
-        response = requests.get(url, headers=headers, timeout=30)
+        client = get_client(mode)
+        logger.info(f"GET {client.base_url}/workflows/logs for workflow logs")
+        response = client.request("GET", "/workflows/logs", api_key)
         logger.info(f"Dify logs response status: {response.status_code}")
         logger.info(f"Dify logs response: {response.text}")
         response.raise_for_status()
@@ -158,20 +552,23 @@ def update_execution_from_dify_result(
     Fetch execution result from Dify using workflow_run_id and update execution.
     """
     try:
-        url = f"{get_dify_base_url(mode)}/workflows/run/{workflow_run_id}"
-        headers = get_headers(api_key)
-        response = requests.get(url, headers=headers, timeout=30)
-        response.raise_for_status()
-        result = response.json()
+        result = get_client(mode).get_json(
+            f"/workflows/run/{workflow_run_id}", api_key, endpoint="GET /workflows/run/{id}"
+        )
 
         # Update execution in DB
+        status = result.get("status", "unknown")
         update_data = {
-            "status": result.get("status", "unknown"),
+            "status": status,
             "outputs": result.get("outputs"),
             "error": result.get("error"),
             "total_steps": result.get("total_steps"),
             "total_tokens": result.get("total_tokens"),
+            "elapsed_time": result.get("elapsed_time"),
         }
+        if status in TERMINAL_RUN_STATUSES:
+            update_data["finished_at"] = datetime.utcnow()
+            update_data["stream_lost"] = False
 
         from utils import database
 
@@ -188,6 +585,7 @@ def update_execution_from_dify_result(
                 {"structured_output": result["outputs"]["structured_output"]},
                 execution_id,
             )
+        return result
     except Exception as e:
         logger.error(f"Failed to update execution result from Dify: {str(e)}")
         raise
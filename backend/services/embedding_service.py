@@ -0,0 +1,234 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+import numpy as np
+from utils.logger import logger
+from utils.request_timing import external_call
+from utils.vector_codec import encode_vector, decode_vector
+from services.embedding_worker import worker_client, WorkerUnavailable, EMBEDDING_WORKER_MODE
+
+EMBEDDING_MODEL_NAME = os.environ.get("EMBEDDING_MODEL_NAME", os.environ.get("FIXCHAIN_EMBEDDING_MODEL", "all-MiniLM-L6-v2"))
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_CACHE_SIZE = int(os.environ.get("EMBEDDING_CACHE_SIZE", "10000"))
+EMBEDDING_CACHE_MONGO = os.environ.get("EMBEDDING_CACHE_MONGO", "true").lower() in ("1", "true", "yes")
+# Encode in-process when the shared worker cannot be reached
+EMBEDDING_WORKER_FALLBACK = os.environ.get("EMBEDDING_WORKER_FALLBACK", "true").lower() in ("1", "true", "yes")
+
+
+class EmbeddingCache:
+    """
+    Content-hash cache of embedding vectors.
+
+    Keys are the SHA-256 of model name, normalisation flag and text, so the
+    same text is only ever encoded once per model. A bounded in-memory LRU
+    sits in front of the embedding_cache collection, which every worker and
+    restart shares.
+    """
+
+    def __init__(self, max_entries=EMBEDDING_CACHE_SIZE, use_mongo=EMBEDDING_CACHE_MONGO):
+        self.max_entries = max_entries
+        self.use_mongo = use_mongo
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text, model_name=EMBEDDING_MODEL_NAME, normalize=True):
+        return hashlib.sha256(f"{model_name}\x00{int(normalize)}\x00{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys):
+        """Return ({key: vector}, memory hits, store hits) for the keys found in either tier."""
+        found = {}
+        with self._lock:
+            for key in keys:
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    found[key] = vector
+        memory_hits = len(found)
+        missing = [key for key in keys if key not in found]
+        if missing and self.use_mongo:
+            try:
+                from utils import database
+
+                stored = {key: decode_vector(vector)
+                          for key, vector in database.get_embedding_cache_entries(missing).items()}
+            except Exception as e:
+                logger.warning(f"Embedding cache lookup failed: {e}")
+                stored = {}
+            self._remember(stored)
+            found.update(stored)
+        return found, memory_hits, len(found) - memory_hits
+
+    def put_many(self, vectors, model_name=EMBEDDING_MODEL_NAME):
+        self._remember(vectors)
+        if self.use_mongo and vectors:
+            try:
+                from utils import database
+
+                database.set_embedding_cache_entries(
+                    # Cached at full float32 precision so hits match a fresh encode exactly
+                    {key: encode_vector(vector, 'float32') for key, vector in vectors.items()}, model_name
+                )
+            except Exception as e:
+                logger.warning(f"Embedding cache write failed: {e}")
+
+    def _remember(self, vectors):
+        with self._lock:
+            for key, vector in vectors.items():
+                self._entries[key] = vector
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class EmbeddingService:
+    """
+    Batched sentence embeddings with deduplication through EmbeddingCache.
+
+    With a worker client, encoding is delegated to the shared embedding
+    worker process and the model is never loaded here unless it is down.
+    """
+
+    def __init__(self, model_name=EMBEDDING_MODEL_NAME, batch_size=EMBEDDING_BATCH_SIZE, cache=None, worker=None):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.cache = cache or EmbeddingCache()
+        self.worker = worker
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._totals = defaultdict(float)
+
+    @property
+    def model(self):
+        """Lazy load embedding model."""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+
+                    logger.info(f"Loading sentence-transformers model: {self.model_name}")
+                    self._model = SentenceTransformer(self.model_name)
+                    logger.info("Embedding model loaded successfully")
+        return self._model
+
+    def preload(self):
+        """Start the shared worker, or load the local model, in the background."""
+        def run():
+            try:
+                if self.worker is None:
+                    self.encode(["warmup"], batch_size=1)
+                elif not self.worker.start():
+                    logger.warning(f"Embedding worker not reachable at {self.worker.socket_path}")
+            except Exception as e:
+                logger.error(f"Embedding preload failed: {e}")
+
+        threading.Thread(target=run, name='embedding-preload', daemon=True).start()
+
+    def status(self):
+        """Readiness of whatever will serve the next encode call."""
+        if self.worker is not None:
+            worker = self.worker.status()
+            if worker.get('ready') or not EMBEDDING_WORKER_FALLBACK:
+                return {'mode': 'worker', 'ready': bool(worker.get('ready')), 'worker': worker}
+            return {'mode': 'in_process_fallback', 'ready': self._model is not None, 'worker': worker}
+        return {'mode': 'in_process', 'ready': self._model is not None}
+
+    def encode(self, texts, normalize=True, batch_size=None):
+        """Encode texts in batches without touching the cache; returns a float32 matrix."""
+        if self.worker is not None:
+            try:
+                with external_call("embedding", "worker"):
+                    return np.asarray(self.worker.encode(texts, normalize, batch_size or self.batch_size),
+                                      dtype=np.float32)
+            except WorkerUnavailable as e:
+                if not EMBEDDING_WORKER_FALLBACK:
+                    raise
+                logger.warning(f"Embedding worker unavailable, encoding in-process: {e}")
+        with external_call("embedding", "in_process"):
+            return np.asarray(self.model.encode(
+                texts,
+                batch_size=batch_size or self.batch_size,
+                normalize_embeddings=normalize,
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            ), dtype=np.float32)
+
+    def embed_texts(self, texts, normalize=True, batch_size=None):
+        """
+        Embed a list of texts; returns (vectors, stats).
+
+        vectors[i] is a list of floats for texts[i], or None for empty text.
+        Identical texts are encoded once and cached vectors are reused.
+        """
+        start = time.perf_counter()
+        batch_size = batch_size or self.batch_size
+        keys = [self.cache.key(text, self.model_name, normalize) if text else None for text in texts]
+        unique = list(dict.fromkeys(key for key in keys if key))
+        found, memory_hits, store_hits = self.cache.get_many(unique)
+
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key and key not in found:
+                pending.setdefault(key, text)
+        encode_seconds = 0.0
+        if pending:
+            encode_start = time.perf_counter()
+            matrix = self.encode(list(pending.values()), normalize, batch_size)
+            encode_seconds = time.perf_counter() - encode_start
+            encoded = dict(zip(pending, matrix))
+            self.cache.put_many(encoded, self.model_name)
+            found.update(encoded)
+
+        vectors = [found[key].tolist() if key else None for key in keys]
+        elapsed = time.perf_counter() - start
+        requested = sum(1 for key in keys if key)
+        stats = {
+            'texts': requested,
+            'unique_texts': len(unique),
+            'memory_hits': memory_hits,
+            'store_hits': store_hits,
+            'encoded': len(pending),
+            'batches': -(-len(pending) // batch_size),
+            'batch_size': batch_size,
+            'cache_hit_rate': round((requested - len(pending)) / requested, 4) if requested else 0,
+            'encode_seconds': round(encode_seconds, 4),
+            'elapsed_seconds': round(elapsed, 4),
+            'texts_per_second': round(requested / elapsed, 1) if elapsed > 0 else 0,
+        }
+        with self._stats_lock:
+            for name in ('texts', 'memory_hits', 'store_hits', 'encoded', 'batches'):
+                self._totals[name] += stats[name]
+            self._totals['encode_seconds'] += encode_seconds
+            self._totals['elapsed_seconds'] += elapsed
+        if pending:
+            logger.info(f"Embedded {requested} texts ({len(pending)} encoded, {stats['cache_hit_rate']:.0%} cached) "
+                        f"at {stats['texts_per_second']} texts/s")
+        return vectors, stats
+
+    def embed_text(self, text, normalize=True):
+        vectors, _ = self.embed_texts([text], normalize)
+        return vectors[0]
+
+    def stats(self):
+        with self._stats_lock:
+            totals = dict(self._totals)
+        texts = totals.get('texts', 0)
+        encoded = totals.get('encoded', 0)
+        return {
+            'model': self.model_name,
+            'batch_size': self.batch_size,
+            'cached_in_memory': len(self.cache),
+            'texts': int(texts),
+            'encoded': int(encoded),
+            'cache_hit_rate': round((texts - encoded) / texts, 4) if texts else 0,
+            'encode_texts_per_second': round(encoded / totals['encode_seconds'], 1) if totals.get('encode_seconds') else 0,
+        }
+
+
+embedding_service = EmbeddingService(worker=worker_client if EMBEDDING_WORKER_MODE != 'off' else None)
@@ -0,0 +1,339 @@
+"""
+Shared embedding worker.
+
+One process loads the sentence-transformers model, warms it up and serves
+encode requests from every backend worker over a local Unix socket, so the
+model is loaded (and held in RAM) once per host instead of once per worker.
+
+Requests wait in a bounded queue; when it is full the worker answers
+"busy" right away and clients back off. Queued requests are coalesced into
+a single model.encode call. If the model fails to load, the worker stays
+up in a "failed" state and answers every encode request as unavailable,
+so clients fall back to encoding in-process. Run it standalone with
+
+    python -m services.embedding_worker
+
+or let the backend spawn it on demand (EMBEDDING_WORKER_MODE=auto).
+"""
+
+import argparse
+import fcntl
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+from multiprocessing import AuthenticationError
+from utils.logger import logger
+
+EMBEDDING_WORKER_MODE = os.environ.get("EMBEDDING_WORKER_MODE", "auto").lower()  # auto, external, off
+EMBEDDING_WORKER_SOCKET = os.environ.get("EMBEDDING_WORKER_SOCKET", "/tmp/vcs_embedding_worker.sock")
+EMBEDDING_WORKER_AUTHKEY = os.environ.get("EMBEDDING_WORKER_AUTHKEY", "vcs-embedding-worker").encode("utf-8")
+EMBEDDING_WORKER_QUEUE_SIZE = int(os.environ.get("EMBEDDING_WORKER_QUEUE_SIZE", "32"))
+EMBEDDING_WORKER_MAX_BATCH_TEXTS = int(os.environ.get("EMBEDDING_WORKER_MAX_BATCH_TEXTS", "512"))
+EMBEDDING_WORKER_TIMEOUT = float(os.environ.get("EMBEDDING_WORKER_TIMEOUT", "120"))
+EMBEDDING_WORKER_START_TIMEOUT = float(os.environ.get("EMBEDDING_WORKER_START_TIMEOUT", "30"))
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class WorkerUnavailable(Exception):
+    """The embedding worker could not be reached, or cannot serve encode requests."""
+
+
+class WorkerBusy(Exception):
+    """The embedding worker kept rejecting requests because its queue was full."""
+
+
+class EncodeJob:
+    def __init__(self, texts, normalize, batch_size):
+        self.texts = texts
+        self.normalize = normalize
+        self.batch_size = batch_size
+        self.response = None
+        self.done = threading.Event()
+
+
+class EmbeddingWorker:
+    """Server side: owns the model and a bounded queue of encode jobs."""
+
+    def __init__(self, socket_path=EMBEDDING_WORKER_SOCKET, queue_size=EMBEDDING_WORKER_QUEUE_SIZE,
+                 max_batch_texts=EMBEDDING_WORKER_MAX_BATCH_TEXTS):
+        from services.embedding_service import EmbeddingService
+
+        self.socket_path = socket_path
+        self.max_batch_texts = max_batch_texts
+        self.service = EmbeddingService(worker=None)
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.ready = threading.Event()
+        self.loaded = threading.Event()  # Set once loading finished, whether or not it succeeded
+        self._lock = threading.Lock()
+        self._status = {
+            'pid': os.getpid(),
+            'model': self.service.model_name,
+            'started_at': time.time(),
+            'load_ms': None,
+            'error': None,
+            'requests': 0,
+            'rejected': 0,
+            'texts': 0,
+            'forward_passes': 0,
+            'encode_seconds': 0.0,
+        }
+
+    def status(self):
+        with self._lock:
+            status = dict(self._status)
+        status.update({
+            'state': 'ready' if self.ready.is_set() else 'failed' if status['error'] else 'loading',
+            'ready': self.ready.is_set(),
+            'queue_depth': self.jobs.qsize(),
+            'queue_size': self.jobs.maxsize,
+        })
+        return status
+
+    def _load_model(self):
+        start = time.perf_counter()
+        try:
+            self.service.encode(["warmup"], batch_size=1)  # Loads the model and runs one pass
+        except Exception as e:
+            logger.error(f"Embedding worker failed to load model: {e}")
+            with self._lock:
+                self._status['error'] = str(e)
+            self.loaded.set()
+            return
+        with self._lock:
+            self._status['load_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        self.ready.set()
+        self.loaded.set()
+        logger.info(f"Embedding worker ready in {self._status['load_ms']} ms")
+
+    def _load_failure(self):
+        return {'ok': False, 'unavailable': True, 'error': f"Model failed to load: {self._status['error']}"}
+
+    def _encode_loop(self):
+        self.loaded.wait()
+        while True:
+            if not self.ready.is_set():
+                # Answer jobs queued while the model was loading
+                job = self.jobs.get()
+                job.response = self._load_failure()
+                job.done.set()
+                continue
+            jobs = [self.jobs.get()]
+            texts = len(jobs[0].texts)
+            # Coalesce whatever else is waiting into the same forward pass
+            while texts < self.max_batch_texts:
+                try:
+                    job = self.jobs.get_nowait()
+                except queue.Empty:
+                    break
+                jobs.append(job)
+                texts += len(job.texts)
+
+            groups = {}
+            for job in jobs:
+                groups.setdefault((job.normalize, job.batch_size), []).append(job)
+            for (normalize, batch_size), group in groups.items():
+                start = time.perf_counter()
+                try:
+                    matrix = self.service.encode([t for job in group for t in job.texts], normalize, batch_size)
+                except Exception as e:
+                    for job in group:
+                        job.response = {'ok': False, 'error': str(e)}
+                        job.done.set()
+                    continue
+                with self._lock:
+                    self._status['forward_passes'] += 1
+                    self._status['texts'] += len(matrix)
+                    self._status['encode_seconds'] += time.perf_counter() - start
+                offset = 0
+                for job in group:
+                    job.response = {'ok': True, 'vectors': matrix[offset:offset + len(job.texts)]}
+                    offset += len(job.texts)
+                    job.done.set()
+
+    def _handle(self, conn):
+        try:
+            while True:
+                try:
+                    request = conn.recv()
+                except EOFError:
+                    return
+                op = request.get('op')
+                if op == 'status':
+                    conn.send(self.status())
+                elif op == 'encode' and self._status['error']:
+                    conn.send(self._load_failure())
+                elif op == 'encode':
+                    job = EncodeJob(request['texts'], request.get('normalize', True), request.get('batch_size'))
+                    try:
+                        self.jobs.put_nowait(job)
+                    except queue.Full:
+                        with self._lock:
+                            self._status['rejected'] += 1
+                        conn.send({'ok': False, 'busy': True, 'error': 'Embedding queue is full'})
+                        continue
+                    with self._lock:
+                        self._status['requests'] += 1
+                    job.done.wait()
+                    conn.send(job.response)
+                else:
+                    conn.send({'ok': False, 'error': f'Unknown op: {op}'})
+        except (OSError, EOFError):
+            pass
+        finally:
+            conn.close()
+
+    def serve_forever(self):
+        os.makedirs(os.path.dirname(self.socket_path) or '.', exist_ok=True)
+        lock_file = open(self.socket_path + '.lock', 'w')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            logger.info("Another embedding worker already owns %s", self.socket_path)
+            return
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)  # Left behind by a worker that died
+        listener = Listener(self.socket_path, family='AF_UNIX', authkey=EMBEDDING_WORKER_AUTHKEY)
+        os.chmod(self.socket_path, 0o600)
+        logger.info(f"Embedding worker {os.getpid()} listening on {self.socket_path}")
+
+        threading.Thread(target=self._load_model, name='embedding-load', daemon=True).start()
+        threading.Thread(target=self._encode_loop, name='embedding-encode', daemon=True).start()
+        try:
+            while True:
+                try:
+                    conn = listener.accept()
+                except AuthenticationError:
+                    logger.warning("Rejected embedding worker connection with a bad authkey")
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+        finally:
+            listener.close()
+            lock_file.close()
+
+
+class EmbeddingWorkerClient:
+    """Client side, used by every backend worker; connections are kept per thread."""
+
+    def __init__(self, socket_path=EMBEDDING_WORKER_SOCKET, mode=EMBEDDING_WORKER_MODE,
+                 timeout=EMBEDDING_WORKER_TIMEOUT, start_timeout=EMBEDDING_WORKER_START_TIMEOUT):
+        self.socket_path = socket_path
+        self.mode = mode
+        self.timeout = timeout
+        self.start_timeout = start_timeout
+        self._local = threading.local()
+        self._spawn_lock = threading.Lock()
+        self._spawned_at = 0.0
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            try:
+                conn = Client(self.socket_path, family='AF_UNIX', authkey=EMBEDDING_WORKER_AUTHKEY)
+            except (OSError, EOFError, AuthenticationError) as e:
+                raise WorkerUnavailable(f"Embedding worker unreachable at {self.socket_path}: {e}")
+            self._local.conn = conn
+        return conn
+
+    def _drop(self):
+        conn = getattr(self._local, 'conn', None)
+        self._local.conn = None
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+    def _call(self, request, timeout, spawn=True):
+        for attempt in range(2):
+            try:
+                conn = self._connect()
+            except WorkerUnavailable:
+                if attempt or not spawn or self.mode != 'auto' or not self.start():
+                    raise
+                continue
+            try:
+                conn.send(request)
+                if not conn.poll(timeout):
+                    self._drop()
+                    raise WorkerUnavailable(f"Embedding worker did not answer within {timeout:.0f}s")
+                return conn.recv()
+            except (OSError, EOFError) as e:
+                # The worker restarted since this connection was opened; reconnect once
+                self._drop()
+                if attempt:
+                    raise WorkerUnavailable(str(e))
+
+    def start(self, wait=True):
+        """Wait for the worker, spawning it first in auto mode; returns True once reachable."""
+        try:
+            self._connect()
+            return True
+        except WorkerUnavailable:
+            pass
+        with self._spawn_lock:
+            if self.mode == 'auto' and time.monotonic() - self._spawned_at > self.start_timeout:
+                logger.info("Starting shared embedding worker")
+                env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [BACKEND_DIR, os.environ.get('PYTHONPATH')])))
+                # The worker logs through utils.logger; its inherited stdout/stderr would outlive this process
+                subprocess.Popen(
+                    [sys.executable, '-m', 'services.embedding_worker', '--socket', self.socket_path],
+                    cwd=BACKEND_DIR, env=env, start_new_session=True,
+                    stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+                )
+                self._spawned_at = time.monotonic()
+        if not wait:
+            return True
+        deadline = time.monotonic() + self.start_timeout
+        while time.monotonic() < deadline:
+            try:
+                self._connect()
+                return True
+            except WorkerUnavailable:
+                time.sleep(0.2)
+        return False
+
+    def status(self):
+        """Worker status without spawning it; health checks must not start the model."""
+        try:
+            return dict(self._call({'op': 'status'}, 5, spawn=False), reachable=True)
+        except WorkerUnavailable as e:
+            return {'reachable': False, 'ready': False, 'state': 'unreachable', 'error': str(e)}
+
+    def encode(self, texts, normalize=True, batch_size=None):
+        """Encode through the worker; retries with backoff while it reports a full queue."""
+        deadline = time.monotonic() + self.timeout
+        backoff = 0.05
+        while True:
+            remaining = deadline - time.monotonic()
+            response = self._call({'op': 'encode', 'texts': list(texts), 'normalize': normalize,
+                                   'batch_size': batch_size}, max(remaining, 1))
+            if response.get('ok'):
+                return response['vectors']
+            if response.get('unavailable'):
+                raise WorkerUnavailable(response.get('error'))
+            if not response.get('busy'):
+                raise RuntimeError(f"Embedding worker error: {response.get('error')}")
+            if time.monotonic() + backoff > deadline:
+                raise WorkerBusy("Embedding worker queue stayed full")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 1.0)
+
+
+worker_client = EmbeddingWorkerClient()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve sentence embeddings to backend workers")
+    parser.add_argument('--socket', default=EMBEDDING_WORKER_SOCKET)
+    parser.add_argument('--queue-size', type=int, default=EMBEDDING_WORKER_QUEUE_SIZE)
+    args = parser.parse_args()
+    EmbeddingWorker(args.socket, args.queue_size).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
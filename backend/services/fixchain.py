@@ -1,94 +1,295 @@
+import atexit
+import html
+import json
+import os
+import re
+import threading
 import uuid
 from datetime import datetime, timezone
-from utils.database import get_connection
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+from utils import database
+from utils.database import get_db, get_rag_db
+from utils.mongo import MONGODB_DATABASE, FIXCHAIN_RAG_DATABASE
 from utils.logger import logger
-from sentence_transformers import SentenceTransformer
+from utils.vector_index import VectorIndex
+from utils.vector_codec import encode_vector, decode_vector, VECTOR_STORAGE_DTYPE
+from services.embedding_service import embedding_service
 import numpy as np
 from typing import List, Dict, Any, Optional
 
 # MongoDB database names for different collections
-SUGOI_DATABASE = "SugoiApp"  # For bug reports and general data
-FIXCHAIN_RAG_DATABASE = "FixChainRAG"  # For vector store and reasoning data
+SUGOI_DATABASE = MONGODB_DATABASE  # For bug reports and general data
+
+# Collections searchable by embedding: source -> (database getter, id field, pre-filter fields)
+VECTOR_SOURCES = {
+    'test_reasoning': (get_rag_db, 'entry_id', ('source_file', 'test_name', 'status', 'attempt_id')),
+    'bug_reports': (get_db, 'bug_id', ('source_file', 'bug_type', 'severity', 'status')),
+}
+BUG_EMBEDDING_FIELDS = ['description', 'code_snippet']
+VECTOR_SOURCES_BY_TYPE = {'bug': 'bug_reports', 'reasoning': 'test_reasoning'}
+
+# Performance analytics: session page sizes, time buckets ($dateTrunc units) and accuracy percentiles
+PERFORMANCE_PAGE_SIZE = 50
+PERFORMANCE_MAX_PAGE_SIZE = 500
+PERFORMANCE_BUCKETS = ('day', 'week', 'month')
+ACCURACY_PERCENTILES = (0.1, 0.5, 0.9)
+
+# NDJSON stream imports: record type -> (database getter, collection, id field, required fields)
+STREAM_RECORD_TYPES = {
+    'bug': (get_db, 'bug_reports', 'bug_id',
+            ('source_file', 'bug_type', 'severity', 'line_number', 'description', 'status')),
+    'reasoning': (get_rag_db, 'test_reasoning', 'entry_id',
+                  ('test_name', 'attempt_id', 'source_file', 'status', 'summary', 'output')),
+    'session': (get_db, 'execution_sessions', 'session_id',
+                ('source_file', 'session_number', 'start_time', 'end_time', 'total_duration',
+                 'bugs_detected', 'bugs_fixed', 'overall_status')),
+}
+STREAM_IMPORT_CHUNK_SIZE = int(os.environ.get("FIXCHAIN_IMPORT_CHUNK_SIZE", "500"))
+STREAM_IMPORT_MAX_CHUNK_SIZE = 5000
+STREAM_IMPORT_MAX_ERRORS = 100
+# A running import whose request has been silent this long may be taken over by a resume
+STREAM_IMPORT_STALE_SECONDS = int(os.environ.get("FIXCHAIN_IMPORT_STALE_SECONDS", "120"))
+
+
+# Hybrid reasoning search: reciprocal-rank fusion constant, candidates per leg, snippet length
+HYBRID_RRF_K = 60
+HYBRID_MIN_CANDIDATES = 100
+HYBRID_MAX_CANDIDATES = 1000
+HYBRID_MAX_PAGE_SIZE = 100
+HYBRID_MODES = ('hybrid', 'text', 'vector')
+SNIPPET_LENGTH = 200
+SNIPPET_FIELDS = ('summary', 'output')
+
+
+class ImportInProgress(Exception):
+    """Another request is still streaming into this import."""
 
 class FixChainService:
     """Service class for managing FixChain imports and operations."""
     
     def __init__(self):
         """Initialize FixChain service with embedding model."""
-        self._embedding_model = None
+        self._vector_indexes = {}
+        self._vector_lock = threading.Lock()
     
     @property
     def embedding_model(self):
         """Lazy load embedding model."""
-        if self._embedding_model is None:
-            try:
-                logger.info("Loading sentence-transformers model: all-MiniLM-L6-v2")
-                self._embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-                logger.info("Embedding model loaded successfully")
-            except Exception as e:
-                logger.error(f"Failed to load embedding model: {e}")
-                raise e
-        return self._embedding_model
+        return embedding_service.model
     
     def generate_embedding(self, text_fields: List[str], normalize: bool = True) -> List[float]:
         """Generate embedding from text fields."""
         try:
-            # Combine text fields
-            combined_text = " ".join(text_fields)
-            
-            # Generate embedding
-            embedding = self.embedding_model.encode(combined_text, normalize_embeddings=normalize)
-            
-            # Convert to list of floats
-            return embedding.tolist()
+            # Combine text fields; identical text is served from the embedding cache
+            return embedding_service.embed_text(" ".join(text_fields), normalize)
         except Exception as e:
             logger.error(f"Failed to generate embedding: {e}")
             raise e
     
     @staticmethod
-    def import_bug(data: Dict[str, Any]) -> Dict[str, Any]:
+    def embed_batch(texts: List[Optional[str]], batch_size: Optional[int] = None, label: str = 'import'):
+        """Embed many texts in batches; returns (vectors, stats), with None vectors if encoding fails."""
+        if not any(texts):
+            return [None] * len(texts), None
+        try:
+            return embedding_service.embed_texts(texts, batch_size=batch_size)
+        except Exception as e:
+            logger.warning(f"[{label}] Failed to generate embeddings: {e}")
+            return [None] * len(texts), None
+    
+    @staticmethod
+    def encode_embedding(embedding: Optional[List[float]], model_name: Optional[str] = None) -> Dict[str, Any]:
+        """Document fields for an embedding: a compact BinData vector plus its model, dimensions and dtype."""
+        if embedding is None or not len(embedding):
+            return {'embedding': None, 'embedding_dimensions': None,
+                    'embedding_dtype': None, 'embedding_model': None}
+        return {
+            'embedding': encode_vector(embedding),
+            'embedding_dimensions': len(embedding),
+            'embedding_dtype': VECTOR_STORAGE_DTYPE,
+            'embedding_model': model_name or embedding_service.model_name
+        }
+    
+    @staticmethod
+    def decode_embedding(value: Any) -> Optional[np.ndarray]:
+        """float32 vector for a stored embedding, whether BinData or a legacy float list."""
+        return decode_vector(value)
+    
+    def vector_index(self, source: str) -> VectorIndex:
+        """Get the k-NN index for a source, loading it from disk and catching up with Mongo on first use."""
+        index = self._vector_indexes.get(source)
+        if index is not None:
+            return index
+        with self._vector_lock:
+            if source not in self._vector_indexes:
+                get_database, id_field, filter_fields = VECTOR_SOURCES[source]
+                index = VectorIndex(source, filter_fields)
+                index.load()
+                index.sync(get_database()[source], id_field)
+                self._vector_indexes[source] = index
+            return self._vector_indexes[source]
+    
+    def refresh_vector_index(self, source: str) -> None:
+        """Pick up freshly imported vectors; indexes not yet loaded catch up on first search."""
+        index = self._vector_indexes.get(source)
+        if index is None:
+            return
+        try:
+            get_database, id_field, _ = VECTOR_SOURCES[source]
+            index.sync(get_database()[source], id_field)
+        except Exception as e:
+            logger.warning(f"[vector_index] Failed to sync {source} index: {e}")
+    
+    def remove_from_vector_index(self, source: str, item_ids: List[str]) -> None:
+        """Drop deleted documents from a loaded index; sync only sees documents that still exist."""
+        index = self._vector_indexes.get(source)
+        if index is not None:
+            index.remove(item_ids)
+    
+    def save_vector_indexes(self) -> None:
+        for index in list(self._vector_indexes.values()):
+            index.save()
+    
+    def vector_search(self, source: str, k: int = 10, query: Optional[str] = None,
+                      embedding: Optional[List[float]] = None, filters: Optional[Dict[str, Any]] = None,
+                      exclude_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Cosine k-NN over a source's embeddings, with metadata pre-filters."""
+        if embedding is None:
+            if not query:
+                raise ValueError("query or embedding is required")
+            embedding = self.generate_embedding([query])
+        get_database, id_field, _ = VECTOR_SOURCES[source]
+        collection = get_database()[source]
+        index = self.vector_index(source)
+        index.ensure_synced(collection, id_field)
+        hits, stats = index.search(embedding, k, filters, exclude_ids)
+        
+        scores = dict(hits)
+        docs = collection.find({id_field: {'$in': list(scores)}}, {'_id': 0, 'embedding': 0})
+        by_id = {doc[id_field]: doc for doc in docs}
+        results = []
+        for item_id, score in hits:
+            doc = by_id.get(item_id)
+            if doc is not None:
+                doc['score'] = round(score, 6)
+                results.append(doc)
+        logger.info(f"[vector_search] {source}: {len(results)} results, {stats['mode']} scan of {stats['scanned']} rows")
+        return {
+            'results': results,
+            'total_found': len(results),
+            'search': stats,
+            'filters_applied': filters or {}
+        }
+    
+    @staticmethod
+    def _bug_embedding_text(bug_data: Dict[str, Any]) -> Optional[str]:
+        texts = [str(bug_data[field]) for field in BUG_EMBEDDING_FIELDS if bug_data.get(field)]
+        return " ".join(texts) or None
+    
+    def _bug_document(self, bug_data: Dict[str, Any], bug_id: str, embedding: Optional[List[float]],
+                      now: datetime, batch_metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        bug_doc = {
+            'bug_id': bug_id,
+            'source_file': bug_data['source_file'],
+            'bug_type': bug_data['bug_type'],
+            'severity': bug_data['severity'],
+            'line_number': bug_data['line_number'],
+            'column_number': bug_data.get('column_number'),
+            'description': bug_data['description'],
+            'code_snippet': bug_data.get('code_snippet'),
+            'suggested_fix': bug_data.get('suggested_fix'),
+            'actual_fix': bug_data.get('actual_fix'),
+            'detection_method': bug_data.get('detection_method', 'manual_review'),
+            'ai_confidence': bug_data.get('ai_confidence'),
+            'detection_iteration': bug_data.get('detection_iteration'),
+            'fix_iteration': bug_data.get('fix_iteration'),
+            'status': bug_data['status'],
+            'human_feedback': bug_data.get('human_feedback', {}),
+            'related_bugs': bug_data.get('related_bugs', []),
+            'fix_impact': bug_data.get('fix_impact', {}),
+            **self.encode_embedding(embedding),
+            'created_at': now,
+            'updated_at': now,
+            'imported_by': 'fixchain_api'
+        }
+        if batch_metadata is not None:
+            bug_doc['batch_metadata'] = batch_metadata
+        return bug_doc
+    
+    def _reasoning_document(self, reasoning_data: Dict[str, Any], entry_id: str, embedding: Optional[List[float]],
+                            now: datetime, batch_metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        reasoning_doc = {
+            'entry_id': entry_id,
+            'test_name': reasoning_data['test_name'],
+            'attempt_id': reasoning_data['attempt_id'],
+            'source_file': reasoning_data['source_file'],
+            'status': reasoning_data['status'],
+            'summary': reasoning_data['summary'],
+            'output': reasoning_data['output'],
+            'metadata': reasoning_data.get('metadata', {}),
+            **self.encode_embedding(embedding),
+            'human_verified': reasoning_data.get('human_verified', False),
+            'verification_result': reasoning_data.get('verification_result', {}),
+            'created_at': now,
+            'updated_at': now,
+            'imported_by': 'fixchain_api'
+        }
+        if batch_metadata is not None:
+            reasoning_doc['batch_metadata'] = batch_metadata
+        return reasoning_doc
+    
+    @staticmethod
+    def _session_document(session_data: Dict[str, Any], session_id: str, now: datetime) -> Dict[str, Any]:
+        # Parse datetime strings
+        start_time = datetime.fromisoformat(session_data['start_time'].replace('Z', '+00:00'))
+        end_time = datetime.fromisoformat(session_data['end_time'].replace('Z', '+00:00'))
+        return {
+            'session_id': session_id,
+            'source_file': session_data['source_file'],
+            'session_number': session_data['session_number'],
+            'test_types': session_data.get('test_types', []),
+            'start_time': start_time,
+            'end_time': end_time,
+            'total_duration': session_data['total_duration'],
+            'total_tokens_used': session_data.get('total_tokens_used'),
+            'bugs_detected': session_data['bugs_detected'],
+            'bugs_fixed': session_data['bugs_fixed'],
+            'new_bugs_introduced': session_data.get('new_bugs_introduced', 0),
+            'overall_status': session_data['overall_status'],
+            'performance_metrics': session_data.get('performance_metrics', {}),
+            'comparison_with_previous': session_data.get('comparison_with_previous', {}),
+            'created_at': now,
+            'updated_at': now,
+            'imported_by': 'fixchain_api'
+        }
+    
+    def import_bug(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """Import bug data into SugoiApp collection."""
         try:
-            client = get_connection()
-            db = client[SUGOI_DATABASE]
+            db = get_db()
             logger.debug(f"[import_bug] Connected to DB: {SUGOI_DATABASE}")
             
             bug_data = data['bug']
             bug_id = bug_data.get('bug_id', str(uuid.uuid4()))
             now = datetime.now(timezone.utc)
+            embedding = bug_data.get('embedding')
+            if data.get('generate_embedding', False) and not embedding:
+                embedding = self.embed_batch([self._bug_embedding_text(bug_data)], label='import_bug')[0][0]
             
             # Prepare bug document
-            bug_doc = {
-                'bug_id': bug_id,
-                'source_file': bug_data['source_file'],
-                'bug_type': bug_data['bug_type'],
-                'severity': bug_data['severity'],
-                'line_number': bug_data['line_number'],
-                'column_number': bug_data.get('column_number'),
-                'description': bug_data['description'],
-                'code_snippet': bug_data.get('code_snippet'),
-                'suggested_fix': bug_data.get('suggested_fix'),
-                'actual_fix': bug_data.get('actual_fix'),
-                'detection_method': bug_data.get('detection_method', 'manual_review'),
-                'ai_confidence': bug_data.get('ai_confidence'),
-                'detection_iteration': bug_data.get('detection_iteration'),
-                'fix_iteration': bug_data.get('fix_iteration'),
-                'status': bug_data['status'],
-                'human_feedback': bug_data.get('human_feedback', {}),
-                'related_bugs': bug_data.get('related_bugs', []),
-                'fix_impact': bug_data.get('fix_impact', {}),
-                'created_at': now,
-                'updated_at': now,
-                'imported_by': 'fixchain_api'
-            }
+            bug_doc = self._bug_document(bug_data, bug_id, embedding, now)
             
             logger.debug(f"[import_bug] Inserting bug: {bug_doc['bug_id']}")
             result = db.bug_reports.insert_one(bug_doc)
             bug_doc['_id'] = str(result.inserted_id)
+            if embedding:
+                self.refresh_vector_index('bug_reports')
             
             logger.info(f"[import_bug] Bug imported successfully with ID: {bug_id}")
             return {
                 'bug_id': bug_id,
+                'embedding_generated': bool(embedding) and not bug_data.get('embedding'),
                 'created_at': now.isoformat(),
                 'updated_at': now.isoformat()
             }
@@ -96,59 +297,48 @@ class FixChainService:
             logger.error(f"[import_bug] Error importing bug: {e}", exc_info=True)
             raise e
     
-    @staticmethod
-    def import_bugs_batch(data: Dict[str, Any]) -> Dict[str, Any]:
+    def import_bugs_batch(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """Import multiple bugs in batch."""
         try:
-            client = get_connection()
-            db = client[SUGOI_DATABASE]
+            db = get_db()
             logger.debug(f"[import_bugs_batch] Connected to DB: {SUGOI_DATABASE}")
             
             bugs_data = data['bugs']
             batch_metadata = data.get('batch_metadata', {})
+            generate_embeddings = data.get('generate_embeddings', False)
             now = datetime.now(timezone.utc)
             
+            # Embed every bug that needs it in one batched pass
+            generated, embedding_stats = self.embed_batch(
+                [self._bug_embedding_text(b) if generate_embeddings and not b.get('embedding') else None
+                 for b in bugs_data],
+                data.get('embedding_batch_size'), 'import_bugs_batch'
+            )
+            
             # Prepare bug documents
             bug_docs = []
             bug_ids = []
+            embeddings_generated = sum(1 for vector in generated if vector)
             
-            for bug_data in bugs_data:
+            for bug_data, generated_embedding in zip(bugs_data, generated):
                 bug_id = bug_data.get('bug_id', str(uuid.uuid4()))
                 bug_ids.append(bug_id)
+                embedding = bug_data.get('embedding') or generated_embedding
                 
-                bug_doc = {
-                    'bug_id': bug_id,
-                    'source_file': bug_data['source_file'],
-                    'bug_type': bug_data['bug_type'],
-                    'severity': bug_data['severity'],
-                    'line_number': bug_data['line_number'],
-                    'column_number': bug_data.get('column_number'),
-                    'description': bug_data['description'],
-                    'code_snippet': bug_data.get('code_snippet'),
-                    'suggested_fix': bug_data.get('suggested_fix'),
-                    'actual_fix': bug_data.get('actual_fix'),
-                    'detection_method': bug_data.get('detection_method', 'manual_review'),
-                    'ai_confidence': bug_data.get('ai_confidence'),
-                    'detection_iteration': bug_data.get('detection_iteration'),
-                    'fix_iteration': bug_data.get('fix_iteration'),
-                    'status': bug_data['status'],
-                    'human_feedback': bug_data.get('human_feedback', {}),
-                    'related_bugs': bug_data.get('related_bugs', []),
-                    'fix_impact': bug_data.get('fix_impact', {}),
-                    'created_at': now,
-                    'updated_at': now,
-                    'imported_by': 'fixchain_api',
-                    'batch_metadata': batch_metadata
-                }
+                bug_doc = self._bug_document(bug_data, bug_id, embedding, now, batch_metadata)
                 bug_docs.append(bug_doc)
             
             logger.debug(f"[import_bugs_batch] Inserting {len(bug_docs)} bugs")
             result = db.bug_reports.insert_many(bug_docs)
+            if any(doc['embedding'] for doc in bug_docs):
+                self.refresh_vector_index('bug_reports')
             
             logger.info(f"[import_bugs_batch] {len(bug_docs)} bugs imported successfully")
             return {
                 'total_imported': len(bug_docs),
                 'bug_ids': bug_ids,
+                'embeddings_generated': embeddings_generated,
+                'embedding_stats': embedding_stats,
                 'batch_metadata': batch_metadata,
                 'created_at': now.isoformat()
             }
@@ -159,8 +349,7 @@ class FixChainService:
     def import_vectordb(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """Import reasoning data into FixChainRAG collection."""
         try:
-            client = get_connection()
-            db = client[FIXCHAIN_RAG_DATABASE]
+            db = get_rag_db()
             logger.debug(f"[import_vectordb] Connected to DB: {FIXCHAIN_RAG_DATABASE}")
             
             reasoning_data = data['reasoning']
@@ -194,27 +383,13 @@ class FixChainService:
                     embedding = None
             
             # Prepare reasoning document
-            reasoning_doc = {
-                'entry_id': entry_id,
-                'test_name': reasoning_data['test_name'],
-                'attempt_id': reasoning_data['attempt_id'],
-                'source_file': reasoning_data['source_file'],
-                'status': reasoning_data['status'],
-                'summary': reasoning_data['summary'],
-                'output': reasoning_data['output'],
-                'metadata': reasoning_data.get('metadata', {}),
-                'embedding': embedding,
-                'embedding_dimensions': len(embedding) if embedding else None,
-                'human_verified': reasoning_data.get('human_verified', False),
-                'verification_result': reasoning_data.get('verification_result', {}),
-                'created_at': now,
-                'updated_at': now,
-                'imported_by': 'fixchain_api'
-            }
+            reasoning_doc = self._reasoning_document(reasoning_data, entry_id, embedding, now)
             
             logger.debug(f"[import_vectordb] Inserting reasoning entry: {entry_id}")
             result = db.test_reasoning.insert_one(reasoning_doc)
             reasoning_doc['_id'] = str(result.inserted_id)
+            if embedding:
+                self.refresh_vector_index('test_reasoning')
             
             logger.info(f"[import_vectordb] Reasoning entry imported successfully with ID: {entry_id}")
             return {
@@ -230,8 +405,7 @@ class FixChainService:
     def import_vectordb_batch(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """Import multiple reasoning entries in batch."""
         try:
-            client = get_connection()
-            db = client[FIXCHAIN_RAG_DATABASE]
+            db = get_rag_db()
             logger.debug(f"[import_vectordb_batch] Connected to DB: {FIXCHAIN_RAG_DATABASE}")
             
             reasoning_entries = data['reasoning_entries']
@@ -239,57 +413,42 @@ class FixChainService:
             generate_embeddings = data.get('generate_embeddings', False)
             now = datetime.now(timezone.utc)
             
+            # Generate embeddings if requested, in one batched pass over all entries
+            texts = []
+            for reasoning_data in reasoning_entries:
+                if generate_embeddings and not reasoning_data.get('embedding'):
+                    fields = [reasoning_data.get('summary', ''), reasoning_data.get('output', '')]
+                    texts.append(" ".join(text for text in fields if text) or None)
+                else:
+                    texts.append(None)
+            generated, embedding_stats = self.embed_batch(
+                texts, data.get('embedding_batch_size'), 'import_vectordb_batch'
+            )
+            
             # Prepare reasoning documents
             reasoning_docs = []
             entry_ids = []
-            embeddings_generated = 0
+            embeddings_generated = sum(1 for vector in generated if vector)
             
-            for reasoning_data in reasoning_entries:
+            for reasoning_data, generated_embedding in zip(reasoning_entries, generated):
                 entry_id = str(uuid.uuid4())
                 entry_ids.append(entry_id)
+                embedding = reasoning_data.get('embedding') or generated_embedding
                 
-                # Generate embedding if requested
-                embedding = reasoning_data.get('embedding')
-                if generate_embeddings and not embedding:
-                    try:
-                        texts_to_embed = [reasoning_data.get('summary', ''), reasoning_data.get('output', '')]
-                        texts_to_embed = [text for text in texts_to_embed if text]
-                        
-                        if texts_to_embed:
-                            embedding = self.generate_embedding(texts_to_embed)
-                            embeddings_generated += 1
-                    except Exception as e:
-                        logger.warning(f"[import_vectordb_batch] Failed to generate embedding for entry {entry_id}: {e}")
-                        embedding = None
-                
-                reasoning_doc = {
-                    'entry_id': entry_id,
-                    'test_name': reasoning_data['test_name'],
-                    'attempt_id': reasoning_data['attempt_id'],
-                    'source_file': reasoning_data['source_file'],
-                    'status': reasoning_data['status'],
-                    'summary': reasoning_data['summary'],
-                    'output': reasoning_data['output'],
-                    'metadata': reasoning_data.get('metadata', {}),
-                    'embedding': embedding,
-                    'embedding_dimensions': len(embedding) if embedding else None,
-                    'human_verified': reasoning_data.get('human_verified', False),
-                    'verification_result': reasoning_data.get('verification_result', {}),
-                    'created_at': now,
-                    'updated_at': now,
-                    'imported_by': 'fixchain_api',
-                    'batch_metadata': batch_metadata
-                }
+                reasoning_doc = self._reasoning_document(reasoning_data, entry_id, embedding, now, batch_metadata)
                 reasoning_docs.append(reasoning_doc)
             
             logger.debug(f"[import_vectordb_batch] Inserting {len(reasoning_docs)} reasoning entries")
             result = db.test_reasoning.insert_many(reasoning_docs)
+            if any(doc['embedding'] for doc in reasoning_docs):
+                self.refresh_vector_index('test_reasoning')
             
             logger.info(f"[import_vectordb_batch] {len(reasoning_docs)} reasoning entries imported successfully")
             return {
                 'total_imported': len(reasoning_docs),
                 'entry_ids': entry_ids,
                 'embeddings_generated': embeddings_generated,
+                'embedding_stats': embedding_stats,
                 'batch_metadata': batch_metadata,
                 'created_at': now.isoformat()
             }
@@ -301,38 +460,15 @@ class FixChainService:
     def import_session(data: Dict[str, Any]) -> Dict[str, Any]:
         """Import execution session data."""
         try:
-            client = get_connection()
-            db = client[SUGOI_DATABASE]
+            db = get_db()
             logger.debug(f"[import_session] Connected to DB: {SUGOI_DATABASE}")
             
             session_data = data['session']
             session_id = session_data.get('session_id', str(uuid.uuid4()))
             now = datetime.now(timezone.utc)
             
-            # Parse datetime strings
-            start_time = datetime.fromisoformat(session_data['start_time'].replace('Z', '+00:00'))
-            end_time = datetime.fromisoformat(session_data['end_time'].replace('Z', '+00:00'))
-            
             # Prepare session document
-            session_doc = {
-                'session_id': session_id,
-                'source_file': session_data['source_file'],
-                'session_number': session_data['session_number'],
-                'test_types': session_data.get('test_types', []),
-                'start_time': start_time,
-                'end_time': end_time,
-                'total_duration': session_data['total_duration'],
-                'total_tokens_used': session_data.get('total_tokens_used'),
-                'bugs_detected': session_data['bugs_detected'],
-                'bugs_fixed': session_data['bugs_fixed'],
-                'new_bugs_introduced': session_data.get('new_bugs_introduced', 0),
-                'overall_status': session_data['overall_status'],
-                'performance_metrics': session_data.get('performance_metrics', {}),
-                'comparison_with_previous': session_data.get('comparison_with_previous', {}),
-                'created_at': now,
-                'updated_at': now,
-                'imported_by': 'fixchain_api'
-            }
+            session_doc = FixChainService._session_document(session_data, session_id, now)
             
             logger.debug(f"[import_session] Inserting session: {session_id}")
             result = db.execution_sessions.insert_one(session_doc)
@@ -368,7 +504,9 @@ class FixChainService:
                 logger.info(f"[bulk_import] Importing {len(import_data['bugs'])} bugs")
                 bugs_payload = {
                     'bugs': import_data['bugs'],
-                    'batch_metadata': metadata
+                    'batch_metadata': metadata,
+                    'generate_embeddings': options.get('generate_embeddings', True),
+                    'embedding_batch_size': options.get('embedding_batch_size')
                 }
                 results['bugs'] = self.import_bugs_batch(bugs_payload)
             
@@ -378,7 +516,8 @@ class FixChainService:
                 reasoning_payload = {
                     'reasoning_entries': import_data['reasoning_entries'],
                     'batch_metadata': metadata,
-                    'generate_embeddings': options.get('generate_embeddings', True)
+                    'generate_embeddings': options.get('generate_embeddings', True),
+                    'embedding_batch_size': options.get('embedding_batch_size')
                 }
                 results['reasoning_entries'] = self.import_vectordb_batch(reasoning_payload)
             
@@ -399,13 +538,193 @@ class FixChainService:
             raise e
     
     @staticmethod
-    def search_similar_bugs(filters: Dict[str, Any], limit: int = 10) -> Dict[str, Any]:
-        """Search for similar bugs."""
+    def _parse_stream_line(raw) -> tuple:
+        """(type, record) for one NDJSON line; raises ValueError."""
+        try:
+            item = json.loads(raw)
+        except (ValueError, UnicodeDecodeError) as e:
+            raise ValueError(f"Invalid JSON: {e}")
+        if not isinstance(item, dict):
+            raise ValueError("Each line must be a JSON object")
+        record_type = item.get('type')
+        if record_type not in STREAM_RECORD_TYPES:
+            raise ValueError(f"type must be one of: {', '.join(STREAM_RECORD_TYPES)}")
+        record = item.get('data')
+        if not isinstance(record, dict):
+            raise ValueError("data must be an object")
+        missing = [field for field in STREAM_RECORD_TYPES[record_type][3] if record.get(field) in (None, '')]
+        if missing:
+            raise ValueError(f"data.{missing[0]} is required")
+        return record_type, record
+    
+    def _write_stream_chunk(self, import_id: str, records: List[tuple], errors: List[Dict[str, Any]],
+                            committed_lines: int, generate_embeddings: bool,
+                            embedding_batch_size: Optional[int], totals: Dict[str, int]) -> None:
+        """Upsert one chunk of parsed (line, type, record) tuples and advance the import past it."""
+        now = datetime.now(timezone.utc)
+        texts = []
+        for _, record_type, record in records:
+            text = None
+            if generate_embeddings and record_type != 'session' and not record.get('embedding'):
+                if record_type == 'bug':
+                    text = self._bug_embedding_text(record)
+                else:
+                    text = " ".join(str(record[field]) for field in ('summary', 'output') if record.get(field)) or None
+            texts.append(text)
+        generated, _ = self.embed_batch(texts, embedding_batch_size, 'import_stream')
+        
+        operations = {}
+        embedded_types = set()
+        for (line_number, record_type, record), generated_embedding in zip(records, generated):
+            id_field = STREAM_RECORD_TYPES[record_type][2]
+            # Derived ids make a re-sent line land on the document it wrote the first time
+            record_id = record.get(id_field) or str(uuid.uuid5(uuid.NAMESPACE_URL, f"{import_id}:{line_number}"))
+            embedding = record.get('embedding') or generated_embedding
+            try:
+                if record_type == 'bug':
+                    doc = self._bug_document(record, record_id, embedding, now)
+                elif record_type == 'reasoning':
+                    doc = self._reasoning_document(record, record_id, embedding, now)
+                else:
+                    doc = self._session_document(record, record_id, now)
+            except (KeyError, TypeError, ValueError, AttributeError) as e:
+                errors.append({'line': line_number, 'error': f"Invalid {record_type}: {e}"})
+                continue
+            doc['import_id'] = import_id
+            if doc.get('embedding'):
+                embedded_types.add(record_type)
+            created_at = doc.pop('created_at')
+            operations.setdefault(record_type, []).append((line_number, UpdateOne(
+                {id_field: record_id},
+                {'$set': doc, '$setOnInsert': {'created_at': created_at}},
+                upsert=True
+            )))
+        
+        inserted = updated = 0
+        for record_type, ops in operations.items():
+            get_database, collection, _, _ = STREAM_RECORD_TYPES[record_type]
+            try:
+                result = get_database()[collection].bulk_write([op for _, op in ops], ordered=False).bulk_api_result
+            except BulkWriteError as e:
+                # Unordered: every other operation in the chunk was still applied
+                result = e.details
+                for write_error in result.get('writeErrors', []):
+                    errors.append({'line': ops[write_error['index']][0], 'error': write_error.get('errmsg')})
+            inserted += result.get('nUpserted', 0)
+            updated += result.get('nMatched', 0)
+            if record_type in embedded_types:
+                self.refresh_vector_index(VECTOR_SOURCES_BY_TYPE[record_type])
+        
+        errors.sort(key=lambda error: error['line'])
+        database.record_import_chunk(import_id, committed_lines, inserted, updated, errors, STREAM_IMPORT_MAX_ERRORS)
+        totals['inserted'] += inserted
+        totals['updated'] += updated
+        totals['failed'] += len(errors)
+    
+    def import_stream(self, lines, import_id: Optional[str] = None, offset: int = 0,
+                      chunk_size: int = STREAM_IMPORT_CHUNK_SIZE, generate_embeddings: bool = True,
+                      embedding_batch_size: Optional[int] = None) -> Dict[str, Any]:
+        """Import NDJSON records incrementally, in chunks of unordered bulk upserts.
+
+        Each line is {"type": "bug"|"reasoning"|"session", "data": {...}}, with data shaped
+        like the single-record imports. Records upsert on bug_id / entry_id / session_id, so a
+        bad record only fails itself and re-sending a record is harmless. The import's
+        committed_lines counts the lines already written: to resume after a dropped
+        connection, send the rest of the file with the same import_id and
+        offset=committed_lines. Lines before committed_lines are skipped if re-sent.
+        """
+        if offset < 0:
+            raise ValueError("offset must be a non-negative integer")
+        if not 0 < chunk_size <= STREAM_IMPORT_MAX_CHUNK_SIZE:
+            raise ValueError(f"chunk_size must be between 1 and {STREAM_IMPORT_MAX_CHUNK_SIZE}")
+        import_id = import_id or str(uuid.uuid4())
+        options = {'chunk_size': chunk_size, 'generate_embeddings': generate_embeddings}
+        job = database.claim_import_job(import_id, options, STREAM_IMPORT_STALE_SECONDS)
+        if job is None:
+            raise ImportInProgress(f"Import {import_id} is still running")
+        committed = job['committed_lines']
+        if offset > committed:
+            database.finish_import_job(import_id, 'interrupted')
+            raise ValueError(f"offset {offset} is past the {committed} lines already committed")
+        
+        logger.info(f"[import_stream] Import {import_id} receiving from line {offset} ({committed} committed)")
+        totals = {'inserted': 0, 'updated': 0, 'failed': 0, 'skipped_lines': 0}
+        records, errors = [], []
+        next_line = offset
+        status = 'completed'
+        try:
+            for raw in lines:
+                line_number = next_line
+                if line_number < committed:
+                    next_line += 1
+                    totals['skipped_lines'] += 1
+                    continue
+                if raw.strip():
+                    try:
+                        records.append((line_number,) + self._parse_stream_line(raw))
+                    except ValueError as e:
+                        if not raw.endswith(b'\n' if isinstance(raw, bytes) else '\n'):
+                            # An unterminated last line that does not parse was cut off in transit
+                            status = 'interrupted'
+                            break
+                        errors.append({'line': line_number, 'error': str(e)})
+                next_line += 1
+                if len(records) + len(errors) >= chunk_size:
+                    self._write_stream_chunk(import_id, records, errors, next_line, generate_embeddings,
+                                             embedding_batch_size, totals)
+                    records, errors = [], []
+        except Exception as e:
+            # Typically the client went away mid-body; what was fully received is still written
+            logger.warning(f"[import_stream] Import {import_id} interrupted at line {next_line}: {e}")
+            status = 'interrupted'
+        
+        try:
+            if next_line > committed:
+                self._write_stream_chunk(import_id, records, errors, next_line, generate_embeddings,
+                                         embedding_batch_size, totals)
+        except Exception as e:
+            logger.error(f"[import_stream] Import {import_id} failed: {e}", exc_info=True)
+            database.finish_import_job(import_id, 'failed')
+            raise e
+        job = database.finish_import_job(import_id, status)
+        
+        logger.info(f"[import_stream] Import {import_id} {status}: {job['committed_lines']} lines committed, "
+                    f"{totals['inserted']} inserted, {totals['updated']} updated, {totals['failed']} failed")
+        return {
+            **job,
+            'received_lines': next_line - offset,
+            'request': totals
+        }
+    
+    def search_similar_bugs(self, filters: Dict[str, Any], limit: int = 10, query: Optional[str] = None,
+                            bug_id: Optional[str] = None) -> Dict[str, Any]:
+        """Search for similar bugs.
+
+        With a query text or a reference bug_id this is a k-NN search over bug
+        embeddings (filters act as pre-filters); otherwise filters are matched exactly.
+        """
         try:
-            client = get_connection()
-            db = client[SUGOI_DATABASE]
+            db = get_db()
             logger.debug(f"[search_similar_bugs] Connected to DB: {SUGOI_DATABASE}")
             
+            if query or bug_id:
+                embedding = None
+                if bug_id:
+                    reference = db.bug_reports.find_one({'bug_id': bug_id}, {'_id': 0, 'embedding': 1})
+                    if not reference:
+                        raise ValueError(f"Bug {bug_id} not found")
+                    embedding = self.decode_embedding(reference.get('embedding'))
+                    if embedding is None and not query:
+                        raise ValueError(f"Bug {bug_id} has no embedding")
+                result = self.vector_search('bug_reports', limit, query, embedding, filters,
+                                            exclude_ids=[bug_id] if bug_id else None)
+                return {
+                    'bugs': result['results'],
+                    'total_found': result['total_found'],
+                    'search': result['search'],
+                    'filters_applied': filters
+                }
+            
             query = {}
             if filters.get('source_file'):
                 query['source_file'] = filters['source_file']
@@ -413,7 +732,7 @@ class FixChainService:
                 query['bug_type'] = filters['bug_type']
             
             logger.debug(f"[search_similar_bugs] Query: {query}, Limit: {limit}")
-            bugs = list(db.bug_reports.find(query, {'_id': 0}).sort('created_at', -1).limit(limit))
+            bugs = list(db.bug_reports.find(query, {'_id': 0, 'embedding': 0}).sort('created_at', -1).limit(limit))
             
             logger.info(f"[search_similar_bugs] Found {len(bugs)} similar bugs")
             return {
@@ -425,22 +744,183 @@ class FixChainService:
             logger.error(f"[search_similar_bugs] Error searching bugs: {e}", exc_info=True)
             raise e
     
+    def search_reasoning(self, query: Optional[str], k: int = 5, filters: Optional[Dict[str, Any]] = None,
+                         embedding: Optional[List[float]] = None) -> Dict[str, Any]:
+        """k-NN search over test_reasoning embeddings."""
+        try:
+            return self.vector_search('test_reasoning', k, query, embedding, filters)
+        except ValueError:
+            raise
+        except Exception as e:
+            logger.error(f"[search_reasoning] Error searching reasoning: {e}", exc_info=True)
+            raise e
+    
+    def delete_reasoning(self, entry_id: str) -> bool:
+        """Delete a reasoning entry and its vector; returns False if there was none."""
+        try:
+            result = get_rag_db().test_reasoning.delete_one({'entry_id': entry_id})
+            if not result.deleted_count:
+                return False
+            self.remove_from_vector_index('test_reasoning', [entry_id])
+            logger.info(f"[delete_reasoning] Deleted reasoning entry {entry_id}")
+            return True
+        except Exception as e:
+            logger.error(f"[delete_reasoning] Error deleting reasoning {entry_id}: {e}", exc_info=True)
+            raise e
+    
+    @staticmethod
+    def _mongo_filters(filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Exact-match filters (a value or a list of values) as a Mongo query."""
+        query = {}
+        for field, value in (filters or {}).items():
+            if field not in VECTOR_SOURCES['test_reasoning'][2]:
+                raise ValueError(f"Unsupported filter field: {field}")
+            query[field] = {'$in': list(value)} if isinstance(value, (list, tuple, set)) else value
+        return query
+    
+    @staticmethod
+    def _stem(term: str) -> str:
+        """Crude suffix stripping, so "errors" also marks "error" the way $text stemming matches it."""
+        for suffix in ('ing', 'ed', 'es', 's'):
+            if term.lower().endswith(suffix) and len(term) - len(suffix) >= 3:
+                return term[:-len(suffix)]
+        return term
+    
+    @staticmethod
+    def highlight(text: Any, terms: List[str], length: int = SNIPPET_LENGTH) -> Optional[str]:
+        """HTML-escaped snippet around the first matching term, with matches wrapped in <mark>."""
+        if not text or not terms:
+            return None
+        text = str(text)
+        # Prefix match, so stemmed $text hits like "errors" for "error" are marked too
+        pattern = re.compile(r"\b(?:" + "|".join(re.escape(term) for term in terms) + r")\w*", re.IGNORECASE)
+        match = pattern.search(text)
+        if not match:
+            return None
+        start = max(0, min(match.start() - length // 4, len(text) - length))
+        end = min(len(text), start + length)
+        # Escape around the marks rather than after, so terms never match inside entities
+        parts = []
+        position = start
+        for hit in pattern.finditer(text, start, end):
+            parts.append(html.escape(text[position:hit.start()]))
+            parts.append(f"<mark>{html.escape(hit.group(0))}</mark>")
+            position = hit.end()
+        parts.append(html.escape(text[position:end]))
+        return f"{'…' if start else ''}{''.join(parts)}{'…' if end < len(text) else ''}"
+    
+    def hybrid_search_reasoning(self, query: str, page: int = 1, page_size: int = 10,
+                                filters: Optional[Dict[str, Any]] = None, mode: str = 'hybrid') -> Dict[str, Any]:
+        """Rank test_reasoning by $text relevance and embedding similarity, fused with reciprocal rank.
+
+        Each leg retrieves its top candidates (enough to cover the requested page) under the
+        same filters; an entry's score is the sum of 1 / (HYBRID_RRF_K + rank) over the legs
+        that found it. mode='text' or 'vector' runs one leg only. If a leg is unavailable
+        (no text index, or the embedding model is down) the other leg still answers.
+        """
+        if not query or not query.strip():
+            raise ValueError("query is required")
+        if mode not in HYBRID_MODES:
+            raise ValueError(f"mode must be one of: {', '.join(HYBRID_MODES)}")
+        if page < 1:
+            raise ValueError("page must be a positive integer")
+        if not 0 < page_size <= HYBRID_MAX_PAGE_SIZE:
+            raise ValueError(f"page_size must be between 1 and {HYBRID_MAX_PAGE_SIZE}")
+        candidates = min(HYBRID_MAX_CANDIDATES, max(HYBRID_MIN_CANDIDATES, page * page_size))
+        if (page - 1) * page_size >= candidates:
+            raise ValueError(f"Only the top {HYBRID_MAX_CANDIDATES} results can be paged through")
+        
+        collection = get_rag_db().test_reasoning
+        match = self._mongo_filters(filters)
+        legs = {}
+        warnings = []
+        
+        if mode in ('hybrid', 'text'):
+            try:
+                cursor = collection.find(
+                    {'$text': {'$search': query}, **match},
+                    {'_id': 0, 'entry_id': 1, 'text_score': {'$meta': 'textScore'}}
+                ).sort([('text_score', {'$meta': 'textScore'})]).limit(candidates)
+                legs['text'] = [(doc['entry_id'], doc['text_score']) for doc in cursor]
+            except OperationFailure as e:
+                logger.warning(f"[hybrid_search_reasoning] Text search unavailable: {e}")
+                warnings.append("text search unavailable (is the test_reasoning text index created?)")
+        
+        if mode in ('hybrid', 'vector'):
+            try:
+                embedding = self.generate_embedding([query])
+                index = self.vector_index('test_reasoning')
+                index.ensure_synced(collection, 'entry_id')
+                legs['vector'], _ = index.search(embedding, candidates, filters)
+            except ValueError:
+                raise
+            except Exception as e:
+                logger.warning(f"[hybrid_search_reasoning] Vector search unavailable: {e}")
+                warnings.append("vector search unavailable")
+        
+        if not legs:
+            raise RuntimeError("Neither text nor vector search is available")
+        
+        fused = {}
+        for leg, hits in legs.items():
+            for rank, (entry_id, score) in enumerate(hits, 1):
+                entry = fused.setdefault(entry_id, {'score': 0.0})
+                entry['score'] += 1.0 / (HYBRID_RRF_K + rank)
+                entry[f'{leg}_rank'] = rank
+                entry['text_score' if leg == 'text' else 'similarity'] = round(float(score), 6)
+        ranked = sorted(fused.items(), key=lambda item: (-item[1]['score'], item[0]))
+        page_hits = ranked[(page - 1) * page_size:page * page_size]
+        
+        # Only the page's documents are loaded, never their embeddings
+        docs = collection.find(
+            {'entry_id': {'$in': [entry_id for entry_id, _ in page_hits]}},
+            {'_id': 0, 'embedding': 0}
+        )
+        by_id = {doc['entry_id']: doc for doc in docs}
+        terms = [self._stem(term) for term in re.findall(r"\w+", query) if len(term) > 1]
+        results = []
+        for entry_id, ranking in page_hits:
+            doc = by_id.get(entry_id)
+            if doc is None:
+                continue
+            doc.update(ranking)
+            doc['score'] = round(ranking['score'], 6)
+            highlights = {field: self.highlight(doc.get(field), terms) for field in SNIPPET_FIELDS}
+            doc['highlights'] = {field: snippet for field, snippet in highlights.items() if snippet}
+            results.append(doc)
+        
+        logger.info(f"[hybrid_search_reasoning] {mode}: "
+                    + ", ".join(f"{leg} {len(hits)} hits" for leg, hits in legs.items())
+                    + f", {len(fused)} fused, page {page}")
+        return {
+            'results': results,
+            'total_found': len(fused),
+            'pagination': {
+                'page': page,
+                'page_size': page_size,
+                'has_more': page * page_size < len(fused)
+            },
+            'search': {
+                'mode': mode,
+                'candidates_per_leg': candidates,
+                'legs': {leg: len(hits) for leg, hits in legs.items()},
+                'warnings': warnings
+            },
+            'filters_applied': filters or {}
+        }
+    
+    @staticmethod
+    def iter_reasoning_history(filters: Dict[str, Any]):
+        """Cursor over a file's reasoning entries, newest first and without embeddings."""
+        query = {field: filters[field] for field in ('source_file', 'test_name') if filters.get(field)}
+        return get_rag_db().test_reasoning.find(query, {'_id': 0, 'embedding': 0}).sort('created_at', -1)
+    
     @staticmethod
     def get_reasoning_history(filters: Dict[str, Any]) -> Dict[str, Any]:
         """Get reasoning history for a file."""
         try:
-            client = get_connection()
-            db = client[FIXCHAIN_RAG_DATABASE]
-            logger.debug(f"[get_reasoning_history] Connected to DB: {FIXCHAIN_RAG_DATABASE}")
-            
-            query = {}
-            if filters.get('source_file'):
-                query['source_file'] = filters['source_file']
-            if filters.get('test_name'):
-                query['test_name'] = filters['test_name']
-            
-            logger.debug(f"[get_reasoning_history] Query: {query}")
-            reasoning_entries = list(db.test_reasoning.find(query, {'_id': 0, 'embedding': 0}).sort('created_at', -1))
+            logger.debug(f"[get_reasoning_history] Filters: {filters}")
+            reasoning_entries = list(FixChainService.iter_reasoning_history(filters))
             
             logger.info(f"[get_reasoning_history] Found {len(reasoning_entries)} reasoning entries")
             return {
@@ -453,11 +933,66 @@ class FixChainService:
             raise e
     
     @staticmethod
-    def get_performance_analytics(filters: Dict[str, Any]) -> Dict[str, Any]:
-        """Get performance analytics for a file."""
+    def _accuracy_accumulators() -> Dict[str, Any]:
+        """$group accumulators shared by the summary and the time buckets."""
+        return {
+            'sessions': {'$sum': 1},
+            'bugs_detected': {'$sum': {'$ifNull': ['$bugs_detected', 0]}},
+            'bugs_fixed': {'$sum': {'$ifNull': ['$bugs_fixed', 0]}},
+            # Like $avg, $percentile skips sessions without a numeric accuracy_rate
+            'average_accuracy': {'$avg': '$accuracy'},
+            'accuracy_percentiles': {'$percentile': {
+                'input': '$accuracy', 'p': list(ACCURACY_PERCENTILES), 'method': 'approximate'
+            }}
+        }
+    
+    @staticmethod
+    def _percentiles(values: Optional[List[Optional[float]]]) -> Dict[str, Optional[float]]:
+        values = values or [None] * len(ACCURACY_PERCENTILES)
+        return {f"p{int(p * 100)}": value for p, value in zip(ACCURACY_PERCENTILES, values)}
+    
+    @staticmethod
+    def performance_pipeline(query: Dict[str, Any], bucket: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Totals, accuracy percentiles and optional time buckets in one pass over the matching sessions."""
+        facets = {'summary': [{'$group': {'_id': None, **FixChainService._accuracy_accumulators()}}]}
+        if bucket:
+            facets['buckets'] = [
+                {'$group': {
+                    '_id': {'$dateTrunc': {'date': '$at', 'unit': bucket, 'startOfWeek': 'monday'}},
+                    **FixChainService._accuracy_accumulators()
+                }},
+                {'$sort': {'_id': 1}}
+            ]
+        return [
+            {'$match': query},
+            {'$project': {
+                '_id': 0,
+                'bugs_detected': 1,
+                'bugs_fixed': 1,
+                'accuracy': '$performance_metrics.accuracy_rate',
+                'at': {'$ifNull': ['$start_time', '$created_at']}
+            }},
+            {'$facet': facets}
+        ]
+    
+    @staticmethod
+    def get_performance_analytics(filters: Dict[str, Any], page: int = 1,
+                                  page_size: int = PERFORMANCE_PAGE_SIZE,
+                                  bucket: Optional[str] = None) -> Dict[str, Any]:
+        """Get performance analytics for a file.
+
+        Totals and averages are aggregated in Mongo; sessions come back one page at a
+        time (page_size=0 skips them). bucket='day'|'week'|'month' adds per-period
+        totals with accuracy percentiles, bucketed by session start time.
+        """
+        if bucket and bucket not in PERFORMANCE_BUCKETS:
+            raise ValueError(f"bucket must be one of: {', '.join(PERFORMANCE_BUCKETS)}")
+        if page < 1:
+            raise ValueError("page must be a positive integer")
+        if not 0 <= page_size <= PERFORMANCE_MAX_PAGE_SIZE:
+            raise ValueError(f"page_size must be between 0 and {PERFORMANCE_MAX_PAGE_SIZE}")
         try:
-            client = get_connection()
-            db = client[SUGOI_DATABASE]
+            db = get_db()
             logger.debug(f"[get_performance_analytics] Connected to DB: {SUGOI_DATABASE}")
             
             query = {}
@@ -467,52 +1002,73 @@ class FixChainService:
             # Add date range filters if provided
             if filters.get('from_date') or filters.get('to_date'):
                 date_query = {}
-                if filters.get('from_date'):
-                    date_query['$gte'] = datetime.fromisoformat(filters['from_date'].replace('Z', '+00:00'))
-                if filters.get('to_date'):
-                    date_query['$lte'] = datetime.fromisoformat(filters['to_date'].replace('Z', '+00:00'))
+                try:
+                    if filters.get('from_date'):
+                        date_query['$gte'] = datetime.fromisoformat(filters['from_date'].replace('Z', '+00:00'))
+                    if filters.get('to_date'):
+                        date_query['$lte'] = datetime.fromisoformat(filters['to_date'].replace('Z', '+00:00'))
+                except ValueError:
+                    raise ValueError("from_date and to_date must be ISO 8601 dates")
                 query['created_at'] = date_query
             
-            logger.debug(f"[get_performance_analytics] Query: {query}")
+            logger.debug(f"[get_performance_analytics] Query: {query}, bucket: {bucket}")
+            facets = next(db.execution_sessions.aggregate(FixChainService.performance_pipeline(query, bucket)), {})
+            summary = (facets.get('summary') or [{}])[0]
+            total_sessions = summary.get('sessions', 0)
             
-            # Get execution sessions
-            sessions = list(db.execution_sessions.find(query, {'_id': 0}).sort('created_at', -1))
+            # One page of sessions, newest first, served by the (source_file, created_at) index
+            sessions = []
+            if page_size:
+                sessions = list(db.execution_sessions.find(query, {'_id': 0})
+                                .sort('created_at', -1).skip((page - 1) * page_size).limit(page_size))
             
-            # Calculate analytics
             analytics = {
-                'total_sessions': len(sessions),
-                'total_bugs_detected': sum(s.get('bugs_detected', 0) for s in sessions),
-                'total_bugs_fixed': sum(s.get('bugs_fixed', 0) for s in sessions),
-                'average_accuracy': 0,
+                'total_sessions': total_sessions,
+                'total_bugs_detected': summary.get('bugs_detected', 0),
+                'total_bugs_fixed': summary.get('bugs_fixed', 0),
+                'average_accuracy': summary.get('average_accuracy') or 0,
+                'accuracy_percentiles': FixChainService._percentiles(summary.get('accuracy_percentiles')),
                 'sessions': sessions,
+                'pagination': {
+                    'page': page,
+                    'page_size': page_size,
+                    'total_pages': -(-total_sessions // page_size) if page_size else 0,
+                    'has_more': bool(page_size) and page * page_size < total_sessions
+                },
                 'filters_applied': filters
             }
+            if bucket:
+                analytics['bucket'] = bucket
+                analytics['buckets'] = [
+                    {
+                        'period_start': row['_id'].isoformat() if row['_id'] else None,
+                        'sessions': row['sessions'],
+                        'bugs_detected': row['bugs_detected'],
+                        'bugs_fixed': row['bugs_fixed'],
+                        'average_accuracy': row['average_accuracy'],
+                        'accuracy_percentiles': FixChainService._percentiles(row['accuracy_percentiles'])
+                    }
+                    for row in facets.get('buckets', [])
+                ]
             
-            # Calculate average accuracy
-            accuracy_values = []
-            for session in sessions:
-                metrics = session.get('performance_metrics', {})
-                if 'accuracy_rate' in metrics:
-                    accuracy_values.append(metrics['accuracy_rate'])
-            
-            if accuracy_values:
-                analytics['average_accuracy'] = sum(accuracy_values) / len(accuracy_values)
-            
-            logger.info(f"[get_performance_analytics] Generated analytics for {len(sessions)} sessions")
+            logger.info(f"[get_performance_analytics] Aggregated {total_sessions} sessions, returned {len(sessions)}")
             return analytics
+        except ValueError:
+            raise
         except Exception as e:
             logger.error(f"[get_performance_analytics] Error getting analytics: {e}", exc_info=True)
             raise e
 
 # Create service instance
 fixchain_service = FixChainService()
+atexit.register(fixchain_service.save_vector_indexes)
 
 # Export functions for controller usage
 def import_bug(data):
-    return FixChainService.import_bug(data)
+    return fixchain_service.import_bug(data)
 
 def import_bugs_batch(data):
-    return FixChainService.import_bugs_batch(data)
+    return fixchain_service.import_bugs_batch(data)
 
 def import_vectordb(data):
     return fixchain_service.import_vectordb(data)
@@ -526,11 +1082,34 @@ def import_session(data):
 def bulk_import(data):
     return fixchain_service.bulk_import(data)
 
-def search_similar_bugs(filters, limit):
-    return FixChainService.search_similar_bugs(filters, limit)
+def search_similar_bugs(filters, limit, query=None, bug_id=None):
+    return fixchain_service.search_similar_bugs(filters, limit, query, bug_id)
+
+def search_reasoning(query, k=5, filters=None, embedding=None):
+    return fixchain_service.search_reasoning(query, k, filters, embedding)
+
+def delete_reasoning(entry_id):
+    return fixchain_service.delete_reasoning(entry_id)
+
+def hybrid_search_reasoning(query, page=1, page_size=10, filters=None, mode='hybrid'):
+    return fixchain_service.hybrid_search_reasoning(query, page, page_size, filters, mode)
+
+def get_embedding_stats():
+    return embedding_service.stats()
+
+def import_stream(lines, import_id=None, offset=0, chunk_size=STREAM_IMPORT_CHUNK_SIZE,
+                  generate_embeddings=True, embedding_batch_size=None):
+    return fixchain_service.import_stream(lines, import_id, offset, chunk_size, generate_embeddings,
+                                          embedding_batch_size)
+
+def get_import_status(import_id):
+    return database.get_import_job(import_id)
 
 def get_reasoning_history(filters):
     return FixChainService.get_reasoning_history(filters)
 
-def get_performance_analytics(filters):
-    return FixChainService.get_performance_analytics(filters)
\ No newline at end of file
+def iter_reasoning_history(filters):
+    return FixChainService.iter_reasoning_history(filters)
+
+def get_performance_analytics(filters, page=1, page_size=PERFORMANCE_PAGE_SIZE, bucket=None):
+    return FixChainService.get_performance_analytics(filters, page, page_size, bucket)
\ No newline at end of file
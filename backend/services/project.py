@@ -78,8 +78,9 @@ def get(project_id):
         # For each task, fetch its test scenarios with test cases
         from services.scenario import ScenarioService
 
+        scenarios = ScenarioService.get_scenarios(project_id)
         for t in tasks:
-            t["test_scenarios"] = ScenarioService.get_scenarios(project_id)
+            t["test_scenarios"] = scenarios
         result["tasks"] = tasks
     else:
         logger.warning("Project not found: %s", project_id)
@@ -1,6 +1,6 @@
 from datetime import datetime
 import uuid
-from utils.database import get_connection, MONGODB_DATABASE
+from utils.database import get_db
 from utils.logger import logger
 from utils.workflow_transformer import process_workflow_output
 
@@ -13,8 +13,7 @@ class ScenarioService:
             f"Saving scenarios for project_id: {project_id} and execution_id: {execution_id}"
         )
         try:
-            client = get_connection()
-            db = client[MONGODB_DATABASE]
+            db = get_db()
             # Delete existing scenarios for this project
             # db.scenarios.delete_many({'project_id': project_id})
             # Insert new scenarios
@@ -67,8 +66,7 @@ class ScenarioService:
         """Get all scenarios for a project"""
         logger.info(f"Fetching scenarios for project_id: {project_id}")
         try:
-            client = get_connection()
-            db = client[MONGODB_DATABASE]
+            db = get_db()
             scenarios = list(db.scenarios.find({"project_id": project_id}, {"_id": 0}))
 
             return scenarios
@@ -76,13 +74,18 @@ class ScenarioService:
             logger.error(f"Error fetching scenarios: {e}")
             return []
 
+    @staticmethod
+    def iter_scenarios(project_id):
+        """Cursor over a project's scenarios, for streamed responses"""
+        db = get_db()
+        return db.scenarios.find({"project_id": project_id}, {"_id": 0})
+
     @staticmethod
     def create_scenario(project_id, scenario_data):
         """Create a new scenario"""
         logger.info(f"Creating scenario for project_id: {project_id}")
         try:
-            client = get_connection()
-            db = client[MONGODB_DATABASE]
+            db = get_db()
             scenario_doc = dict(scenario_data)
             scenario_doc["id"] = str(uuid.uuid4())
             scenario_doc["project_id"] = project_id
@@ -103,8 +106,7 @@ class ScenarioService:
         """Update a specific scenario"""
         logger.info(f"Updating scenario {scenario_id} for project_id: {project_id}")
         try:
-            client = get_connection()
-            db = client[MONGODB_DATABASE]
+            db = get_db()
             # Add updated_at timestamp
             scenario_data["updated_at"] = datetime.utcnow()
             result = db.scenarios.update_one(
@@ -120,8 +122,7 @@ class ScenarioService:
         """Delete a specific scenario"""
         logger.info(f"Deleting scenario {scenario_id} for project_id: {project_id}")
         try:
-            client = get_connection()
-            db = client[MONGODB_DATABASE]
+            db = get_db()
             result = db.scenarios.delete_one(
                 {"project_id": project_id, "id": scenario_id}
             )
@@ -135,8 +136,7 @@ class ScenarioService:
         """Delete all scenarios related to a workflow_id."""
         logger.info(f"Deleting scenarios for workflow_id: {workflow_id}")
         try:
-            client = get_connection()
-            db = client[MONGODB_DATABASE]
+            db = get_db()
             result = db.scenarios.delete_many({"workflow_id": workflow_id})
             logger.info(
                 f"Deleted {result.deleted_count} scenarios for workflow_id: {workflow_id}"
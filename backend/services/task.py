@@ -1,5 +1,4 @@
 import uuid
-from utils import run_web_task_by_lines
 from utils.logger import logger
 from utils import database
 import shutil
@@ -44,104 +43,22 @@ def create(request):
 
 
 def ex_task(t_task):
-    """Execute a task with project_id and task_id."""
-    logger.info(f"Executing task: {t_task}")
-
-    try:
-        # Get task info from database
-        info = database.get_task(t_task["project_id"], t_task["task_id"])
-        if not info:
-            logger.error("Task not found")
-            raise Exception("Task not found")
-
-        logger.info(f"Retrieved task info: {info}")
-
-        # Check if task is already running
-        if info.get("status") == "running":
-            logger.warning("Task is already running")
-            raise Exception("Task is already running")
-
-        # Update task status to running
-        database.update_task_status(info["task_id"], "running")
-
-        try:
-            # Format task context
-            logger.info("=== Context Processing ===")
-            logger.info(f"Original context array: {info['context']}")
-            logger.info(
-                f"First element of context: {info['context'][0] if info['context'] else 'Empty context'}"
-            )
-
-            # Format task context - using all elements
-            # task = """{}""".format("\n ".join(info['context'][1:]))
-            logger.info("Formatted task with all context elements:")
-            logger.info("""{}""".format("\n ".join(info["context"][1:])))
-
-            # Execute the web task with retries
-            logger.info(f"Running web task for URL: {info['url']}")
-            max_retries = 3
-            retry_count = 0
-            last_error = None
-            retry_delay = 5  # Increased delay between retries
-
-            while retry_count < max_retries:
-                try:
-                    # Clear any existing Chrome processes before retry
-                    if retry_count > 0:
-                        try:
-                            import psutil
-
-                            for proc in psutil.process_iter(["pid", "name"]):
-                                if "chrome" in proc.info["name"].lower():
-                                    proc.kill()
-                            import time
-
-                            time.sleep(retry_delay)  # Wait longer between retries
-                        except Exception as e:
-                            logger.warning(
-                                f"Failed to cleanup Chrome processes: {str(e)}"
-                            )
-
-                    remove_all_contents(
-                        f'projects/{info["project_id"]}/{info["task_id"]}'
-                    )
-                    result = run_web_task_by_lines(
-                        info["url"],
-                        info["task_name"],
-                        info["context"],
-                        f'projects/{info["project_id"]}/{info["task_id"]}',
-                    )
-                    # Success - update status and return result
-                    database.update_task_status(info["task_id"], "completed")
-                    return result
-                except Exception as e:
-                    retry_count += 1
-                    last_error = e
-                    logger.warning(
-                        f"Task execution attempt {retry_count} failed: {str(e)}"
-                    )
-                    if retry_count < max_retries:
-                        logger.info(
-                            f"Waiting {retry_delay} seconds before retry {retry_count + 1}..."
-                        )
-                        time.sleep(retry_delay)
-                        retry_delay *= 2  # Exponential backoff
-
-            # All retries failed
-            logger.error(
-                f"Task execution failed after {max_retries} attempts: {str(last_error)}"
-            )
-            database.update_task_status(info["task_id"], "failed")
-            raise last_error if last_error else Exception("Task execution failed")
-
-        except Exception as e:
-            # Update task status to failed on error
-            database.update_task_status(info["task_id"], "failed")
-            logger.error(f"Task execution failed: {str(e)}")
-            raise e
-    except Exception as e:
-        logger.error(f"Task setup failed: {str(e)}")
-        raise e
+    """Queue execution of a task and return the job record without waiting for it."""
+    from services.task_scheduler import scheduler
+
+    logger.info(f"Submitting task execution: {t_task}")
+    job = scheduler.submit(t_task["project_id"], t_task["task_id"])
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "queue_position": job.get("queue_position"),
+    }
+
+
+def get_job(job_id):
+    from services.task_scheduler import scheduler
+
+    return scheduler.get_job(job_id)
 
 
 def get(t_task):
@@ -157,14 +74,25 @@ def delete(project_id, task_id):
     return database.delete_task(project_id, task_id)
 
 
-def get_all(project_id):
-    tasks = database.get_project_tasks(project_id)
-    # For each task, fetch its test scenarios
-    for t in tasks:
-        t["test_scenarios"] = database.get_test_cases(t["task_id"])
+def get_all(project_id, fields=None):
+    # Tasks and their test scenarios are joined in a single aggregation
+    tasks, _ = database.get_project_tasks_with_test_cases(project_id, fields)
     return tasks
 
 
+def iter_all(project_id, fields=None):
+    """Cursor over a project's tasks with their test scenarios, for streamed responses."""
+    return database.iter_project_tasks_with_test_cases(project_id, fields)
+
+
+def get_page(project_id, fields=None, limit=50, cursor=None):
+    """Return one page of tasks with their test scenarios and the cursor for the next page."""
+    tasks, next_cursor = database.get_project_tasks_with_test_cases(
+        project_id, fields, limit, cursor
+    )
+    return {"tasks": tasks, "next_cursor": next_cursor}
+
+
 def update(task_id, data):
     return database.update_task(task_id, data)
 
@@ -0,0 +1,281 @@
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+from utils import database
+from utils.logger import logger
+from services.task import remove_all_contents
+
+TASK_WORKER_SLOTS = int(os.environ.get("TASK_WORKER_SLOTS", "2"))
+TASK_MAX_PER_PROJECT = int(os.environ.get("TASK_MAX_PER_PROJECT", "1"))
+TASK_MAX_RETRIES = int(os.environ.get("TASK_MAX_RETRIES", "3"))
+TASK_RETRY_DELAY = float(os.environ.get("TASK_RETRY_DELAY", "5"))
+# Jobs of a live process are touched every interval; silent for TASK_JOB_STALE_AFTER means orphaned
+TASK_HEARTBEAT_INTERVAL = float(os.environ.get("TASK_HEARTBEAT_INTERVAL", "30"))
+TASK_JOB_STALE_AFTER = float(os.environ.get("TASK_JOB_STALE_AFTER", "120"))
+TASK_RECONCILE_ON_START = os.environ.get("TASK_RECONCILE_ON_START", "true").lower() in ("1", "true", "yes")
+
+
+class WorkerSlot:
+    """A worker thread; browsers are leased per attempt from the shared driver pool."""
+
+    def __init__(self, slot_id):
+        self.slot_id = slot_id
+        self.current_job = None
+
+
+class TaskScheduler:
+    """
+    Queue of task executions served by a fixed number of worker slots.
+
+    Jobs are picked in FIFO order, skipping projects that already have
+    max_per_project jobs running. Job state is persisted in the task_jobs
+    collection so any backend worker can answer status queries.
+
+    The queue itself lives in the process that accepted the job, so each
+    process sends heartbeats for the jobs it holds. A reconciler in every
+    process takes over jobs whose owner went silent (restart, recycled
+    worker): queued jobs are requeued locally, and jobs that were running
+    are failed, since the browser run cannot be resumed.
+    """
+
+    def __init__(self, slots=TASK_WORKER_SLOTS, max_per_project=TASK_MAX_PER_PROJECT,
+                 max_retries=TASK_MAX_RETRIES, retry_delay=TASK_RETRY_DELAY,
+                 heartbeat_interval=TASK_HEARTBEAT_INTERVAL, stale_after=TASK_JOB_STALE_AFTER):
+        self.slots = slots
+        self.max_per_project = max_per_project
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self.owner = None
+        self._pending = deque()
+        self._running_per_project = defaultdict(int)
+        self._cond = threading.Condition()
+        self._workers = []
+        self._pid = None
+        self._maintenance_pid = None
+
+    def start_reconciler(self):
+        """Start the heartbeat/reconcile thread of this process; safe to call repeatedly."""
+        if self._maintenance_pid == os.getpid():
+            return
+        with self._cond:
+            if self._maintenance_pid == os.getpid():
+                return
+            self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+            threading.Thread(target=self._maintenance_loop, name="task-reconciler", daemon=True).start()
+            self._maintenance_pid = os.getpid()
+
+    def _ensure_started(self):
+        # Threads do not survive fork, so (re)start them in each process
+        self.start_reconciler()
+        if self._pid == os.getpid():
+            return
+        with self._cond:
+            if self._pid == os.getpid():
+                return
+            self._pending.clear()
+            self._running_per_project.clear()
+            self._workers = []
+            for slot_id in range(self.slots):
+                slot = WorkerSlot(slot_id)
+                thread = threading.Thread(
+                    target=self._worker_loop, args=(slot,),
+                    name=f"task-worker-{slot_id}", daemon=True,
+                )
+                self._workers.append((slot, thread))
+                thread.start()
+            self._pid = os.getpid()
+            logger.info(f"Task scheduler started with {self.slots} worker slots")
+        # Have browsers ready before the first job is picked up
+        from utils.driver_pool import driver_pool
+        driver_pool.prewarm_async()
+
+    def submit(self, project_id, task_id):
+        """Queue an execution and return its job record immediately."""
+        self._ensure_started()
+        # Claimed in one conditional update so two requests cannot both queue the task
+        info = database.claim_task_for_queue(project_id, task_id)
+        if not info:
+            info = database.get_task(project_id, task_id)
+            if not info:
+                raise Exception("Task not found")
+            raise Exception(f"Task is already {info.get('status')}")
+
+        now = datetime.utcnow()
+        job = {
+            "job_id": str(uuid.uuid4()),
+            "project_id": project_id,
+            "task_id": task_id,
+            "status": "queued",
+            "attempts": 0,
+            "result": None,
+            "error": None,
+            "slot": None,
+            "owner": self.owner,
+            "heartbeat_at": now,
+            "created_at": now,
+            "updated_at": now,
+            "started_at": None,
+            "finished_at": None,
+        }
+        try:
+            database.create_task_job(job)
+        except Exception:
+            database.update_task_status(task_id, "failed")
+            raise
+
+        self._enqueue(job)
+        logger.info(f"Queued job {job['job_id']} for task {task_id}")
+        return job
+
+    def _enqueue(self, job):
+        with self._cond:
+            self._pending.append(job)
+            job["queue_position"] = len(self._pending)
+            self._cond.notify_all()
+
+    def get_job(self, job_id):
+        return database.get_task_job(job_id)
+
+    def stats(self):
+        # No browser exists before the pool module is loaded, so don't import Selenium just to report that
+        pool_module = sys.modules.get("utils.driver_pool")
+        with self._cond:
+            return {
+                "owner": self.owner,
+                "slots": self.slots,
+                "busy_slots": sum(1 for slot, _ in self._workers if slot.current_job),
+                "queued": len(self._pending),
+                "running_per_project": dict(self._running_per_project),
+                "driver_pool": pool_module.driver_pool.stats() if pool_module else None,
+            }
+
+    def _held_job_ids(self):
+        with self._cond:
+            job_ids = [job["job_id"] for job in self._pending]
+            job_ids.extend(slot.current_job for slot, _ in self._workers if slot.current_job)
+        return job_ids
+
+    def _maintenance_loop(self):
+        while True:
+            try:
+                database.touch_task_jobs(self._held_job_ids())
+                self.reconcile_once()
+            except Exception as e:
+                logger.error(f"Task reconcile pass failed: {str(e)}")
+            time.sleep(self.heartbeat_interval)
+
+    def reconcile_once(self):
+        """Take over jobs orphaned by a stopped process; returns the number recovered."""
+        now = datetime.utcnow()
+        stale_before = now - timedelta(seconds=self.stale_after)
+        recovered = 0
+        for orphan in database.find_orphaned_task_jobs(stale_before):
+            # Every process runs a reconciler; the conditional claim lets only one take the job
+            job = database.claim_task_job(orphan["job_id"], self.owner, stale_before)
+            if not job:
+                continue
+            recovered += 1
+            if job["status"] == "queued":
+                logger.warning(f"Requeuing orphaned job {job['job_id']} for task {job['task_id']}")
+                database.update_task_status(job["task_id"], "queued")
+                self._ensure_started()
+                self._enqueue(job)
+            else:
+                logger.warning(f"Failing job {job['job_id']}: its worker stopped while it was running")
+                self._fail(job, "Worker stopped while the job was running")
+        return recovered
+
+    def _fail(self, job, error):
+        database.update_task_status(job["task_id"], "failed")
+        database.update_task_job(job["job_id"], {
+            "status": "failed", "error": error, "finished_at": datetime.utcnow()
+        })
+
+    def _next_job(self):
+        with self._cond:
+            while True:
+                for job in self._pending:
+                    if self._running_per_project[job["project_id"]] < self.max_per_project:
+                        self._pending.remove(job)
+                        self._running_per_project[job["project_id"]] += 1
+                        return job
+                self._cond.wait()
+
+    def _release(self, job):
+        with self._cond:
+            project_id = job["project_id"]
+            self._running_per_project[project_id] -= 1
+            if self._running_per_project[project_id] <= 0:
+                del self._running_per_project[project_id]
+            self._cond.notify_all()
+
+    def _worker_loop(self, slot):
+        while True:
+            job = self._next_job()
+            slot.current_job = job["job_id"]
+            try:
+                self._run_job(job, slot)
+            except Exception as e:
+                logger.error(f"Unexpected error in job {job['job_id']}: {str(e)}")
+                try:
+                    self._fail(job, str(e))
+                except Exception as e:
+                    logger.error(f"Could not mark job {job['job_id']} failed: {str(e)}")
+            finally:
+                slot.current_job = None
+                self._release(job)
+
+    def _run_job(self, job, slot):
+        job_id = job["job_id"]
+        info = database.get_task(job["project_id"], job["task_id"])
+        if not info:
+            database.update_task_job(job_id, {
+                "status": "failed", "error": "Task not found", "finished_at": datetime.utcnow()
+            })
+            return
+
+        database.update_task_status(info["task_id"], "running")
+        database.update_task_job(job_id, {
+            "status": "running", "slot": slot.slot_id, "started_at": datetime.utcnow()
+        })
+        project_path = f'projects/{info["project_id"]}/{info["task_id"]}'
+        from utils.lavague_task import run_web_task_by_lines
+        logger.info(f"[slot {slot.slot_id}] Running job {job_id} for URL: {info['url']}")
+
+        retry_delay = self.retry_delay
+        last_error = None
+        for attempt in range(1, self.max_retries + 1):
+            database.update_task_job(job_id, {"attempts": attempt})
+            try:
+                remove_all_contents(project_path)
+                result = run_web_task_by_lines(
+                    info["url"],
+                    info["task_name"],
+                    info["context"],
+                    project_path,
+                )
+                database.update_task_status(info["task_id"], "completed")
+                database.update_task_job(job_id, {
+                    "status": "completed", "result": result, "finished_at": datetime.utcnow()
+                })
+                return
+            except Exception as e:
+                last_error = e
+                logger.warning(f"[slot {slot.slot_id}] Job {job_id} attempt {attempt} failed: {str(e)}")
+                # The failed attempt's browser is recycled by the pool; other executions are untouched
+                if attempt < self.max_retries:
+                    time.sleep(retry_delay)
+                    retry_delay *= 2  # Exponential backoff
+
+        logger.error(f"Job {job_id} failed after {self.max_retries} attempts: {str(last_error)}")
+        self._fail(job, str(last_error))
+
+
+scheduler = TaskScheduler()
@@ -8,10 +8,9 @@ from services import config
 import requests
 from services.scenario import ScenarioService
 from services.dify_service import (
-    fetch_info,
     fetch_site,
-    fetch_parameters,
-    run_workflow_with_dify,
+    fetch_metadata,
+    invalidate_metadata,
     DifyMode,
     get_workflow_logs,
 )
@@ -50,8 +49,10 @@ def create_workflow(project_id, api_key, mode=DifyMode.CLOUD):
     """
     workflow_id = str(uuid.uuid4())
     try:
-        info = fetch_info(api_key, mode)
-        parameters = fetch_parameters(api_key, mode)
+        # info and parameters are independent, so fetch them concurrently
+        metadata = fetch_metadata(api_key, mode)
+        info = metadata["info"]
+        parameters = metadata["parameters"]
         user_input_form = parameters.get("user_input_form", [])
         inputs = parse_user_input_form(user_input_form)
         wf_name = info.get("name") or None
@@ -82,11 +83,20 @@ def get_workflow(workflow_id):
     return database.get_workflow(workflow_id)
 
 
+def _invalidate_workflow_metadata(workflow, update_data=None):
+    # Cached Dify info/parameters must not outlive a change to the workflow
+    for api_key in {(workflow or {}).get("api_key"), (update_data or {}).get("api_key")}:
+        if api_key:
+            invalidate_metadata(api_key)
+
+
 def update_workflow(workflow_id, update_data):
+    _invalidate_workflow_metadata(get_workflow(workflow_id), update_data)
     return database.update_workflow(workflow_id, update_data)
 
 
 def delete_workflow(workflow_id):
+    _invalidate_workflow_metadata(get_workflow(workflow_id))
     # Delete all scenarios related to this workflow
     ScenarioService.delete_scenarios_by_workflow(workflow_id)
     return database.delete_workflow(workflow_id)
@@ -96,6 +106,10 @@ def list_workflows(project_id=None):
     return database.list_workflows(project_id)
 
 
+def iter_workflows(project_id=None):
+    return database.iter_workflows(project_id)
+
+
 def create_execution(
     workflow_id,
     project_id,
@@ -129,6 +143,10 @@ def get_execution_history(workflow_id=None):
     return database.list_workflow_executions(workflow_id)
 
 
+def iter_execution_history(workflow_id=None):
+    return database.iter_workflow_executions(workflow_id)
+
+
 def get_execution(execution_id):
     return database.get_workflow_execution(execution_id)
 
@@ -148,12 +166,17 @@ def run_dify_workflow_async(
     workflow_id,
     inputs,
     user="hieult",
-    response_mode="streaming",  # tránh blocking
+    response_mode="streaming",
     mode=DifyMode.CLOUD,
 ):
     """
-    Trigger Dify workflow asynchronously (streaming), save execution as pending.
+    Queue a Dify workflow run and return the pending execution immediately.
+
+    The run is always consumed as a stream by a background worker, which
+    records progress on the execution; poll /api/workflow/execution for it.
     """
+    from services.workflow_runner import runner
+
     workflow = get_workflow(workflow_id)
     if not workflow:
         raise ValueError("Workflow not found")
@@ -161,67 +184,14 @@ def run_dify_workflow_async(
     if not api_key:
         raise ValueError("API key not found in workflow")
 
-    try:
-        # Step 1: Gọi Dify để lấy task_id
-        response_json = run_workflow_with_dify(
-            api_key, inputs, user, response_mode, workflow.get("mode")
-        )
-
-        # Save execution record
-        status = response_json.get('data', {}).get('status', 'succeeded' if response_json.get('data') else 'unknown')
-        outputs = response_json.get('data', {}).get('outputs')
-        error = response_json.get('error') or None
-        total_steps = response_json.get('data', {}).get('total_steps')
-        total_tokens = response_json.get('data', {}).get('total_tokens')
-        task_id = response_json.get("task_id")
-        workflow_run_id = response_json.get("workflow_run_id") or response_json.get("data", {}).get("id")
-
-        # Step 2: Tạo execution pending
-        execution = create_execution(
-            workflow_id=workflow_id,
-            project_id=project_id,
-            status=status,
-            inputs=inputs,
-            outputs=outputs,
-            error=error,
-            total_steps=total_steps,
-            total_tokens=total_tokens
-        )
-        execution_id = execution.get("id")
-         # --- NEW: Auto-save test scenarios from workflow output ---
-        if status == 'succeeded' and outputs and outputs.get('structured_output'):
-            try:
-                ScenarioService.save_scenarios_from_workflow(project_id, {"structured_output": outputs['structured_output']}, execution_id)
-            except Exception as e:
-                logger.error(f"Error auto-saving test scenarios from workflow output: {str(e)}")
-
-        # Step 3: Lưu task_id và workflow_run_id (có thể cập nhật vào DB nếu cần)
-        if execution_id and (task_id or workflow_run_id):
-            from utils import database
-            database.update_workflow_execution(execution_id, {
-                "task_id": task_id,
-                "workflow_run_id": workflow_run_id,
-            })
-
-        return {
-            "execution_id": execution_id,
-            "dify_response": response_json,
-        }
-    except Exception as e:
-        logger.error(f"Error running Dify workflow: {str(e)}")
-        execution = create_execution(
-            workflow_id=workflow_id,
-            project_id=project_id,
-            status="failed",
-            inputs=inputs,
-            outputs=None,
-            error=str(e),
-            total_steps=None,
-            total_tokens=None
-        )
-        execution_id = execution.get('id') if isinstance(execution, dict) else None
-        raise
-
+    if response_mode != "streaming":
+        logger.info(f"response_mode={response_mode} requested; Dify runs are always streamed in the background")
+    execution = runner.submit(project_id, workflow, inputs, user)
+    return {
+        "execution_id": execution["id"],
+        "status": execution["status"],
+        "dify_response": None,
+    }
 
 
 def get_workflow_execution_detail(execution_id):
@@ -0,0 +1,249 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from utils import database
+from utils.logger import logger
+from services.scenario import ScenarioService
+from services.dify_service import (
+    stream_workflow_with_dify,
+    update_execution_from_dify_result,
+    TERMINAL_RUN_STATUSES,
+)
+
+DIFY_RUNNER_WORKERS = int(os.environ.get("DIFY_RUNNER_WORKERS", "4"))
+DIFY_RECONCILE_INTERVAL = float(os.environ.get("DIFY_RECONCILE_INTERVAL", "30"))
+DIFY_STREAM_STALE_AFTER = float(os.environ.get("DIFY_STREAM_STALE_AFTER", "90"))
+DIFY_PENDING_TIMEOUT = float(os.environ.get("DIFY_PENDING_TIMEOUT", "600"))
+DIFY_RECONCILE_ON_START = os.environ.get("DIFY_RECONCILE_ON_START", "true").lower() in ("1", "true", "yes")
+
+NODE_EVENT_FIELDS = ("node_id", "node_type", "title", "index", "status", "elapsed_time", "error")
+
+
+def save_structured_output(project_id, execution_id, outputs):
+    """Auto-save test scenarios from a finished workflow's structured output."""
+    if not (outputs and outputs.get("structured_output")):
+        return False
+    try:
+        ScenarioService.save_scenarios_from_workflow(
+            project_id, {"structured_output": outputs["structured_output"]}, execution_id
+        )
+        return True
+    except Exception as e:
+        logger.error(f"Error auto-saving test scenarios from workflow output: {str(e)}")
+        return False
+
+
+class WorkflowRunner:
+    """
+    Runs Dify workflows in background threads and records their progress.
+
+    Each run consumes the Dify event stream and writes node/progress events
+    into workflow_executions as they arrive. A reconciler thread polls Dify
+    for executions whose stream was lost or went silent.
+    """
+
+    def __init__(self, workers=DIFY_RUNNER_WORKERS, reconcile_interval=DIFY_RECONCILE_INTERVAL,
+                 stale_after=DIFY_STREAM_STALE_AFTER, pending_timeout=DIFY_PENDING_TIMEOUT):
+        self.workers = workers
+        self.reconcile_interval = reconcile_interval
+        self.stale_after = stale_after
+        self.pending_timeout = pending_timeout
+        self._executor = None
+        self._streaming = set()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._reconciler_pid = None
+
+    def start_reconciler(self):
+        """Start the reconcile thread of this process; safe to call repeatedly."""
+        if self._reconciler_pid == os.getpid():
+            return
+        with self._lock:
+            if self._reconciler_pid == os.getpid():
+                return
+            threading.Thread(target=self._reconcile_loop, name="dify-reconciler", daemon=True).start()
+            self._reconciler_pid = os.getpid()
+
+    def _ensure_started(self):
+        # Threads do not survive fork, so (re)start them in each process
+        self.start_reconciler()
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._streaming = set()
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="dify-run")
+            self._pid = os.getpid()
+            logger.info(f"Dify workflow runner started with {self.workers} workers")
+
+    def submit(self, project_id, workflow, inputs, user):
+        """Create a pending execution, dispatch the run and return without waiting for Dify."""
+        now = datetime.utcnow()
+        execution = {
+            "id": str(uuid.uuid4()),
+            "workflow_id": workflow["workflow_id"],
+            "project_id": project_id,
+            "status": "pending",
+            "inputs": inputs,
+            "outputs": None,
+            "error": None,
+            "total_steps": None,
+            "total_tokens": None,
+            "task_id": None,
+            "workflow_run_id": None,
+            "current_node": None,
+            "completed_steps": 0,
+            "events": [],
+            "stream_lost": False,
+            "created_at": now,
+            "started_at": None,
+            "finished_at": None,
+            "elapsed_time": None,
+            "last_event_at": now,
+        }
+        self._ensure_started()
+        # Queued runs count as streaming so the reconciler leaves them alone until they finish
+        with self._lock:
+            self._streaming.add(execution["id"])
+        try:
+            database.create_workflow_execution(execution)
+            execution.pop("_id", None)
+            self._executor.submit(self._run, execution["id"], project_id, workflow, inputs, user)
+        except Exception:
+            with self._lock:
+                self._streaming.discard(execution["id"])
+            raise
+        logger.info(f"Dispatched Dify run for execution {execution['id']}")
+        return execution
+
+    def _run(self, execution_id, project_id, workflow, inputs, user):
+        try:
+            execution = database.get_workflow_execution(execution_id)
+            if execution and execution.get("status") in TERMINAL_RUN_STATUSES:
+                logger.info(f"Skipping Dify run for execution {execution_id}: already {execution['status']}")
+                return
+            finished = False
+            for event in stream_workflow_with_dify(workflow["api_key"], inputs, user, workflow.get("mode")):
+                finished = self._handle_event(execution_id, project_id, event) or finished
+            if not finished:
+                raise Exception("Dify stream ended before workflow_finished")
+        except Exception as e:
+            logger.error(f"Dify stream for execution {execution_id} failed: {str(e)}")
+            try:
+                self._on_stream_error(execution_id, e)
+            except Exception as db_error:
+                logger.error(f"Failed to record stream error for {execution_id}: {str(db_error)}")
+        finally:
+            with self._lock:
+                self._streaming.discard(execution_id)
+
+    def _on_stream_error(self, execution_id, error):
+        execution = database.get_workflow_execution(execution_id)
+        if not execution or execution.get("status") in TERMINAL_RUN_STATUSES:
+            return
+        if execution.get("workflow_run_id"):
+            # The run may still be going on Dify's side; let the reconciler find out
+            database.update_workflow_execution(execution_id, {
+                "stream_lost": True, "error": f"Stream lost: {str(error)}"
+            })
+        else:
+            database.update_workflow_execution(execution_id, {
+                "status": "failed", "error": str(error), "finished_at": datetime.utcnow()
+            })
+
+    def _handle_event(self, execution_id, project_id, event):
+        """Persist one stream event; returns True once the workflow has finished."""
+        kind = event.get("event")
+        data = event.get("data") or {}
+
+        if kind == "workflow_started":
+            database.record_workflow_execution_event(execution_id, {
+                "status": "running",
+                "task_id": event.get("task_id"),
+                "workflow_run_id": event.get("workflow_run_id") or data.get("id"),
+                "started_at": datetime.utcnow(),
+            })
+        elif kind in ("node_started", "node_finished"):
+            node_event = {"event": kind, "at": datetime.utcnow()}
+            node_event.update({k: data.get(k) for k in NODE_EVENT_FIELDS if k in data})
+            update = {"current_node": data.get("title") or data.get("node_id")}
+            if kind == "node_finished" and data.get("index") is not None:
+                update["completed_steps"] = data["index"]
+            database.record_workflow_execution_event(execution_id, update, node_event)
+        elif kind == "workflow_finished":
+            status = data.get("status", "unknown")
+            outputs = data.get("outputs")
+            database.record_workflow_execution_event(execution_id, {
+                "status": status,
+                "outputs": outputs,
+                "error": data.get("error"),
+                "total_steps": data.get("total_steps"),
+                "total_tokens": data.get("total_tokens"),
+                "elapsed_time": data.get("elapsed_time"),
+                "current_node": None,
+                "finished_at": datetime.utcnow(),
+            })
+            if status == "succeeded":
+                save_structured_output(project_id, execution_id, outputs)
+            return True
+        elif kind == "error":
+            database.record_workflow_execution_event(execution_id, {
+                "status": "failed",
+                "error": event.get("message") or event.get("code"),
+                "finished_at": datetime.utcnow(),
+            })
+            return True
+        elif kind == "ping":
+            database.record_workflow_execution_event(execution_id, {})
+        return False
+
+    def _reconcile_loop(self):
+        while True:
+            try:
+                self.reconcile_once()
+            except Exception as e:
+                logger.error(f"Dify reconcile pass failed: {str(e)}")
+            time.sleep(self.reconcile_interval)
+
+    def reconcile_once(self):
+        """Poll Dify for executions whose stream was lost; returns the number checked."""
+        now = datetime.utcnow()
+        stale = database.find_stale_workflow_executions(now - timedelta(seconds=self.stale_after))
+        checked = 0
+        for execution in stale:
+            execution_id = execution["id"]
+            with self._lock:
+                if execution_id in self._streaming:
+                    continue
+            # Several workers may run a reconciler; only one polls a given execution per interval
+            if not database.claim_workflow_execution(execution_id, now - timedelta(seconds=self.reconcile_interval)):
+                continue
+            checked += 1
+            workflow_run_id = execution.get("workflow_run_id")
+            if not workflow_run_id:
+                created_at = execution.get("created_at")
+                if created_at and created_at < now - timedelta(seconds=self.pending_timeout):
+                    database.update_workflow_execution(execution_id, {
+                        "status": "failed",
+                        "error": "Dify run never started",
+                        "finished_at": now,
+                    })
+                continue
+            workflow = database.get_workflow(execution.get("workflow_id"))
+            if not workflow or not workflow.get("api_key"):
+                continue
+            try:
+                update_execution_from_dify_result(
+                    workflow["api_key"], workflow_run_id, execution_id,
+                    execution.get("project_id"), workflow.get("mode"),
+                )
+            except Exception as e:
+                logger.warning(f"Could not reconcile execution {execution_id}: {str(e)}")
+        return checked
+
+
+runner = WorkflowRunner()
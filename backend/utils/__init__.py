@@ -1,7 +1,7 @@
+from importlib import import_module
 from .flask_app import get_app
 from .common import return_status
 from .models import MODELS
-from .lavague_task import run_web_task, run_web_task_by_lines
 from . import database
 from .logger import setup_logger
 
@@ -16,4 +16,20 @@ __all__ = [
     "run_web_task_by_lines",
     "database",
     "setup_logger"
-]
\ No newline at end of file
+]
+
+# LaVague and Selenium take seconds to import and are only needed to run web
+# tasks, so utils.lavague_task is loaded on first use of these names
+_LAZY_ATTRIBUTES = {
+    "run_web_task": ".lavague_task",
+    "run_web_task_by_lines": ".lavague_task",
+}
+
+
+def __getattr__(name):
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
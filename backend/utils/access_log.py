@@ -0,0 +1,209 @@
+"""
+Structured access log.
+
+One JSON record per request on the 'innolab.access' logger, with timing
+fields: total time inside Flask, time spent in MongoDB commands, JSON
+serialization and external calls (see utils.request_timing), plus status
+and sizes. Records go through the async handlers of utils.logger. The
+hooks are registered by utils.instrumentation.
+
+Bodies are only logged for sampled requests and for responses with a 4xx
+or 5xx status, and are cut to a size cap. The level and sampling can be
+set per route with ACCESS_LOG_ROUTES, a JSON object mapping fnmatch path
+patterns to overrides; the first matching pattern wins:
+
+    ACCESS_LOG_ROUTES='{"/api/ping": {"level": "DEBUG"},
+                        "/api/fixchain/*": {"sample_rate": 0.05, "body_limit": 8192}}'
+
+The route level applies to successful requests; 4xx responses are logged
+at WARNING or above and 5xx at ERROR.
+
+Requests served by the async handlers (utils.async_app) never reach Flask;
+utils.instrumentation logs them with log_asgi_request(), without bodies.
+"""
+
+import json
+import logging
+import os
+import random
+import time
+from fnmatch import fnmatchcase
+from functools import lru_cache
+from flask import g, request
+from werkzeug.exceptions import HTTPException
+from . import request_timing
+from .logger import logger
+
+ACCESS_LOG_ENABLED = os.environ.get("ACCESS_LOG_ENABLED", "true").lower() in ("1", "true", "yes")
+ACCESS_LOG_LEVEL = os.environ.get("ACCESS_LOG_LEVEL", "INFO").upper()
+ACCESS_LOG_SAMPLE_RATE = float(os.environ.get("ACCESS_LOG_SAMPLE_RATE", "0"))
+ACCESS_LOG_BODY_LIMIT = int(os.environ.get("ACCESS_LOG_BODY_LIMIT", "2048"))
+# Request bodies larger than this are summarised instead of read for logging
+ACCESS_LOG_MAX_READ = 1024 * 1024
+# Spans with their own fields; other spans are logged as <name>_ms
+_OWN_FIELDS = ('db', 'serialize')
+
+access_logger = logger.getChild('access')
+
+
+def _level(name, fallback=logging.INFO):
+    level = logging.getLevelName(str(name).upper())
+    return level if isinstance(level, int) else fallback
+
+
+def _load_routes(raw):
+    try:
+        routes = json.loads(raw) if raw else {}
+        if not isinstance(routes, dict):
+            raise ValueError("expected an object of pattern -> settings")
+    except ValueError as e:
+        logger.warning("Ignoring ACCESS_LOG_ROUTES: %s", e)
+        return []
+    return [(pattern, settings) for pattern, settings in routes.items() if isinstance(settings, dict)]
+
+
+ROUTES = _load_routes(os.environ.get("ACCESS_LOG_ROUTES", ""))
+
+
+@lru_cache(maxsize=1024)
+def route_settings(path):
+    """(level, sample rate, body limit) for a request path."""
+    settings = next((s for pattern, s in ROUTES if fnmatchcase(path, pattern)), {})
+    return (
+        _level(settings.get('level', ACCESS_LOG_LEVEL)),
+        float(settings.get('sample_rate', ACCESS_LOG_SAMPLE_RATE)),
+        int(settings.get('body_limit', ACCESS_LOG_BODY_LIMIT)),
+    )
+
+
+def _clip(data, limit):
+    if data is None:
+        return None
+    text = data[:limit].decode('utf-8', errors='replace') if isinstance(data, bytes) else str(data)[:limit]
+    size = len(data)
+    return text if size <= limit else f"{text}... [{size} bytes]"
+
+
+def _request_body(limit):
+    length = request.content_length or 0
+    if not length:
+        return None
+    if length > ACCESS_LOG_MAX_READ or request.mimetype.startswith('multipart/'):
+        return f"[{request.mimetype}, {length} bytes]"
+    return _clip(request.get_data(cache=True), limit)
+
+
+def _response_body(response, limit):
+    if response.is_streamed or response.direct_passthrough:
+        return None
+    return _clip(response.get_data(), limit)
+
+
+def start_request():
+    if not ACCESS_LOG_ENABLED:
+        return
+    level, sample_rate, _ = route_settings(request.path)
+    g.access_log = {
+        'start': time.perf_counter(),
+        'level': level,
+        'sampled': sample_rate > 0 and random.random() < sample_rate,
+        'logged': False,
+    }
+
+
+def _status_level(level, status):
+    if status >= 500:
+        return logging.ERROR
+    if status >= 400:
+        return max(level, logging.WARNING)
+    return level
+
+
+def _timing_fields(record, timings):
+    record['db_ms'] = round(timings.seconds('db') * 1000, 2)
+    record['db_commands'] = timings.count('db')
+    record['serialize_ms'] = round(timings.seconds('serialize') * 1000, 2)
+    for name, (seconds, _) in timings.spans.items():
+        if name not in _OWN_FIELDS:
+            record[f'{name}_ms'] = round(seconds * 1000, 2)
+    return record
+
+
+def _write(state, status, response=None, error=None):
+    state['logged'] = True
+    level = _status_level(state['level'], status)
+    if not access_logger.isEnabledFor(level):
+        return
+
+    timings = request_timing.current() or request_timing.RequestTimings()
+    route = request.url_rule.rule if request.url_rule is not None else None
+    record = _timing_fields({
+        'method': request.method,
+        'path': request.path,
+        'route': route,
+        'status': status,
+        'duration_ms': round((time.perf_counter() - state['start']) * 1000, 2),
+    }, timings)
+    if response is not None:
+        record['response_bytes'] = response.content_length
+        if response.is_streamed:
+            record['streamed'] = True  # Timings stop before the body is sent
+    if error is not None:
+        record['error'] = str(error)
+    if state['sampled'] or status >= 400:
+        _, _, limit = route_settings(request.path)
+        record['sampled'] = state['sampled']
+        record['request_body'] = _request_body(limit)
+        if response is not None:
+            record['response_body'] = _response_body(response, limit)
+    # Plain json so the record does not count towards the request's serialize time
+    access_logger.log(level, "%s", json.dumps(record, ensure_ascii=False, default=str))
+
+
+def finish_request(response):
+    """Log the request; used as an after_request hook, so it returns the response."""
+    state = g.get('access_log')
+    if state is not None and not state['logged']:
+        try:
+            _write(state, response.status_code, response)
+        except Exception as e:
+            logger.error("Error writing access log: %s", e)
+    return response
+
+
+def exception_status(exc):
+    """Status a request ending in exc is answered with: an HTTPException's own code, else 500."""
+    if isinstance(exc, HTTPException) and exc.code:
+        return exc.code
+    return 500
+
+
+def teardown_request(exc=None):
+    """Log requests that ended in an unhandled exception."""
+    state = g.pop('access_log', None)
+    if state is None or state['logged']:
+        return
+    try:
+        _write(state, exception_status(exc), error=exc or 'request ended without a response')
+    except Exception as e:
+        logger.error("Error writing access log: %s", e)
+
+
+def log_asgi_request(method, path, route, status, seconds, timings, error=None):
+    """Log a request served outside Flask by an async handler."""
+    if not ACCESS_LOG_ENABLED:
+        return
+    level = _status_level(route_settings(path)[0], status)
+    if not access_logger.isEnabledFor(level):
+        return
+    record = _timing_fields({
+        'method': method,
+        'path': path,
+        'route': route,
+        'status': status,
+        'duration_ms': round(seconds * 1000, 2),
+        'async': True,
+    }, timings)
+    if error is not None:
+        record['error'] = str(error)
+    access_logger.log(level, "%s", json.dumps(record, ensure_ascii=False, default=str))
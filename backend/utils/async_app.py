@@ -0,0 +1,108 @@
+"""
+Async request path for I/O-bound operations.
+
+Flask views run in a WSGI thread pool, so every request waiting on MongoDB
+or an upstream API holds a thread, and a worker serves at most as many
+such requests as it has threads. Operations whose spec carries an
+x-async-handler naming a coroutine are instead served by that coroutine
+directly on the event loop:
+
+    /api/workflow/get:
+      get:
+        operationId: controllers.workflow.get_workflow
+        x-async-handler: controllers.aio.workflow.get_workflow
+
+AsyncHandlerMiddleware sits innermost in connexion's middleware stack, so
+routing, security and request validation run as for any other request,
+and every other operation falls through to Flask. The handlers get their
+parameters as keyword arguments and return the same payloads as the sync
+controllers; their responses are encoded with the app's jsonifier and
+timed by utils.instrumentation. Set ASYNC_HANDLERS=false to send every
+request to Flask.
+"""
+
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from connexion.apps.asynchronous import AsyncApi
+from connexion.frameworks.flask import flaskify_path
+from connexion.middleware import ConnexionMiddleware
+from connexion.middleware.abstract import ROUTING_CONTEXT, RoutedMiddleware
+from connexion.resolver import Resolution, Resolver, ResolverError
+from connexion.utils import get_function_from_name
+from . import async_http, instrumentation
+from .logger import logger
+from .mongo import manager
+
+ASYNC_HANDLERS = os.environ.get("ASYNC_HANDLERS", "true").lower() in ("1", "true", "yes")
+ASYNC_HANDLER_KEY = "x-async-handler"
+
+
+class AsyncHandlerResolver(Resolver):
+    """Resolve an operation to the coroutine named by its x-async-handler."""
+
+    def __init__(self, specification):
+        super().__init__()
+        self.specification = specification
+
+    def resolve(self, operation):
+        spec_operation = self.specification.get_operation(operation.path, operation.method) or {}
+        handler = spec_operation.get(ASYNC_HANDLER_KEY)
+        if not handler:
+            # Skipped by AsyncApi.add_paths: the operation stays on Flask
+            raise ResolverError(f"{operation.method.upper()} {operation.path} has no {ASYNC_HANDLER_KEY}")
+        # Import errors and sync handlers fail at startup rather than falling back to Flask
+        function = get_function_from_name(handler)
+        if not asyncio.iscoroutinefunction(function):
+            raise TypeError(f"{ASYNC_HANDLER_KEY} {handler} is not a coroutine function")
+        return Resolution(function, self.resolve_operation_id(operation))
+
+
+class AsyncHandlerApi(AsyncApi):
+    """The x-async-handler operations of one API, keyed by operationId."""
+
+    def __init__(self, specification, *args, **kwargs):
+        self.routes = {}  # operation_id -> route label, as Flask's url_rule
+        kwargs["resolver"] = AsyncHandlerResolver(specification)
+        super().__init__(specification, *args, **kwargs)
+
+    def make_operation(self, operation):
+        path = flaskify_path(operation.path, operation.get_path_parameter_types())
+        self.routes[operation.operation_id] = f"{self.base_path}{path}"
+        return super().make_operation(operation)
+
+
+class AsyncHandlerMiddleware(RoutedMiddleware[AsyncHandlerApi]):
+    """Serve x-async-handler operations on the event loop; pass the rest to Flask."""
+
+    api_cls = AsyncHandlerApi
+
+    def add_api(self, specification, **kwargs):
+        if not ASYNC_HANDLERS:
+            return None
+        api = super().add_api(specification, **kwargs)
+        if api.operations:
+            logger.info("Async handlers for %s: %s", api.base_path or "/", ", ".join(sorted(api.routes.values())))
+        return api
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            routing = scope.get("extensions", {}).get(ROUTING_CONTEXT, {})
+            for api in self.apis.get(routing.get("api_base_path"), ()):
+                operation = api.operations.get(routing.get("operation_id"))
+                if operation is not None:
+                    route = api.routes[routing["operation_id"]]
+                    return await instrumentation.call_asgi(operation, route, scope, receive, send)
+        await self.app(scope, receive, send)
+
+
+# Connexion's default stack with the async handlers innermost, after ContextMiddleware
+MIDDLEWARES = [*ConnexionMiddleware.default_middlewares, AsyncHandlerMiddleware]
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Close the event loop's pooled HTTP and MongoDB clients at shutdown."""
+    yield
+    await async_http.aclose_all()
+    await manager.aclose()
@@ -0,0 +1,74 @@
+"""
+Async counterparts of the read helpers in utils.database.
+
+Used by the async handlers in controllers.aio, which run on the event
+loop and must not block it on a socket read. Each function issues the same
+query, with the same projection, sort and return shape, as its namesake
+in utils.database, through the loop's AsyncMongoClient (utils.mongo).
+"""
+
+from .logger import logger
+from .database import serialize_doc
+from .mongo import get_async_db
+
+
+async def get_workflow(workflow_id):
+    logger.info("Getting workflow with ID: %s", workflow_id)
+    try:
+        workflow = await get_async_db().workflows.find_one({'workflow_id': workflow_id})
+        if workflow:
+            workflow.pop('_id', None)
+        return workflow
+    except Exception as e:
+        logger.error("Error getting workflow: %s", e)
+        raise e
+
+
+async def get_workflow_execution(execution_id):
+    logger.info(f"Getting workflow execution: {execution_id}")
+    try:
+        execution = await get_async_db().workflow_executions.find_one({'id': execution_id})
+        if execution:
+            execution.pop('_id', None)
+        return execution
+    except Exception as e:
+        logger.error(f"Error getting workflow execution: {e}")
+        raise e
+
+
+async def get_workflow_executions(project_id):
+    """Get all workflow executions for a project."""
+    logger.info(f"Getting workflow executions for project: {project_id}")
+    try:
+        cursor = get_async_db().workflow_executions.find({'project_id': project_id}).sort('created_at', -1)
+        return serialize_doc(await cursor.to_list())
+    except Exception as e:
+        logger.error(f"Error getting workflow executions: {e}")
+        raise e
+
+
+async def get_documents_by_workflow(workflow_id):
+    """Get all documents for a workflow."""
+    logger.info("Getting documents for workflow_id: %s", workflow_id)
+    try:
+        docs = await get_async_db().documents.find({'workflow_id': workflow_id}).to_list()
+        return serialize_doc(docs)
+    except Exception as e:
+        logger.error("Error getting documents: %s", e)
+        raise e
+
+
+async def find_bug_reports(filters, limit):
+    """Latest bug reports matching source_file / bug_type filters, without embeddings."""
+    query = {}
+    if filters.get('source_file'):
+        query['source_file'] = filters['source_file']
+    if filters.get('bug_type'):
+        query['bug_type'] = filters['bug_type']
+    logger.debug(f"[find_bug_reports] Query: {query}, Limit: {limit}")
+    try:
+        cursor = get_async_db().bug_reports.find(query, {'_id': 0, 'embedding': 0}).sort('created_at', -1).limit(limit)
+        return await cursor.to_list()
+    except Exception as e:
+        logger.error(f"[find_bug_reports] Error searching bugs: {e}")
+        raise e
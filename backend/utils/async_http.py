@@ -0,0 +1,42 @@
+"""
+Pooled httpx.AsyncClient per upstream service.
+
+The async handlers (utils.async_app) call external services through one
+AsyncClient per service and event loop, so keep-alive connections are
+reused across requests instead of being opened per call. Clients are
+closed by aclose_all() at lifespan shutdown.
+"""
+
+import asyncio
+import os
+import httpx
+from .logger import logger
+
+ASYNC_HTTP_MAX_CONNECTIONS = int(os.environ.get("ASYNC_HTTP_MAX_CONNECTIONS", "100"))
+ASYNC_HTTP_MAX_KEEPALIVE = int(os.environ.get("ASYNC_HTTP_MAX_KEEPALIVE", "20"))
+ASYNC_HTTP_CONNECT_TIMEOUT = float(os.environ.get("ASYNC_HTTP_CONNECT_TIMEOUT", "10"))
+
+_clients = {}  # (service, event loop) -> httpx.AsyncClient
+
+
+def get_client(service, base_url, timeout):
+    """Return the pooled AsyncClient for a service on the running event loop."""
+    key = (service, asyncio.get_running_loop())
+    client = _clients.get(key)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(timeout, connect=ASYNC_HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=ASYNC_HTTP_MAX_CONNECTIONS,
+                                max_keepalive_connections=ASYNC_HTTP_MAX_KEEPALIVE),
+        )
+        _clients[key] = client
+        logger.info("Async HTTP client created for %s (max_connections=%s)", service, ASYNC_HTTP_MAX_CONNECTIONS)
+    return client
+
+
+async def aclose_all():
+    """Close the clients of the running event loop."""
+    loop = asyncio.get_running_loop()
+    for key in [key for key in _clients if key[1] is loop]:
+        await _clients.pop(key).aclose()
@@ -0,0 +1,208 @@
+"""
+Content-addressed blob store for bug and fix screenshots.
+
+Blobs are keyed by the SHA-256 of their bytes, so identical images are
+stored once. Bytes live on local disk (default) or in GridFS; a small
+metadata document per blob is kept in the blobs collection. Bug and fix
+documents only hold references: {"blob_id", "content_type", "size"}.
+"""
+
+import base64
+import binascii
+import hashlib
+import os
+import re
+import tempfile
+from datetime import datetime
+from pymongo.errors import DuplicateKeyError
+from .logger import logger
+from .mongo import get_db
+
+BLOB_STORE_BACKEND = os.environ.get("BLOB_STORE_BACKEND", "disk").lower()
+BLOB_STORE_PATH = os.environ.get("BLOB_STORE_PATH", "data/blobs")
+BLOB_MAX_SIZE = int(os.environ.get("BLOB_MAX_SIZE", str(10 * 1024 * 1024)))
+BLOB_URL_PREFIX = os.environ.get("BLOB_URL_PREFIX", "/api/blob/download?blob_id=")
+
+_DATA_URL_RE = re.compile(r"^data:(?P<type>[\w.+-]+/[\w.+-]+)?(?P<params>(;[^;,]*)*?);base64,", re.I)
+_BLOB_ID_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def parse_data_url(data_url):
+    """Split a base64 data URL into (content_type, bytes); raises ValueError."""
+    match = _DATA_URL_RE.match(data_url or "")
+    if not match:
+        raise ValueError("Not a base64 data URL")
+    try:
+        data = base64.b64decode(data_url[match.end():], validate=True)
+    except (binascii.Error, ValueError):
+        raise ValueError("Invalid base64 payload")
+    return (match.group("type") or "application/octet-stream").lower(), data
+
+
+def is_blob_id(value):
+    return isinstance(value, str) and bool(_BLOB_ID_RE.match(value))
+
+
+class DiskBlobBackend:
+    """Blobs as files under root/ab/cd/<sha256>."""
+
+    def __init__(self, root=BLOB_STORE_PATH):
+        self.root = root
+
+    def _path(self, blob_id):
+        return os.path.join(self.root, blob_id[:2], blob_id[2:4], blob_id)
+
+    def exists(self, blob_id):
+        return os.path.exists(self._path(blob_id))
+
+    def put(self, blob_id, data):
+        path = self._path(blob_id)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so readers never see a partial blob
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def open(self, blob_id):
+        return open(self._path(blob_id), "rb")
+
+    def delete(self, blob_id):
+        path = self._path(blob_id)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class GridFSBlobBackend:
+    """Blobs as GridFS files named by their sha256."""
+
+    def __init__(self, bucket_name="blob_files"):
+        self.bucket_name = bucket_name
+
+    def _bucket(self):
+        import gridfs
+        return gridfs.GridFSBucket(get_db(), bucket_name=self.bucket_name)
+
+    def exists(self, blob_id):
+        return get_db()[f"{self.bucket_name}.files"].count_documents({"filename": blob_id}, limit=1) > 0
+
+    def put(self, blob_id, data):
+        if self.exists(blob_id):
+            return
+        self._bucket().upload_from_stream(blob_id, data)
+
+    def open(self, blob_id):
+        # GridOut is file-like and seekable, which range requests rely on
+        return self._bucket().open_download_stream_by_name(blob_id)
+
+    def delete(self, blob_id):
+        bucket = self._bucket()
+        for grid_file in bucket.find({"filename": blob_id}):
+            bucket.delete(grid_file._id)
+
+
+class BlobStore:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def put_bytes(self, data, content_type="application/octet-stream"):
+        """Store bytes (deduplicated by SHA-256) and return a blob reference."""
+        if len(data) > BLOB_MAX_SIZE:
+            raise ValueError(f"Blob exceeds the {BLOB_MAX_SIZE} byte limit")
+        blob_id = hashlib.sha256(data).hexdigest()
+        self.backend.put(blob_id, data)
+        try:
+            get_db().blobs.update_one(
+                {"_id": blob_id},
+                {"$setOnInsert": {
+                    "content_type": content_type,
+                    "size": len(data),
+                    "backend": BLOB_STORE_BACKEND,
+                    "created_at": datetime.utcnow(),
+                }},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            pass  # Concurrent upsert of the same blob
+        return {"blob_id": blob_id, "content_type": content_type, "size": len(data)}
+
+    def put_data_url(self, data_url):
+        content_type, data = parse_data_url(data_url)
+        return self.put_bytes(data, content_type)
+
+    def get_meta(self, blob_id):
+        if not is_blob_id(blob_id):
+            return None
+        return get_db().blobs.find_one({"_id": blob_id})
+
+    def open(self, blob_id):
+        return self.backend.open(blob_id)
+
+
+def _create_backend():
+    if BLOB_STORE_BACKEND == "gridfs":
+        return GridFSBlobBackend()
+    if BLOB_STORE_BACKEND != "disk":
+        logger.warning("Unknown BLOB_STORE_BACKEND %r, using disk", BLOB_STORE_BACKEND)
+    return DiskBlobBackend()
+
+
+blob_store = BlobStore(_create_backend())
+
+
+def blob_url(blob_id):
+    return f"{BLOB_URL_PREFIX}{blob_id}"
+
+
+def _blob_ref_from_url(url):
+    """Blob reference for a download URL as returned by image_urls, or None if it is not one."""
+    if BLOB_URL_PREFIX not in url:
+        return None
+    blob_id = url.split(BLOB_URL_PREFIX, 1)[1]
+    if not is_blob_id(blob_id):
+        return None
+    meta = blob_store.get_meta(blob_id)
+    if meta is None:
+        raise ValueError(f"Unknown blob: {blob_id}")
+    return {"blob_id": blob_id, "content_type": meta.get("content_type"), "size": meta.get("size")}
+
+
+def store_images(images):
+    """Turn a list of images into stored references.
+
+    Base64 data URLs are stored as blobs; blob references and the download
+    URLs that responses carry map back to references, so a document read and
+    written back keeps its images. Legacy http(s) URLs are kept as they are.
+    """
+    refs = []
+    for image in images or []:
+        if isinstance(image, dict) and is_blob_id(image.get("blob_id")):
+            refs.append(image)
+        elif isinstance(image, str) and image.startswith("data:"):
+            refs.append(blob_store.put_data_url(image))
+        elif isinstance(image, str):
+            ref = _blob_ref_from_url(image)
+            if ref is None and not image.startswith(("http://", "https://")):
+                raise ValueError("Images must be base64 data URLs, image URLs or blob references")
+            refs.append(ref or image)
+        else:
+            raise ValueError("Images must be base64 data URLs, image URLs or blob references")
+    return refs
+
+
+def image_urls(images):
+    """Download URLs for stored image references; legacy inline strings are passed through."""
+    urls = []
+    for image in images or []:
+        if isinstance(image, dict) and image.get("blob_id"):
+            urls.append(blob_url(image["blob_id"]))
+        elif isinstance(image, str):
+            urls.append(image)
+    return urls
@@ -1,52 +1,37 @@
 import json
 import os
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
+import threading
+import time
+import uuid
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, ConnectionFailure, DuplicateKeyError
 from bson import ObjectId
-from datetime import datetime
+from datetime import datetime, timedelta
 from .logger import logger
-
-MONGODB_URL = os.environ.get("MONGODB_URL", "mongodb://mongodb:27017")
-MONGODB_DATABASE = os.environ.get("MONGODB_DATABASE", "SugoiApp")
-FIXCHAIN_RAG_DATABASE = os.environ.get("FIXCHAIN_RAG_DATABASE", "FixChainRAG")
+from .indexes import BUG_COLLECTIONS, ensure_indexes
+from .serializer import default as _json_default, to_jsonable
+from .mongo import manager, get_db, get_rag_db
 
 class JSONEncoder(json.JSONEncoder):
     def default(self, o):
-        if isinstance(o, ObjectId):
-            return str(o)
-        if isinstance(o, datetime):
-            return o.isoformat()
-        return super().default(o)
+        return _json_default(o)
 
 def serialize_doc(doc):
     """Convert MongoDB document to JSON serializable format."""
-    if doc is None:
-        return None
-    if isinstance(doc, dict):
-        return {k: serialize_doc(v) for k, v in doc.items()}
-    if isinstance(doc, list):
-        return [serialize_doc(v) for v in doc]
-    if isinstance(doc, ObjectId):
-        return str(doc)
-    if isinstance(doc, datetime):
-        return doc.isoformat()
-    return doc
+    return to_jsonable(doc)
 
 def check_db_connection():
-    try:
-        # Replace with your MongoDB URI if needed
-        client = MongoClient(MONGODB_URL, serverSelectionTimeoutMS=3000)
-
-        # Force connection on a request as the connect=True parameter of MongoClient seems to be useless here        client.admin.command('ping')
-        logger.info("✅ Connected to MongoDB!")
-    except ConnectionFailure as e:
-        logger.error("❌ Could not connect to MongoDB: %s", e)
+    latency_ms = manager.ping()
+    if latency_ms is not None:
+        logger.info("✅ Connected to MongoDB! (ping %.1f ms)", latency_ms)
+        return True
+    logger.error("❌ Could not connect to MongoDB")
+    return False
 
 def get_connection():
+    """Return the shared, pooled MongoClient. Callers must not close it."""
     try:
-        client = MongoClient(MONGODB_URL)
-        logger.info("MongoDB connection established")
-        return client
+        return manager.client
     except ConnectionFailure as e:
         logger.error("Failed to connect to MongoDB: %s", e)
         return None
@@ -64,15 +49,13 @@ def insert_or_update_item(table, query, update_data):
     """
     try:
 
-        conn = get_connection()
-        db = conn[MONGODB_DATABASE]
+        db = get_db()
         collection = db[table]
         update_result = collection.update_one(
             query,
             {'$set': update_data},
             upsert=True
         )
-        conn.close()
         if update_result.upserted_id is not None:
             logger.info("New document inserted with ID: %s", update_result.upserted_id)
             return True
@@ -90,24 +73,23 @@ def insert_or_update_item(table, query, update_data):
 def get(table, condition):
     logger.info("Getting document from table '%s' with condition: %s", table, condition)
     try:
-        conn = get_connection()
-        db = conn[MONGODB_DATABASE]
+        db = get_db()
         collection = db[table]
         res = collection.find_one(condition, {'_id': 0})
-        conn.close()
         logger.debug("Retrieved document: %s", res)
         return res
     except ConnectionFailure as e:
         logger.error("Connection failure during get: %s", e)
 
+def iter_all(table, condition):
+    """Cursor over the documents of a table matching condition, for streaming."""
+    db = get_db()
+    return db[table].find(condition, {'_id': 0})
+
 def get_all(table, condition):
     logger.info("Getting all documents from table '%s' with condition: %s", table, condition)
     try:
-        conn = get_connection()
-        db = conn[MONGODB_DATABASE]
-        collection = db[table]
-        res = list(collection.find(condition, {'_id': 0}))
-        conn.close()
+        res = list(iter_all(table, condition))
         logger.info("Retrieved %d documents", len(res))
         logger.debug("Retrieved documents: %s", res)
         return res
@@ -117,11 +99,7 @@ def get_all(table, condition):
 def get_all_projects():
     logger.info("Retrieving all projects")
     try:
-        client = get_connection()
-        if not client:
-            logger.error("Failed to connect to MongoDB")
-            raise Exception("Could not connect to MongoDB")
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         projects = list(db.projects.find())
         logger.info("Retrieved %d projects", len(projects))
         # Ensure all fields are present for each project
@@ -142,11 +120,7 @@ def get_all_projects():
 def create_project(data):
     logger.info("Creating new project with data: %s", data)
     try:
-        client = get_connection()
-        if not client:
-            logger.error("Failed to connect to MongoDB")
-            raise Exception("Could not connect to MongoDB")
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         project = {
             'project_id': data['project_id'],
             'id': data.get('id', data['project_id']),
@@ -170,11 +144,7 @@ def create_project(data):
 def get_project(project_id):
     logger.info("Getting project with ID: %s", project_id)
     try:
-        client = get_connection()
-        if not client:
-            logger.error("Failed to connect to MongoDB")
-            raise Exception("Could not connect to MongoDB")
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         # Try to find by project_id first
         logger.debug("Searching by project_id: %s", project_id)
         project = db.projects.find_one({'project_id': project_id})
@@ -196,17 +166,7 @@ def get_project(project_id):
 def get_project_tasks(project_id):
     logger.info("Getting tasks for project_id: %s", project_id)
     try:
-        client = get_connection()
-        if not client:
-            logger.error("Failed to connect to MongoDB")
-            raise Exception("Could not connect to MongoDB")
-        db = client[MONGODB_DATABASE]
-        
-        # Let's first check what's in the collection
-        all_tasks = list(db.tasks.find())
-        logger.debug("All tasks in collection: %s", all_tasks)
-        
-        # Now search with our query
+        db = get_db()
         query = {'project_id': project_id}
         logger.debug("Searching tasks with query: %s", query)
         tasks = list(db.tasks.find(query))
@@ -219,22 +179,70 @@ def get_project_tasks(project_id):
             return serialized_tasks
         else:
             logger.warning("No tasks found for project_id: %s", project_id)
-            logger.debug("Checking task insertion: %s", db.tasks.find_one({'_id': ObjectId("683f3ada186b07cac0a0c5f9")}))
             return []
     except Exception as e:
         logger.error("Error getting project tasks: %s", e)
         raise e
 
+def iter_project_tasks_with_test_cases(project_id, fields=None, limit=None, query=None):
+    """Aggregation cursor over a project's tasks with their test cases, for streaming."""
+    db = get_db()
+    pipeline = [{'$match': query or {'project_id': project_id}}, {'$sort': {'_id': 1}}]
+    if limit:
+        pipeline.append({'$limit': limit})
+    if fields:
+        projection = {field: 1 for field in fields}
+        projection['task_id'] = 1
+        pipeline.append({'$project': projection})
+    pipeline.extend([
+        {'$lookup': {
+            'from': 'test_cases',
+            'localField': 'task_id',
+            'foreignField': 'task_id',
+            'as': 'test_scenarios'
+        }},
+        {'$project': {'test_scenarios._id': 0}}
+    ])
+    return db.tasks.aggregate(pipeline)
+
+def get_project_tasks_with_test_cases(project_id, fields=None, limit=None, after=None):
+    """
+    Get tasks for a project with their test cases attached as 'test_scenarios',
+    using a single aggregation instead of one test_cases query per task.
+
+    Args:
+        project_id (str): The project to list tasks for.
+        fields (list): Optional task fields to return. task_id is always included.
+        limit (int): Optional page size.
+        after (str): Cursor from a previous page (the _id of its last task).
+
+    Returns:
+        tuple: (tasks, next_cursor). next_cursor is None on the last page.
+    """
+    logger.info("Getting tasks with test cases for project_id: %s (limit=%s, after=%s)",
+                project_id, limit, after)
+    query = {'project_id': project_id}
+    if after:
+        try:
+            query['_id'] = {'$gt': ObjectId(after)}
+        except Exception:
+            raise ValueError(f"Invalid cursor: {after}")
+    try:
+        tasks = list(iter_project_tasks_with_test_cases(project_id, fields, limit, query))
+        next_cursor = None
+        if limit and len(tasks) == limit:
+            next_cursor = str(tasks[-1]['_id'])
+        logger.info("Found %d tasks for project_id %s", len(tasks), project_id)
+        return serialize_doc(tasks), next_cursor
+    except Exception as e:
+        logger.error("Error getting project tasks with test cases: %s", e)
+        raise e
+
 def create_task(data):
     """Create a new task in the database."""
     logger.info("Creating task with data: %s", data)
     try:
-        client = get_connection()
-        if not client:
-            logger.error("Failed to connect to MongoDB")
-            raise Exception("Could not connect to MongoDB")
-            
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         
         # Verify required fields
         if not data.get('task_id'):
@@ -266,12 +274,7 @@ def get_task(project_id, task_id):
     """Get a specific task by project_id and task_id."""
     logger.info("Getting task. Project ID: %s, Task ID: %s", project_id, task_id)
     try:
-        client = get_connection()
-        if not client:
-            logger.error("Failed to connect to MongoDB")
-            raise Exception("Could not connect to MongoDB")
-            
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         task = db.tasks.find_one({
             'project_id': project_id,
             'task_id': task_id
@@ -293,12 +296,7 @@ def update_task_status(task_id, status):
     """Update task status."""
     logger.info("Updating task status. Task ID: %s, New Status: %s", task_id, status)
     try:
-        client = get_connection()
-        if not client:
-            logger.error("Failed to connect to MongoDB")
-            raise Exception("Could not connect to MongoDB")
-            
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         result = db.tasks.update_one(
             {'task_id': task_id}, 
             {'$set': {
@@ -322,11 +320,7 @@ def update_project(project_id, data):
     logger.info("Updating project. Project ID: %s", project_id)
     logger.debug("Update data: %s", data)
     try:
-        client = get_connection()
-        if not client:
-            logger.error("Failed to connect to MongoDB")
-            raise Exception("Could not connect to MongoDB")
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         # Try to find by project_id first
         logger.debug("Searching by project_id first")
         project = db.projects.find_one({'project_id': project_id})
@@ -362,11 +356,7 @@ def update_project(project_id, data):
 def delete_project(project_id):
     logger.info("Deleting project. Project ID: %s", project_id)
     try:
-        client = get_connection()
-        if not client:
-            logger.error("Failed to connect to MongoDB")
-            raise Exception("Could not connect to MongoDB")
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         
         # Try to find by project_id first
         logger.debug("Searching by project_id first")
@@ -403,11 +393,7 @@ def update_task(task_id, data):
     logger.info("Updating task. Task ID: %s", task_id)
     logger.debug("Update data: %s", data)
     try:
-        client = get_connection()
-        if not client:
-            logger.error("Failed to connect to MongoDB")
-            raise Exception("Could not connect to MongoDB")
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         
         # Log current state of task
         existing = db.tasks.find_one({'task_id': task_id})
@@ -456,11 +442,7 @@ def update_task(task_id, data):
 def delete_task(project_id, task_id):
     logger.info("Deleting task. Task ID: %s", task_id)
     try:
-        client = get_connection()
-        if not client:
-            logger.error("Failed to connect to MongoDB")
-            raise Exception("Could not connect to MongoDB")
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         
         # Try to find by task_id first
         logger.debug("Searching by task_id first")
@@ -504,11 +486,7 @@ def create_document(data):
     """Create a new document entry in the database."""
     logger.info("Creating document with data: %s", data)
     try:
-        client = get_connection()
-        if not client:
-            logger.error("Failed to connect to MongoDB")
-            raise Exception("Could not connect to MongoDB")
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         # If is_current, unset is_current for other docs in this project
         if data.get('is_current', False):
             db.documents.update_many({'workflow_id': data['workflow_id']}, {'$set': {'is_current': False}})
@@ -534,11 +512,7 @@ def get_documents_by_workflow(workflow_id):
     """Get all documents for a workflow."""
     logger.info("Getting documents for workflow_id: %s", workflow_id)
     try:
-        client = get_connection()
-        if not client:
-            logger.error("Failed to connect to MongoDB")
-            raise Exception("Could not connect to MongoDB")
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         docs = list(db.documents.find({'workflow_id': workflow_id}))
         return serialize_doc(docs)
     except Exception as e:
@@ -549,11 +523,7 @@ def delete_document(document_id):
     """Delete a document by document_id."""
     logger.info("Deleting document: %s", document_id)
     try:
-        client = get_connection()
-        if not client:
-            logger.error("Failed to connect to MongoDB")
-            raise Exception("Could not connect to MongoDB")
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         doc = db.documents.find_one({'document_id': document_id})
         if not doc:
             logger.warning("Document not found: %s", document_id)
@@ -573,11 +543,7 @@ def update_document(document_id, data):
     """Update document fields."""
     logger.info("Updating document %s with data: %s", document_id, data)
     try:
-        client = get_connection()
-        if not client:
-            logger.error("Failed to connect to MongoDB")
-            raise Exception("Could not connect to MongoDB")
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         # If is_current is set True, unset for others in project
         if data.get('is_current', False):
             doc = db.documents.find_one({'document_id': document_id})
@@ -594,11 +560,7 @@ def get_document_by_id(document_id):
     """Get a single document by document_id."""
     logger.info("Getting document by document_id: %s", document_id)
     try:
-        client = get_connection()
-        if not client:
-            logger.error("Failed to connect to MongoDB")
-            raise Exception("Could not connect to MongoDB")
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         doc = db.documents.find_one({'document_id': document_id})
         return serialize_doc(doc)
     except Exception as e:
@@ -609,11 +571,7 @@ def get_test_cases(task_id):
     """Get test cases for a task."""
     logger.info("Getting test cases for task_id: %s", task_id)
     try:
-        client = get_connection()
-        if not client:
-            logger.error("Failed to connect to MongoDB")
-            raise Exception("Could not connect to MongoDB")
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         test_cases = list(db.test_cases.find({'task_id': task_id}, {'_id': 0}))
         return test_cases
     except Exception as e:
@@ -624,11 +582,7 @@ def save_test_scenarios(task_id, test_scenarios):
     """Save test scenarios for a task."""
     logger.info("Saving test scenarios for task_id: %s", task_id)
     try:
-        client = get_connection()
-        if not client:
-            logger.error("Failed to connect to MongoDB")
-            raise Exception("Could not connect to MongoDB")
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         # Delete existing test scenarios for this task
         db.test_cases.delete_many({'task_id': task_id})
         # Insert new test scenarios
@@ -645,11 +599,7 @@ def get_test_scenarios(task_id):
     """Get test scenarios for a task."""
     logger.info("Getting test scenarios for task_id: %s", task_id)
     try:
-        client = get_connection()
-        if not client:
-            logger.error("Failed to connect to MongoDB")
-            raise Exception("Could not connect to MongoDB")
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         test_scenarios = list(db.test_cases.find({'task_id': task_id}, {'_id': 0}))
         return test_scenarios
     except Exception as e:
@@ -660,14 +610,9 @@ def save_workflow_execution(execution):
     """Save workflow execution record."""
     logger.info(f"Saving workflow execution: {execution.get('execution_id')}")
     try:
-        client = get_connection()
-        if not client:
-            logger.error("Failed to connect to MongoDB")
-            raise Exception("Could not connect to MongoDB")
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         
         result = db.workflow_executions.insert_one(execution)
-        client.close()
         
         if result.inserted_id:
             logger.info(f"Workflow execution saved successfully: {execution.get('execution_id')}")
@@ -683,14 +628,9 @@ def get_workflow_execution(execution_id):
     """Get workflow execution by ID."""
     logger.info(f"Getting workflow execution: {execution_id}")
     try:
-        client = get_connection()
-        if not client:
-            logger.error("Failed to connect to MongoDB")
-            raise Exception("Could not connect to MongoDB")
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         
         execution = db.workflow_executions.find_one({'execution_id': execution_id})
-        client.close()
         
         return serialize_doc(execution)
     except Exception as e:
@@ -701,17 +641,12 @@ def update_workflow_execution(execution_id, update_data):
     """Update workflow execution."""
     logger.info(f"Updating workflow execution: {execution_id}")
     try:
-        client = get_connection()
-        if not client:
-            logger.error("Failed to connect to MongoDB")
-            raise Exception("Could not connect to MongoDB")
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         
         result = db.workflow_executions.update_one(
             {'execution_id': execution_id},
             {'$set': update_data}
         )
-        client.close()
         
         if result.modified_count > 0:
             logger.info(f"Workflow execution updated successfully: {execution_id}")
@@ -727,14 +662,9 @@ def get_workflow_executions(project_id):
     """Get all workflow executions for a project."""
     logger.info(f"Getting workflow executions for project: {project_id}")
     try:
-        client = get_connection()
-        if not client:
-            logger.error("Failed to connect to MongoDB")
-            raise Exception("Could not connect to MongoDB")
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         
         executions = list(db.workflow_executions.find({'project_id': project_id}).sort('created_at', -1))
-        client.close()
         
         return serialize_doc(executions)
     except Exception as e:
@@ -745,15 +675,10 @@ def create_workflow(data):
     """Create a new workflow."""
     logger.info("Creating workflow: %s", data)
     try:
-        client = get_connection()
-        if not client:
-            logger.error("Failed to connect to MongoDB")
-            raise Exception("Could not connect to MongoDB")
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         result = db.workflows.insert_one(data)
         data['_id'] = str(result.inserted_id)
         logger.info("Workflow created successfully with ID: %s", data.get('workflow_id'))
-        client.close()
         return data
     except Exception as e:
         logger.error("Error creating workflow: %s", e)
@@ -762,13 +687,8 @@ def create_workflow(data):
 def get_workflow(workflow_id):
     logger.info("Getting workflow with ID: %s", workflow_id)
     try:
-        client = get_connection()
-        if not client:
-            logger.error("Failed to connect to MongoDB")
-            raise Exception("Could not connect to MongoDB")
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         workflow = db.workflows.find_one({'workflow_id': workflow_id})
-        client.close()
         if workflow:
             workflow.pop('_id', None)
         return workflow
@@ -779,14 +699,9 @@ def get_workflow(workflow_id):
 def update_workflow(workflow_id, update_data):
     logger.info("Updating workflow: %s", workflow_id)
     try:
-        client = get_connection()
-        if not client:
-            logger.error("Failed to connect to MongoDB")
-            raise Exception("Could not connect to MongoDB")
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         update_data['updated_at'] = datetime.utcnow()
         db.workflows.update_one({'workflow_id': workflow_id}, {'$set': update_data})
-        client.close()
         return get_workflow(workflow_id)
     except Exception as e:
         logger.error("Error updating workflow: %s", e)
@@ -795,32 +710,23 @@ def update_workflow(workflow_id, update_data):
 def delete_workflow(workflow_id):
     logger.info("Deleting workflow: %s", workflow_id)
     try:
-        client = get_connection()
-        if not client:
-            logger.error("Failed to connect to MongoDB")
-            raise Exception("Could not connect to MongoDB")
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         db.workflows.delete_one({'workflow_id': workflow_id})
-        client.close()
         return True
     except Exception as e:
         logger.error("Error deleting workflow: %s", e)
         raise e
 
+def iter_workflows(project_id=None):
+    """Cursor over workflows, optionally for one project, for streaming."""
+    db = get_db()
+    query = {'project_id': project_id} if project_id else {}
+    return db.workflows.find(query, {'_id': 0})
+
 def list_workflows(project_id=None):
     logger.info("Listing workflows for project_id: %s", project_id)
     try:
-        client = get_connection()
-        if not client:
-            logger.error("Failed to connect to MongoDB")
-            raise Exception("Could not connect to MongoDB")
-        db = client[MONGODB_DATABASE]
-        query = {'project_id': project_id} if project_id else {}
-        workflows = list(db.workflows.find(query))
-        for wf in workflows:
-            wf.pop('_id', None)
-        client.close()
-        return workflows
+        return list(iter_workflows(project_id))
     except Exception as e:
         logger.error("Error listing workflows: %s", e)
         raise e
@@ -828,15 +734,10 @@ def list_workflows(project_id=None):
 def create_workflow_execution(data):
     logger.info(f"Creating workflow execution: {data}")
     try:
-        client = get_connection()
-        if not client:
-            logger.error("Failed to connect to MongoDB")
-            raise Exception("Could not connect to MongoDB")
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         result = db.workflow_executions.insert_one(data)
         data['_id'] = str(result.inserted_id)
         logger.info(f"Workflow execution created successfully with ID: {data.get('id')}")
-        client.close()
         return data
     except Exception as e:
         logger.error(f"Error creating workflow execution: {e}")
@@ -845,13 +746,8 @@ def create_workflow_execution(data):
 def update_workflow_execution(execution_id, update_data):
     logger.info(f"Updating workflow execution: {execution_id}")
     try:
-        client = get_connection()
-        if not client:
-            logger.error("Failed to connect to MongoDB")
-            raise Exception("Could not connect to MongoDB")
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         db.workflow_executions.update_one({'id': execution_id}, {'$set': update_data})
-        client.close()
         return get_workflow_execution(execution_id)
     except Exception as e:
         logger.error(f"Error updating workflow execution: {e}")
@@ -860,13 +756,8 @@ def update_workflow_execution(execution_id, update_data):
 def get_workflow_execution(execution_id):
     logger.info(f"Getting workflow execution: {execution_id}")
     try:
-        client = get_connection()
-        if not client:
-            logger.error("Failed to connect to MongoDB")
-            raise Exception("Could not connect to MongoDB")
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         execution = db.workflow_executions.find_one({'id': execution_id})
-        client.close()
         if execution:
             execution.pop('_id', None)
         return execution
@@ -874,35 +765,76 @@ def get_workflow_execution(execution_id):
         logger.error(f"Error getting workflow execution: {e}")
         raise e
 
+def iter_workflow_executions(workflow_id=None):
+    """Cursor over workflow executions, optionally for one workflow, for streaming."""
+    db = get_db()
+    query = {'workflow_id': workflow_id} if workflow_id else {}
+    return db.workflow_executions.find(query, {'_id': 0})
+
 def list_workflow_executions(workflow_id=None):
     logger.info(f"Listing workflow executions for workflow_id: {workflow_id}")
     try:
-        client = get_connection()
-        if not client:
-            logger.error("Failed to connect to MongoDB")
-            raise Exception("Could not connect to MongoDB")
-        db = client[MONGODB_DATABASE]
-        query = {'workflow_id': workflow_id} if workflow_id else {}
-        executions = list(db.workflow_executions.find(query))
-        for ex in executions:
-            ex.pop('_id', None)
-        client.close()
-        return executions
+        return list(iter_workflow_executions(workflow_id))
     except Exception as e:
         logger.error(f"Error listing workflow executions: {e}")
         raise e
 
+WORKFLOW_EXECUTION_MAX_EVENTS = int(os.environ.get("WORKFLOW_EXECUTION_MAX_EVENTS", "200"))
+
+def record_workflow_execution_event(execution_id, update_data, event=None):
+    """Apply a streamed progress update and optionally append a node event (capped list)."""
+    try:
+        db = get_db()
+        update = {'$set': dict(update_data, last_event_at=datetime.utcnow())}
+        if event is not None:
+            update['$push'] = {'events': {'$each': [event], '$slice': -WORKFLOW_EXECUTION_MAX_EVENTS}}
+        db.workflow_executions.update_one({'id': execution_id}, update)
+    except Exception as e:
+        logger.error(f"Error recording workflow execution event: {e}")
+        raise e
+
+def find_stale_workflow_executions(stale_before, limit=50):
+    """Active executions whose stream was lost or has been silent since stale_before."""
+    try:
+        db = get_db()
+        query = {
+            'status': {'$in': ['pending', 'running']},
+            '$or': [
+                {'stream_lost': True},
+                {'last_event_at': {'$lt': stale_before}},
+            ],
+        }
+        executions = list(db.workflow_executions.find(query, {'_id': 0, 'events': 0}).limit(limit))
+        return executions
+    except Exception as e:
+        logger.error(f"Error finding stale workflow executions: {e}")
+        raise e
+
+def claim_workflow_execution(execution_id, claimed_before):
+    """Mark an execution as being reconciled; False if another worker claimed it recently."""
+    try:
+        db = get_db()
+        result = db.workflow_executions.update_one(
+            {
+                'id': execution_id,
+                '$or': [
+                    {'reconcile_claimed_at': {'$exists': False}},
+                    {'reconcile_claimed_at': {'$lt': claimed_before}},
+                ],
+            },
+            {'$set': {'reconcile_claimed_at': datetime.utcnow()}}
+        )
+        return result.modified_count == 1
+    except Exception as e:
+        logger.error(f"Error claiming workflow execution: {e}")
+        raise e
+
 def get_workflow_config(project_id):
     """Get workflow configuration for a project."""
     logger.info(f"Getting workflow config for project: {project_id}")
     try:
-        client = get_connection()
-        if not client:
-            logger.error("Failed to connect to MongoDB")
-            raise Exception("Could not connect to MongoDB")
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         config = db.workflow_configs.find_one({'project_id': project_id})
-        client.close()
         return serialize_doc(config)
     except Exception as e:
         logger.error(f"Error getting workflow config: {e}")
@@ -912,11 +844,7 @@ def save_workflow_config(config):
     """Save workflow configuration."""
     logger.info(f"Saving workflow config for project: {config.get('project_id')}")
     try:
-        client = get_connection()
-        if not client:
-            logger.error("Failed to connect to MongoDB")
-            raise Exception("Could not connect to MongoDB")
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         
         # Use upsert to create or update
         result = db.workflow_configs.update_one(
@@ -924,7 +852,6 @@ def save_workflow_config(config):
             {'$set': config},
             upsert=True
         )
-        client.close()
         
         if result.upserted_id or result.modified_count > 0:
             logger.info(f"Workflow config saved successfully for project: {config.get('project_id')}")
@@ -937,14 +864,199 @@ def save_workflow_config(config):
         raise e
 
 
+# Task Execution Job Functions
+
+def create_task_job(job):
+    """Persist a queued task execution job."""
+    logger.info("Creating task job: %s", job.get('job_id'))
+    try:
+        db = get_db()
+        db.task_jobs.insert_one(dict(job))
+        return job
+    except Exception as e:
+        logger.error("Error creating task job: %s", e)
+        raise e
+
+def update_task_job(job_id, update_data):
+    """Update fields of a task execution job."""
+    try:
+        db = get_db()
+        update_data['updated_at'] = datetime.utcnow()
+        result = db.task_jobs.update_one({'job_id': job_id}, {'$set': update_data})
+        return result.modified_count > 0
+    except Exception as e:
+        logger.error("Error updating task job %s: %s", job_id, e)
+        return False
+
+def get_task_job(job_id):
+    """Get a task execution job by job_id."""
+    try:
+        db = get_db()
+        return serialize_doc(db.task_jobs.find_one({'job_id': job_id}, {'_id': 0}))
+    except Exception as e:
+        logger.error("Error getting task job %s: %s", job_id, e)
+        raise e
+
+def claim_task_for_queue(project_id, task_id):
+    """Atomically mark a task queued unless it is already queued or running; returns the task or None."""
+    try:
+        db = get_db()
+        return db.tasks.find_one_and_update(
+            {'project_id': project_id, 'task_id': task_id, 'status': {'$nin': ['queued', 'running']}},
+            {'$set': {'status': 'queued', 'updated_at': datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER,
+        )
+    except Exception as e:
+        logger.error("Error claiming task %s: %s", task_id, e)
+        raise e
+
+def touch_task_jobs(job_ids):
+    """Refresh the heartbeat of jobs held by this worker process."""
+    if not job_ids:
+        return 0
+    db = get_db()
+    result = db.task_jobs.update_many({'job_id': {'$in': list(job_ids)}}, {'$set': {'heartbeat_at': datetime.utcnow()}})
+    return result.modified_count
+
+def _orphaned_task_job_query(stale_before):
+    # Jobs written before heartbeats existed fall back to their last update
+    return {
+        'status': {'$in': ['queued', 'running']},
+        '$or': [
+            {'heartbeat_at': {'$lt': stale_before}},
+            {'heartbeat_at': None, 'updated_at': {'$lt': stale_before}},
+        ],
+    }
+
+def find_orphaned_task_jobs(stale_before, limit=50):
+    """Queued or running jobs whose owning process stopped sending heartbeats before stale_before."""
+    try:
+        db = get_db()
+        return list(db.task_jobs.find(_orphaned_task_job_query(stale_before), {'_id': 0}).limit(limit))
+    except Exception as e:
+        logger.error("Error finding orphaned task jobs: %s", e)
+        raise e
+
+def claim_task_job(job_id, owner, stale_before):
+    """Take over an orphaned job; returns it, or None if another worker claimed it or it finished."""
+    try:
+        db = get_db()
+        now = datetime.utcnow()
+        return db.task_jobs.find_one_and_update(
+            {'job_id': job_id, **_orphaned_task_job_query(stale_before)},
+            {'$set': {'owner': owner, 'heartbeat_at': now, 'updated_at': now}},
+            projection={'_id': 0},
+            return_document=ReturnDocument.AFTER,
+        )
+    except Exception as e:
+        logger.error("Error claiming task job %s: %s", job_id, e)
+        raise e
+
+# FixChain Stream Import Functions
+
+def claim_import_job(import_id, options, stale_after):
+    """Create or resume a stream import; returns the job, or None if another request is still running it."""
+    db = get_db()
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=stale_after)
+    try:
+        return db.fixchain_imports.find_one_and_update(
+            {'import_id': import_id, '$or': [{'status': {'$ne': 'running'}}, {'updated_at': {'$lt': stale}}]},
+            {
+                '$set': {'status': 'running', 'updated_at': now},
+                '$setOnInsert': {
+                    'import_id': import_id, 'options': options, 'committed_lines': 0,
+                    'inserted': 0, 'updated': 0, 'failed': 0, 'errors': [], 'created_at': now
+                }
+            },
+            upsert=True, projection={'_id': 0}, return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        return None  # The filter missed because the job is running, and the upsert hit the unique import_id
+
+def record_import_chunk(import_id, committed_lines, inserted, updated, errors, max_errors):
+    """Advance a stream import past a written chunk; the first max_errors record errors are kept."""
+    db = get_db()
+    db.fixchain_imports.update_one(
+        {'import_id': import_id},
+        {
+            '$set': {'committed_lines': committed_lines, 'updated_at': datetime.utcnow()},
+            '$inc': {'inserted': inserted, 'updated': updated, 'failed': len(errors)},
+            '$push': {'errors': {'$each': errors, '$slice': max_errors}}
+        }
+    )
+
+def finish_import_job(import_id, status):
+    db = get_db()
+    return db.fixchain_imports.find_one_and_update(
+        {'import_id': import_id},
+        {'$set': {'status': status, 'updated_at': datetime.utcnow()}},
+        projection={'_id': 0}, return_document=ReturnDocument.AFTER
+    )
+
+def get_import_job(import_id):
+    db = get_db()
+    return db.fixchain_imports.find_one({'import_id': import_id}, {'_id': 0})
+
+# Dify Metadata Cache Functions
+
+def get_dify_metadata_cache(key):
+    """Get a shared Dify metadata cache entry (value and fetched_at epoch seconds)."""
+    db = get_db()
+    return db.dify_metadata_cache.find_one({'_id': key}, {'value': 1, 'fetched_at': 1})
+
+def set_dify_metadata_cache(key, api_key_hash, value, fetched_at):
+    """Upsert a shared Dify metadata cache entry."""
+    db = get_db()
+    db.dify_metadata_cache.update_one(
+        {'_id': key},
+        {'$set': {
+            'api_key_hash': api_key_hash,
+            'value': value,
+            'fetched_at': fetched_at,
+            'updated_at': datetime.utcnow(),
+        }},
+        upsert=True
+    )
+
+def delete_dify_metadata_cache(api_key_hash):
+    """Drop every shared cache entry for one api_key hash."""
+    db = get_db()
+    return db.dify_metadata_cache.delete_many({'api_key_hash': api_key_hash}).deleted_count
+
+# Embedding Cache Functions
+
+def get_embedding_cache_entries(keys):
+    """Cached embedding vectors by content hash, for the keys that exist."""
+    db = get_rag_db()
+    docs = db.embedding_cache.find({'_id': {'$in': list(keys)}}, {'vector': 1})
+    return {doc['_id']: doc['vector'] for doc in docs}
+
+def set_embedding_cache_entries(vectors, model_name):
+    """Store {content hash: vector}; entries another worker stored first are kept."""
+    if not vectors:
+        return
+    db = get_rag_db()
+    now = datetime.utcnow()
+    try:
+        db.embedding_cache.insert_many(
+            [{'_id': key, 'vector': vector, 'model': model_name, 'created_at': now}
+             for key, vector in vectors.items()],
+            ordered=False
+        )
+    except BulkWriteError as e:
+        # Duplicate keys just mean the same text was cached concurrently
+        if any(error.get('code') != 11000 for error in e.details.get('writeErrors', [])):
+            raise
+
 # Bug Management Database Functions
 
 def create_bug(bug_data):
     """Create a new bug in the database."""
     try:
-        client = get_connection()
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         result = db.bugs.insert_one(bug_data)
+        apply_bug_rollup(bug_data, bug_rollup_increments(bug_data))
         logger.info(f"Bug created with ID: {bug_data['bug_id']}")
         return result.inserted_id
     except Exception as e:
@@ -954,8 +1066,7 @@ def create_bug(bug_data):
 def get_bug(bug_id):
     """Get a single bug by bug_id."""
     try:
-        client = get_connection()
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         bug = db.bugs.find_one({'bug_id': bug_id}, {'_id': 0})
         return bug
     except Exception as e:
@@ -965,8 +1076,7 @@ def get_bug(bug_id):
 def get_bugs_by_project(project_id, filters=None):
     """Get all bugs for a project with optional filters."""
     try:
-        client = get_connection()
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         
         query = {'project_id': project_id}
         if filters:
@@ -981,16 +1091,18 @@ def get_bugs_by_project(project_id, filters=None):
 def update_bug(bug_id, update_data):
     """Update a bug."""
     try:
-        client = get_connection()
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         update_data['updated_at'] = datetime.utcnow()
         
-        result = db.bugs.update_one(
+        before = db.bugs.find_one_and_update(
             {'bug_id': bug_id},
-            {'$set': update_data}
+            {'$set': update_data},
+            projection=BUG_ROLLUP_PROJECTION,
+            return_document=ReturnDocument.BEFORE
         )
         
-        if result.modified_count > 0:
+        if before:
+            update_bug_rollup(before, {**before, **update_data})
             return db.bugs.find_one({'bug_id': bug_id}, {'_id': 0})
         return None
     except Exception as e:
@@ -1000,17 +1112,21 @@ def update_bug(bug_id, update_data):
 def delete_bug(bug_id):
     """Delete a bug and related records."""
     try:
-        client = get_connection()
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         
         # Delete related records first
+        fixers = [fix.get('fixed_by') for fix in db.bug_fixes.find({'bug_id': bug_id}, {'_id': 0, 'fixed_by': 1})]
         db.bug_executions.delete_many({'bug_id': bug_id})
         db.bug_histories.delete_many({'bug_id': bug_id})
         db.bug_fixes.delete_many({'bug_id': bug_id})
         
         # Delete the bug
-        result = db.bugs.delete_one({'bug_id': bug_id})
-        return result.deleted_count > 0
+        bug = db.bugs.find_one_and_delete({'bug_id': bug_id}, projection=BUG_ROLLUP_PROJECTION)
+        if bug:
+            apply_bug_rollup(bug, merge_rollup_increments(
+                bug_rollup_increments(bug, -1), *[fixer_rollup_increments(f, -1) for f in fixers]
+            ))
+        return bug is not None
     except Exception as e:
         logger.error(f"Error deleting bug {bug_id}: {e}")
         return False
@@ -1018,9 +1134,10 @@ def delete_bug(bug_id):
 def create_bug_fix(fix_data):
     """Create a bug fix record."""
     try:
-        client = get_connection()
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         result = db.bug_fixes.insert_one(fix_data)
+        bug = db.bugs.find_one({'bug_id': fix_data.get('bug_id')}, BUG_ROLLUP_PROJECTION)
+        apply_bug_rollup(bug, fixer_rollup_increments(fix_data.get('fixed_by')))
         logger.info(f"Bug fix created with ID: {fix_data['fix_id']}")
         return result.inserted_id
     except Exception as e:
@@ -1030,8 +1147,7 @@ def create_bug_fix(fix_data):
 def get_bug_fixes(bug_id):
     """Get all fixes for a bug."""
     try:
-        client = get_connection()
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         fixes = list(db.bug_fixes.find({'bug_id': bug_id}, {'_id': 0}).sort('fixed_at', -1))
         return fixes
     except Exception as e:
@@ -1041,15 +1157,22 @@ def get_bug_fixes(bug_id):
 def update_bug_fix(fix_id, update_data):
     """Update a bug fix."""
     try:
-        client = get_connection()
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         
-        result = db.bug_fixes.update_one(
+        before = db.bug_fixes.find_one_and_update(
             {'fix_id': fix_id},
-            {'$set': update_data}
+            {'$set': update_data},
+            projection={'_id': 0, 'bug_id': 1, 'fixed_by': 1},
+            return_document=ReturnDocument.BEFORE
         )
         
-        if result.modified_count > 0:
+        if before:
+            if 'fixed_by' in update_data and update_data['fixed_by'] != before.get('fixed_by'):
+                bug = db.bugs.find_one({'bug_id': before.get('bug_id')}, BUG_ROLLUP_PROJECTION)
+                apply_bug_rollup(bug, merge_rollup_increments(
+                    fixer_rollup_increments(before.get('fixed_by'), -1),
+                    fixer_rollup_increments(update_data['fixed_by'])
+                ))
             return db.bug_fixes.find_one({'fix_id': fix_id}, {'_id': 0})
         return None
     except Exception as e:
@@ -1059,8 +1182,7 @@ def update_bug_fix(fix_id, update_data):
 def create_bug_history(history_data):
     """Create a bug history record."""
     try:
-        client = get_connection()
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         result = db.bug_histories.insert_one(history_data)
         logger.info(f"Bug history created with ID: {history_data['history_id']}")
         return result.inserted_id
@@ -1071,8 +1193,7 @@ def create_bug_history(history_data):
 def get_bug_history(bug_id):
     """Get history for a bug."""
     try:
-        client = get_connection()
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         history = list(db.bug_histories.find({'bug_id': bug_id}, {'_id': 0}).sort('captured_at', -1))
         return history
     except Exception as e:
@@ -1082,8 +1203,7 @@ def get_bug_history(bug_id):
 def create_bug_execution(execution_data):
     """Create or update a bug execution record."""
     try:
-        client = get_connection()
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         
         # Use upsert to handle duplicate executions
         result = db.bug_executions.update_one(
@@ -1104,8 +1224,7 @@ def create_bug_execution(execution_data):
 def get_bug_executions(bug_id):
     """Get all executions for a bug."""
     try:
-        client = get_connection()
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         executions = list(db.bug_executions.find({'bug_id': bug_id}, {'_id': 0}).sort('executed_at', -1))
         return executions
     except Exception as e:
@@ -1115,8 +1234,7 @@ def get_bug_executions(bug_id):
 def get_execution_bugs(execution_id):
     """Get all bugs tested in an execution."""
     try:
-        client = get_connection()
-        db = client[MONGODB_DATABASE]
+        db = get_db()
         bugs = list(db.bug_executions.find({'execution_id': execution_id}, {'_id': 0}))
         return bugs
     except Exception as e:
@@ -1166,38 +1284,242 @@ def create_bug_from_execution_failure(execution_id, task_id, project_id, failure
         logger.error(f"Error creating bug from execution failure: {e}")
         raise e
 
+# Bug Report Rollup Functions
+#
+# bug_daily_rollups holds one document per project, rollup version and UTC
+# day of bug creation: {_id: "<project_id>:<version>:<YYYY-MM-DD>",
+# project_id, version, day, total, status: {..}, severity: {..},
+# reporters: {..}, fixers: {..}}. Counts use each bug's current status and
+# are adjusted with $inc on every bug/fix write.
+#
+# bug_rollup_state has one document per project: the version reports read
+# (absent until a rebuild completes or after an invalidation), a count of
+# rollup writes, and the rebuild lock. A rebuild counts into a new version
+# beside the current one and switches to it only if no write landed
+# meanwhile, so concurrent $inc updates are never overwritten.
+
+BUG_ROLLUP_REBUILD_LOCK_SECONDS = int(os.environ.get("BUG_ROLLUP_REBUILD_LOCK_SECONDS", "600"))
+BUG_ROLLUP_REBUILD_ATTEMPTS = 3
+# Reports that find no rollups start a background rebuild at most this often per project
+BUG_ROLLUP_REBUILD_COOLDOWN = float(os.environ.get("BUG_ROLLUP_REBUILD_COOLDOWN", "60"))
+_rollup_rebuilds_started = {}
+_rollup_rebuilds_lock = threading.Lock()
+
+BUG_ROLLUP_PROJECTION = {'_id': 0, 'bug_id': 1, 'project_id': 1, 'created_at': 1,
+                         'status': 1, 'severity': 1, 'created_by': 1}
+BUG_ROLLUP_MAPS = {'status': 'status', 'severity': 'severity', 'created_by': 'reporters'}
+
+def encode_rollup_key(value):
+    """Make a value usable as a field name inside a rollup counter map."""
+    if value is None or value == '':
+        return 'unknown'
+    key = str(value).replace('.', '\uff0e')
+    if key.startswith('$'):
+        key = '\uff04' + key[1:]
+    return key
+
+def decode_rollup_key(key):
+    if key.startswith('\uff04'):
+        key = '$' + key[1:]
+    return key.replace('\uff0e', '.')
+
+def bug_rollup_day(created_at):
+    return datetime(created_at.year, created_at.month, created_at.day)
+
+def bug_rollup_increments(bug, sign=1):
+    """Counter increments contributed by one bug document."""
+    increments = {'total': sign}
+    for field, counter in BUG_ROLLUP_MAPS.items():
+        increments[f"{counter}.{encode_rollup_key(bug.get(field))}"] = sign
+    return increments
+
+def fixer_rollup_increments(fixed_by, sign=1):
+    return {f"fixers.{encode_rollup_key(fixed_by)}": sign}
+
+def merge_rollup_increments(*increments):
+    merged = {}
+    for inc in increments:
+        for key, value in inc.items():
+            merged[key] = merged.get(key, 0) + value
+    return {k: v for k, v in merged.items() if v}
+
+def apply_bug_rollup(bug, increments):
+    """$inc the rollup of the bug's project and creation day; never fails the caller's write."""
+    if not bug or not bug.get('project_id') or not isinstance(bug.get('created_at'), datetime):
+        return
+    increments = merge_rollup_increments(increments)
+    if not increments:
+        return
+    project_id = bug['project_id']
+    day = bug_rollup_day(bug['created_at'])
+    try:
+        db = get_db()
+        # Counting the write lets a rebuild running alongside it notice and recount
+        state = db.bug_rollup_state.find_one_and_update(
+            {'_id': project_id}, {'$inc': {'writes': 1}}, projection={'version': 1}
+        )
+        if not state or not state.get('version'):
+            return  # No rollups to maintain; reports aggregate the bugs until a rebuild
+        version = state['version']
+        db.bug_daily_rollups.update_one(
+            {'_id': f"{project_id}:{version}:{day:%Y-%m-%d}"},
+            {'$inc': increments, '$setOnInsert': {'project_id': project_id, 'version': version, 'day': day}},
+            upsert=True
+        )
+    except Exception as e:
+        logger.error(f"Error updating bug rollup for project {project_id}: {e}")
+        invalidate_bug_rollups(project_id)
+
+def update_bug_rollup(before, after):
+    """Move a bug's counts from its old field values to its new ones."""
+    if not before:
+        return
+    same_bucket = (before.get('project_id') == after.get('project_id')
+                   and before.get('created_at') == after.get('created_at'))
+    if same_bucket:
+        apply_bug_rollup(before, merge_rollup_increments(
+            bug_rollup_increments(before, -1), bug_rollup_increments(after)
+        ))
+    else:
+        # Fixer counts follow the bug's bucket too; let the next report rebuild both projects
+        invalidate_bug_rollups(before.get('project_id'))
+        invalidate_bug_rollups(after.get('project_id'))
+
+def invalidate_bug_rollups(project_id):
+    """Mark a project's rollups as untrusted; reports aggregate the bugs until a rebuild."""
+    if not project_id:
+        return
+    try:
+        get_db().bug_rollup_state.update_one(
+            {'_id': project_id},
+            {'$unset': {'version': '', 'built_at': ''}, '$inc': {'writes': 1}}
+        )
+    except Exception as e:
+        logger.error(f"Error invalidating bug rollups for project {project_id}: {e}")
+
+def get_bug_rollup_state(project_id):
+    db = get_db()
+    return db.bug_rollup_state.find_one({'_id': project_id})
+
+def compute_bug_rollups(project_id, version):
+    """Recount a project's daily rollup documents from bugs and bug_fixes in one streamed pass."""
+    db = get_db()
+    pipeline = [
+        {'$match': {'project_id': project_id}},
+        {'$project': BUG_ROLLUP_PROJECTION},
+        {
+            '$lookup': {
+                'from': 'bug_fixes',
+                'localField': 'bug_id',
+                'foreignField': 'bug_id',
+                'pipeline': [{'$project': {'_id': 0, 'fixed_by': 1}}],
+                'as': 'fixes'
+            }
+        }
+    ]
+    days = {}
+    for bug in db.bugs.aggregate(pipeline, allowDiskUse=True):
+        if not isinstance(bug.get('created_at'), datetime):
+            continue
+        day = bug_rollup_day(bug['created_at'])
+        increments = bug_rollup_increments(bug)
+        for fix in bug.get('fixes', []):
+            increments = merge_rollup_increments(increments, fixer_rollup_increments(fix.get('fixed_by')))
+        doc = days.setdefault(day, {
+            '_id': f"{project_id}:{version}:{day:%Y-%m-%d}",
+            'project_id': project_id,
+            'version': version,
+            'day': day,
+            'total': 0,
+            'status': {},
+            'severity': {},
+            'reporters': {},
+            'fixers': {}
+        })
+        for key, value in increments.items():
+            if key == 'total':
+                doc['total'] += value
+            else:
+                counter, name = key.split('.', 1)
+                doc[counter][name] = doc[counter].get(name, 0) + value
+    return list(days.values())
+
+def claim_bug_rollup_rebuild(project_id, owner):
+    """Take a project's rebuild lock; returns its rollup state, or None while another rebuild holds it."""
+    db = get_db()
+    now = datetime.utcnow()
+    try:
+        return db.bug_rollup_state.find_one_and_update(
+            {'_id': project_id, '$or': [{'rebuild_expires': None}, {'rebuild_expires': {'$lt': now}}]},
+            {'$set': {'rebuild_owner': owner,
+                      'rebuild_expires': now + timedelta(seconds=BUG_ROLLUP_REBUILD_LOCK_SECONDS)}},
+            upsert=True, return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        return None  # The filter missed because the lock is held, and the upsert hit the project's _id
+
+def rebuild_bug_rollups(project_id, attempts=BUG_ROLLUP_REBUILD_ATTEMPTS):
+    """Recount a project's rollups and switch reports to them; returns the number of day documents.
+
+    Returns None if another rebuild of the project is running. The recount is
+    written as a new version and made current in one conditional update, which
+    fails if bug writes landed while counting; the recount is then retried.
+    """
+    db = get_db()
+    owner = uuid.uuid4().hex
+    state = claim_bug_rollup_rebuild(project_id, owner)
+    if state is None:
+        logger.info(f"Bug rollups for project {project_id} are already being rebuilt")
+        return None
+    try:
+        for _ in range(attempts):
+            version = uuid.uuid4().hex[:12]
+            docs = compute_bug_rollups(project_id, version)
+            if docs:
+                db.bug_daily_rollups.insert_many(docs, ordered=False)
+            switched = db.bug_rollup_state.update_one(
+                {'_id': project_id, 'rebuild_owner': owner, 'writes': state.get('writes')},
+                {'$set': {'version': version, 'built_at': datetime.utcnow(), 'days': len(docs)}}
+            )
+            if switched.modified_count:
+                db.bug_daily_rollups.delete_many({'project_id': project_id, 'version': {'$ne': version}})
+                logger.info(f"Rebuilt {len(docs)} bug rollup days for project {project_id}")
+                return len(docs)
+            db.bug_daily_rollups.delete_many({'project_id': project_id, 'version': version})
+            state = db.bug_rollup_state.find_one({'_id': project_id}) or {}
+            logger.info(f"Bug writes landed while rebuilding rollups for project {project_id}; recounting")
+        raise Exception(f"Bugs of project {project_id} kept changing during {attempts} rollup rebuilds")
+    finally:
+        db.bug_rollup_state.update_one(
+            {'_id': project_id, 'rebuild_owner': owner},
+            {'$unset': {'rebuild_owner': '', 'rebuild_expires': ''}}
+        )
+
+def start_bug_rollup_rebuild(project_id):
+    """Rebuild a project's rollups in a daemon thread, unless one was started here recently."""
+    with _rollup_rebuilds_lock:
+        started = _rollup_rebuilds_started.get(project_id)
+        if started is not None and time.monotonic() - started < BUG_ROLLUP_REBUILD_COOLDOWN:
+            return None
+        _rollup_rebuilds_started[project_id] = time.monotonic()
+
+    def run():
+        try:
+            rebuild_bug_rollups(project_id)
+        except Exception as e:
+            logger.error(f"Error rebuilding bug rollups for project {project_id}: {e}")
+
+    thread = threading.Thread(target=run, name='bug-rollup-rebuild', daemon=True)
+    thread.start()
+    return thread
+
 # Index creation for better performance
 def create_bug_indexes():
-    """Create indexes for bug collections."""
+    """Create indexes for bug collections (see utils.indexes for the full registry)."""
     try:
-        client = get_connection()
-        db = client[MONGODB_DATABASE]
-        
-        # Bugs collection indexes
-        db.bugs.create_index([('project_id', 1), ('status', 1)])
-        db.bugs.create_index([('project_id', 1), ('severity', 1)])
-        db.bugs.create_index([('task_id', 1)])
-        db.bugs.create_index([('scenario_id', 1)])
-        db.bugs.create_index([('created_at', -1)])
-        db.bugs.create_index([('bug_id', 1)], unique=True)
-        
-        # Bug fixes collection indexes
-        db.bug_fixes.create_index([('bug_id', 1)])
-        db.bug_fixes.create_index([('fix_id', 1)], unique=True)
-        db.bug_fixes.create_index([('fixed_by', 1)])
-        db.bug_fixes.create_index([('verified_by', 1)])
-        
-        # Bug histories collection indexes
-        db.bug_histories.create_index([('bug_id', 1)])
-        db.bug_histories.create_index([('history_id', 1)], unique=True)
-        db.bug_histories.create_index([('captured_at', -1)])
-        
-        # Bug executions collection indexes
-        db.bug_executions.create_index([('bug_id', 1)])
-        db.bug_executions.create_index([('execution_id', 1)])
-        db.bug_executions.create_index([('execution_id', 1), ('bug_id', 1)], unique=True)
-        db.bug_executions.create_index([('executed_at', -1)])
-        
+        result = ensure_indexes(collections=BUG_COLLECTIONS)
+        if result['failed']:
+            raise Exception(f"Failed to create bug indexes: {'; '.join(result['failed'])}")
         logger.info("Bug collection indexes created successfully")
         
     except Exception as e:
@@ -0,0 +1,333 @@
+"""
+Pool of warm, headless Chrome SeleniumDrivers shared by LaVague task runs.
+
+Starting Chrome costs several seconds, so drivers are launched ahead of time
+and leased out one run at a time. Between leases the browser is reset
+(extra tabs closed, cookies and storage cleared, about:blank loaded). A
+driver is recycled after SELENIUM_POOL_MAX_USES leases, or as soon as it
+crashes or fails to reset.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from lavague.drivers.selenium import SeleniumDriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.options import Options
+from .logger import logger
+
+SELENIUM_POOL_SIZE = int(os.environ.get("SELENIUM_POOL_SIZE", os.environ.get("TASK_WORKER_SLOTS", "2")))
+SELENIUM_POOL_MAX_USES = int(os.environ.get("SELENIUM_POOL_MAX_USES", "20"))
+SELENIUM_POOL_LEASE_TIMEOUT = float(os.environ.get("SELENIUM_POOL_LEASE_TIMEOUT", "600"))
+
+CHROME_ARGUMENTS = [
+    '--no-sandbox',
+    '--disable-dev-shm-usage',
+    '--disable-gpu',
+    '--headless=new',
+    '--disable-extensions',
+    '--disable-software-rasterizer',
+    '--disable-infobars',
+    '--disable-notifications',
+    '--disable-popup-blocking',
+    '--disable-default-apps',
+    '--disable-web-security',
+    '--disable-features=VizDisplayCompositor',
+    '--disable-background-networking',
+    '--disable-background-timer-throttling',
+    '--disable-backgrounding-occluded-windows',
+    '--disable-breakpad',
+    '--disable-client-side-phishing-detection',
+    '--disable-component-extensions-with-background-pages',
+    '--disable-datasaver-prompt',
+    '--disable-domain-reliability',
+    '--disable-features=TranslateUI',
+    '--disable-hang-monitor',
+    '--disable-metrics',
+    '--disable-prompt-on-repost',
+    '--disable-renderer-backgrounding',
+    '--disable-sync',
+    '--disable-translate',
+    '--disable-webgl',
+    '--disable-webgl2',
+    '--enable-automation',
+    '--force-color-profile=srgb',
+    '--force-device-scale-factor=1',
+    '--ignore-certificate-errors',
+    '--log-level=3',
+    '--mute-audio',
+    '--no-first-run',
+    '--password-store=basic',
+    '--use-mock-keychain',
+    '--window-size=1920,1080',
+]
+
+
+def build_chrome_options(user_data_dir=None):
+    """Chrome options used for every task browser."""
+    chrome_options = Options()
+    for argument in CHROME_ARGUMENTS:
+        chrome_options.add_argument(argument)
+    if user_data_dir:
+        chrome_options.add_argument(f'--user-data-dir={user_data_dir}')
+    chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
+    chrome_options.add_experimental_option('useAutomationExtension', False)
+    return chrome_options
+
+
+def create_selenium_driver(user_data_dir=None):
+    """Start a headless SeleniumDriver, optionally with an isolated Chrome profile directory."""
+    return SeleniumDriver(options=build_chrome_options(user_data_dir))
+
+
+def quit_selenium_driver(selenium_driver):
+    """Quit a SeleniumDriver and kill only the chromedriver/Chrome processes it started."""
+    if selenium_driver is None:
+        return
+    webdriver = getattr(selenium_driver, 'driver', None)
+    service_process = getattr(getattr(webdriver, 'service', None), 'process', None)
+    try:
+        if webdriver is not None:
+            webdriver.quit()
+    except Exception:
+        pass
+    if service_process is None:
+        return
+    try:
+        import psutil
+        try:
+            root = psutil.Process(service_process.pid)
+        except psutil.NoSuchProcess:
+            return
+        for proc in root.children(recursive=True) + [root]:
+            try:
+                proc.kill()
+            except psutil.NoSuchProcess:
+                pass
+    except ImportError:
+        service_process.kill()
+
+
+class PooledDriver:
+    """A pooled SeleniumDriver together with its profile directory and usage count."""
+
+    def __init__(self, driver_id, selenium_driver, profile_dir):
+        self.driver_id = driver_id
+        self.selenium_driver = selenium_driver
+        self.profile_dir = profile_dir
+        self.uses = 0
+        self.broken = False
+
+    def mark_broken(self):
+        """Ask the pool to discard this browser instead of reusing it."""
+        self.broken = True
+
+
+class DriverPool:
+    def __init__(self, size=SELENIUM_POOL_SIZE, max_uses=SELENIUM_POOL_MAX_USES):
+        self.size = size
+        self.max_uses = max_uses
+        self._idle = []
+        self._total = 0
+        self._next_id = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            'created': 0,
+            'recycled': 0,
+            'create_failures': 0,
+            'leases': 0,
+            'total_wait_ms': 0.0,
+            'max_wait_ms': 0.0,
+            'total_hold_ms': 0.0,
+            'total_reset_ms': 0.0,
+            'resets': 0,
+        }
+
+    def _create(self):
+        with self._cond:
+            driver_id = self._next_id
+            self._next_id += 1
+        profile_dir = tempfile.mkdtemp(prefix=f'vcs_chrome_{driver_id}_')
+        start = time.perf_counter()
+        try:
+            selenium_driver = create_selenium_driver(profile_dir)
+        except Exception:
+            shutil.rmtree(profile_dir, ignore_errors=True)
+            with self._cond:
+                self._stats['create_failures'] += 1
+            raise
+        logger.info("Started pooled Chrome #%s in %.0f ms", driver_id, (time.perf_counter() - start) * 1000)
+        with self._cond:
+            self._stats['created'] += 1
+        return PooledDriver(driver_id, selenium_driver, profile_dir)
+
+    def _destroy(self, entry):
+        quit_selenium_driver(entry.selenium_driver)
+        shutil.rmtree(entry.profile_dir, ignore_errors=True)
+
+    @staticmethod
+    def _clear_page_storage(driver, origins):
+        """Clear the current page's web storage and remember its origin for the CDP pass."""
+        parts = urlsplit(driver.current_url)
+        if parts.scheme in ('http', 'https'):
+            origins.add(f"{parts.scheme}://{parts.netloc}")
+        driver.execute_script(
+            "try { window.localStorage.clear(); window.sessionStorage.clear(); } catch (e) {}"
+        )
+
+    def _reset(self, entry):
+        """Return the browser to a blank state; raises if the browser is unusable.
+
+        Cookies and the HTTP cache are cleared browser-wide. Storage (local,
+        session, IndexedDB, cache storage, service workers) is cleared for the
+        origins the tabs are showing, since CDP has no wildcard origin; data of
+        origins navigated away from lasts until the browser is recycled.
+        """
+        start = time.perf_counter()
+        driver = entry.selenium_driver.driver
+        handles = driver.window_handles
+        origins = set()
+        for handle in handles[1:]:
+            driver.switch_to.window(handle)
+            self._clear_page_storage(driver, origins)
+            driver.close()
+        driver.switch_to.window(handles[0])
+        driver.switch_to.default_content()
+        self._clear_page_storage(driver, origins)
+        driver.delete_all_cookies()
+        try:
+            driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+            driver.execute_cdp_cmd('Network.clearBrowserCache', {})
+            for origin in origins:
+                driver.execute_cdp_cmd('Storage.clearDataForOrigin', {'origin': origin, 'storageTypes': 'all'})
+        except Exception as e:
+            logger.debug("CDP storage reset of pooled Chrome #%s failed: %s", entry.driver_id, e)
+        driver.get('about:blank')
+        entry.selenium_driver.poject_path = '.'
+        entry.selenium_driver.previously_scanned = False
+        with self._cond:
+            self._stats['resets'] += 1
+            self._stats['total_reset_ms'] += (time.perf_counter() - start) * 1000
+
+    def prewarm(self, count=None):
+        """Launch idle browsers up to count (default: pool size)."""
+        target = min(count or self.size, self.size)
+        while True:
+            with self._cond:
+                if self._total >= target:
+                    return
+                self._total += 1
+            try:
+                entry = self._create()
+            except Exception as e:
+                with self._cond:
+                    self._total -= 1
+                    self._cond.notify()
+                logger.error("Failed to prewarm Chrome: %s", e)
+                return
+            with self._cond:
+                self._idle.append(entry)
+                self._cond.notify()
+
+    def prewarm_async(self, count=None):
+        threading.Thread(target=self.prewarm, args=(count,), name='driver-pool-prewarm', daemon=True).start()
+
+    def _acquire(self, timeout):
+        deadline = time.monotonic() + timeout if timeout else None
+        with self._cond:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if self._total < self.size:
+                    self._total += 1
+                    break
+                remaining = deadline - time.monotonic() if deadline else None
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("Timed out waiting for a browser from the pool")
+                self._cond.wait(remaining)
+        try:
+            return self._create()
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, entry):
+        entry.uses += 1
+        recycle = entry.broken or entry.uses >= self.max_uses
+        if not recycle:
+            try:
+                self._reset(entry)
+            except Exception as e:
+                logger.warning("Pooled Chrome #%s failed to reset, recycling: %s", entry.driver_id, e)
+                recycle = True
+        if recycle:
+            self._destroy(entry)
+            with self._cond:
+                self._total -= 1
+                self._stats['recycled'] += 1
+                self._cond.notify()
+            # Bring a replacement up in the background so the next lease stays warm
+            self.prewarm_async()
+            return
+        with self._cond:
+            self._idle.append(entry)
+            self._cond.notify()
+
+    @contextmanager
+    def lease(self, timeout=SELENIUM_POOL_LEASE_TIMEOUT):
+        """Lease a warm PooledDriver for the duration of the with-block."""
+        start = time.perf_counter()
+        entry = self._acquire(timeout)
+        leased_at = time.perf_counter()
+        wait_ms = (leased_at - start) * 1000
+        with self._cond:
+            self._stats['leases'] += 1
+            self._stats['total_wait_ms'] += wait_ms
+            self._stats['max_wait_ms'] = max(self._stats['max_wait_ms'], wait_ms)
+        logger.info("Leased Chrome #%s after %.0f ms", entry.driver_id, wait_ms)
+        try:
+            yield entry
+        except WebDriverException:
+            entry.mark_broken()
+            raise
+        finally:
+            hold_ms = (time.perf_counter() - leased_at) * 1000
+            with self._cond:
+                self._stats['total_hold_ms'] += hold_ms
+            self._release(entry)
+
+    def stats(self):
+        with self._cond:
+            leases = self._stats['leases']
+            resets = self._stats['resets']
+            return {
+                'size': self.size,
+                'max_uses': self.max_uses,
+                'open': self._total,
+                'idle': len(self._idle),
+                'in_use': self._total - len(self._idle),
+                'created': self._stats['created'],
+                'recycled': self._stats['recycled'],
+                'create_failures': self._stats['create_failures'],
+                'leases': leases,
+                'avg_wait_ms': round(self._stats['total_wait_ms'] / leases, 1) if leases else 0,
+                'max_wait_ms': round(self._stats['max_wait_ms'], 1),
+                'avg_hold_ms': round(self._stats['total_hold_ms'] / leases, 1) if leases else 0,
+                'avg_reset_ms': round(self._stats['total_reset_ms'] / resets, 1) if resets else 0,
+            }
+
+    def close(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._total -= len(idle)
+        for entry in idle:
+            self._destroy(entry)
+
+
+driver_pool = DriverPool()
@@ -1,36 +1,29 @@
 import json
 import importlib
-import time
-from flask import Flask, Response, request, jsonify
+from flask import Flask, Response, jsonify
 from flask.json.provider import JSONProvider
 from flask_cors import CORS
 from typing import Any, Callable
-from bson import ObjectId
-from datetime import datetime
-from .logger import logger
+from . import instrumentation, serializer
 
-class CustomJSONProvider(JSONProvider):
+class BSONJSONProvider(JSONProvider):
+    """JSON provider backed by utils.serializer, so ObjectIds and datetimes need no conversion pass."""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return serializer.dumps(obj)
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        return serializer.loads(s)
+
+class CustomJSONProvider(BSONJSONProvider):
     def dumps(self, obj: Any, **kwargs: Any) -> str:
-        kwargs.setdefault('ensure_ascii', False)
         # Convert MongoDB cursor or list to list
         if hasattr(obj, 'result') and isinstance(obj['result'], (list, tuple)):
             obj['result'] = list(obj['result'])
         # Ensure consistent field names
         if isinstance(obj, dict) and 'name' in obj:
             obj['project_name'] = obj.pop('name')
-        return json.dumps(obj, **kwargs, default=self.default)
-    
-    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
-        return json.loads(s, **kwargs)
-    
-    def default(self, obj: Any) -> Any:
-        if isinstance(obj, ObjectId):
-            return str(obj)
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        if hasattr(obj, '__dict__'):
-            return obj.__dict__
-        return super().default(obj)
+        return super().dumps(obj)
 
 class FlaskApp(Flask):
     def __init__(self, *args: Any, **kwargs: Any) -> None:
@@ -38,6 +31,7 @@ class FlaskApp(Flask):
         self.json = CustomJSONProvider(self)
         self.before_request(self._log_request)
         self.after_request(self._log_response)
+        self.teardown_request(instrumentation.teardown_request)
         # Configure CORS
         CORS(self, resources={
             r"/api/*": {
@@ -49,26 +43,12 @@ class FlaskApp(Flask):
         })
     
     def _log_request(self):
-        """Log incoming request details."""
-        request.start_time = time.time()
-        logger.info("Request started: %s %s", request.method, request.path)
-        if request.method in ['POST', 'PUT']:
-            logger.debug("Request data: %s", request.get_json())
-        if request.args:
-            logger.debug("Request args: %s", dict(request.args))
-            
+        """Start the timing counters and access log record for this request."""
+        instrumentation.start_request()
+
     def _log_response(self, response):
-        """Log response data."""
-        try:
-            # Check if response is a file response
-            if hasattr(response, 'direct_passthrough') and response.direct_passthrough:
-                logger.info("Response is a file (binary data)")
-                return
-                
-            # For non-file responses, log the data
-            logger.warning("Response data: %s", response.get_data(as_text=True))
-        except Exception as e:
-            logger.error("Error logging response: %s", str(e))
+        """Write the access log record, request metrics and Server-Timing header."""
+        return instrumentation.finish_request(response)
 
     def process_response(self, response):
         """Process the response and log it."""
@@ -0,0 +1,218 @@
+"""
+Declarative MongoDB index registry.
+
+INDEXES lists, per database and collection, the indexes the queries in
+utils/database.py and the services rely on. ensure_indexes() creates the
+ones that are missing and is safe to run on every start: indexes are
+matched by name or key pattern, and existing ones are never rebuilt or
+dropped. The app runs it in a background thread at startup
+(MONGODB_ENSURE_INDEXES); on MongoDB 4.2+ index builds only lock the
+collection briefly at the start and end, so requests keep being served.
+
+scripts/verify_query_plans.py checks with explain() that every query
+shape is served by one of these indexes.
+"""
+
+import os
+import threading
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure, PyMongoError
+from .logger import logger
+from .mongo import MONGODB_DATABASE, FIXCHAIN_RAG_DATABASE, manager
+
+MONGODB_ENSURE_INDEXES = os.environ.get("MONGODB_ENSURE_INDEXES", "true").lower() in ("1", "true", "yes")
+
+INDEXES = {
+    MONGODB_DATABASE: {
+        'projects': [
+            IndexModel([('project_id', ASCENDING)]),
+        ],
+        'tasks': [
+            # project_id equality with the _id keyset used for paging
+            IndexModel([('project_id', ASCENDING), ('_id', ASCENDING)]),
+            IndexModel([('task_id', ASCENDING)]),
+        ],
+        'test_cases': [
+            IndexModel([('task_id', ASCENDING)]),
+        ],
+        'task_jobs': [
+            IndexModel([('job_id', ASCENDING)], unique=True),
+            # Orphaned job scan of the task scheduler's reconciler
+            IndexModel([('status', ASCENDING), ('heartbeat_at', ASCENDING)]),
+        ],
+        'documents': [
+            IndexModel([('workflow_id', ASCENDING)]),
+            IndexModel([('document_id', ASCENDING)]),
+        ],
+        'workflows': [
+            IndexModel([('workflow_id', ASCENDING)]),
+            IndexModel([('project_id', ASCENDING)]),
+        ],
+        'workflow_executions': [
+            IndexModel([('id', ASCENDING)]),
+            IndexModel([('execution_id', ASCENDING)]),
+            IndexModel([('project_id', ASCENDING), ('created_at', DESCENDING)]),
+            IndexModel([('workflow_id', ASCENDING)]),
+            # Reconciler: active executions that went quiet
+            IndexModel([('status', ASCENDING), ('last_event_at', ASCENDING)]),
+        ],
+        'workflow_configs': [
+            IndexModel([('project_id', ASCENDING)]),
+        ],
+        'scenarios': [
+            IndexModel([('project_id', ASCENDING), ('id', ASCENDING)]),
+            IndexModel([('workflow_id', ASCENDING)]),
+        ],
+        'dify_metadata_cache': [
+            IndexModel([('api_key_hash', ASCENDING)]),
+        ],
+        'bugs': [
+            # Keyset pagination: project_id equality, newest first, _id tiebreaker
+            IndexModel([('project_id', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)]),
+            IndexModel([('project_id', ASCENDING), ('status', ASCENDING), ('created_at', DESCENDING)]),
+            IndexModel([('project_id', ASCENDING), ('severity', ASCENDING), ('created_at', DESCENDING)]),
+            IndexModel([('task_id', ASCENDING)]),
+            IndexModel([('scenario_id', ASCENDING)]),
+            IndexModel([('created_at', DESCENDING)]),
+            IndexModel([('bug_id', ASCENDING)], unique=True),
+        ],
+        'bug_fixes': [
+            IndexModel([('bug_id', ASCENDING), ('fixed_at', DESCENDING)]),
+            IndexModel([('fix_id', ASCENDING)], unique=True),
+            IndexModel([('fixed_by', ASCENDING)]),
+            IndexModel([('verified_by', ASCENDING)]),
+        ],
+        'bug_histories': [
+            IndexModel([('bug_id', ASCENDING), ('captured_at', DESCENDING)]),
+            IndexModel([('history_id', ASCENDING)], unique=True),
+            IndexModel([('captured_at', DESCENDING)]),
+        ],
+        'bug_executions': [
+            IndexModel([('bug_id', ASCENDING), ('executed_at', DESCENDING)]),
+            IndexModel([('execution_id', ASCENDING)]),
+            IndexModel([('execution_id', ASCENDING), ('bug_id', ASCENDING)], unique=True),
+            IndexModel([('executed_at', DESCENDING)]),
+        ],
+        # Report rollups: per project and version, by day
+        'bug_daily_rollups': [
+            IndexModel([('project_id', ASCENDING), ('version', ASCENDING), ('day', ASCENDING)]),
+        ],
+        # FixChain
+        'bug_reports': [
+            IndexModel([('source_file', ASCENDING)]),
+            IndexModel([('bug_type', ASCENDING)]),
+            IndexModel([('severity', ASCENDING)]),
+            IndexModel([('status', ASCENDING)]),
+            IndexModel([('created_at', ASCENDING)]),
+            IndexModel([('source_file', ASCENDING), ('bug_type', ASCENDING)]),
+            IndexModel([('bug_id', ASCENDING)]),
+            # Incremental vector index sync
+            IndexModel([('updated_at', ASCENDING)]),
+        ],
+        'execution_sessions': [
+            IndexModel([('source_file', ASCENDING)]),
+            IndexModel([('session_number', ASCENDING)]),
+            IndexModel([('start_time', ASCENDING)]),
+            IndexModel([('overall_status', ASCENDING)]),
+            IndexModel([('source_file', ASCENDING), ('session_number', ASCENDING)]),
+            IndexModel([('source_file', ASCENDING), ('created_at', DESCENDING)]),
+            IndexModel([('session_id', ASCENDING)]),
+        ],
+        # Stream import progress, one document per import
+        'fixchain_imports': [
+            IndexModel([('import_id', ASCENDING)], unique=True),
+        ],
+    },
+    FIXCHAIN_RAG_DATABASE: {
+        'test_reasoning': [
+            IndexModel([('test_name', ASCENDING)]),
+            IndexModel([('source_file', ASCENDING)]),
+            IndexModel([('status', ASCENDING)]),
+            IndexModel([('created_at', ASCENDING)]),
+            IndexModel([('test_name', ASCENDING), ('attempt_id', ASCENDING)]),
+            IndexModel([('entry_id', ASCENDING)]),
+            IndexModel([('updated_at', ASCENDING)]),
+            # Full-text search
+            IndexModel([('summary', TEXT), ('output', TEXT)]),
+        ],
+    },
+}
+
+BUG_COLLECTIONS = ('bugs', 'bug_fixes', 'bug_histories', 'bug_executions', 'bug_daily_rollups')
+FIXCHAIN_COLLECTIONS = ('bug_reports', 'execution_sessions', 'fixchain_imports', 'test_reasoning')
+
+
+def index_keys(model):
+    """Key pattern of an IndexModel as a list of (field, direction)."""
+    return list(model.document['key'].items())
+
+
+def _existing(collection):
+    info = collection.index_information()
+    return set(info), {tuple(spec['key']) for spec in info.values()}
+
+
+def _ensure_collection(collection, models):
+    """Create the missing indexes of one collection; returns (created names, failures)."""
+    names, keys = _existing(collection)
+    missing = [model for model in models
+               if model.document['name'] not in names and tuple(index_keys(model)) not in keys]
+    if not missing:
+        return [], []
+    try:
+        # One createIndexes command builds all of them in a single pass over the collection
+        return collection.create_indexes(missing), []
+    except OperationFailure:
+        pass
+    created, failures = [], []
+    for model in missing:
+        try:
+            created.extend(collection.create_indexes([model]))
+        except OperationFailure as e:
+            # Usually an index on the same keys with other options, or duplicates under a unique index
+            failures.append(f"{collection.full_name}.{model.document['name']}: {e}")
+    return created, failures
+
+
+def ensure_indexes(client=None, collections=None):
+    """
+    Create every registry index that does not exist yet.
+
+    Args:
+        client: MongoClient to use; defaults to the shared client.
+        collections: Optional collection names to limit the run to.
+
+    Returns:
+        dict: {'created': [...], 'failed': [...]} with database.collection.index names.
+    """
+    client = client or manager.client
+    result = {'created': [], 'failed': []}
+    for database_name, specs in INDEXES.items():
+        database = client[database_name]
+        for name, models in specs.items():
+            if collections and name not in collections:
+                continue
+            try:
+                created, failures = _ensure_collection(database[name], models)
+            except PyMongoError as e:
+                failures, created = [f"{database_name}.{name}: {e}"], []
+            result['created'].extend(f"{database_name}.{name}.{index}" for index in created)
+            result['failed'].extend(failures)
+    for failure in result['failed']:
+        logger.warning("Could not create index %s", failure)
+    if result['created']:
+        logger.info("Created %d indexes: %s", len(result['created']), ', '.join(result['created']))
+    return result
+
+
+def start_index_build():
+    """Run ensure_indexes in a daemon thread so startup does not wait for index builds."""
+    def run():
+        try:
+            ensure_indexes()
+        except Exception as e:
+            logger.error("Index bootstrap failed: %s", e)
+
+    thread = threading.Thread(target=run, name='index-bootstrap', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,116 @@
+"""
+Request instrumentation hooks.
+
+Times every Flask request, counts the MongoDB, serialization and external
+call spans recorded through utils.request_timing while it runs, and
+reports them three ways: a Server-Timing response header (shown by
+browser dev tools), the http_request_duration_seconds histogram served by
+GET /metrics, and the structured access log. Requests served by the async
+handlers of utils.async_app bypass Flask and are timed by call_asgi().
+"""
+
+import os
+import time
+from flask import g, request
+from . import access_log, metrics, request_timing
+from .logger import logger
+
+SERVER_TIMING_ENABLED = os.environ.get("SERVER_TIMING_ENABLED", "true").lower() in ("1", "true", "yes")
+
+SPAN_DESCRIPTIONS = {
+    'db': 'MongoDB',
+    'serialize': 'JSON serialization',
+    'dify': 'Dify API',
+    'codex': 'Codex API',
+    'embedding': 'Embedding model',
+}
+
+
+def server_timing(timings, total_seconds):
+    """Server-Timing header value for the spans of a request."""
+    parts = []
+    for name, (seconds, count) in timings.spans.items():
+        description = SPAN_DESCRIPTIONS.get(name, name)
+        parts.append(f'{name};dur={seconds * 1000:.1f};desc="{description} ({count})"')
+    parts.append(f'total;dur={total_seconds * 1000:.1f}')
+    return ', '.join(parts)
+
+
+def start_request():
+    timings, token = request_timing.begin()
+    g.instrumentation = {'start': time.perf_counter(), 'timings': timings, 'token': token, 'observed': False}
+    access_log.start_request()
+
+
+def _observe(state, status):
+    state['observed'] = True
+    elapsed = time.perf_counter() - state['start']
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    metrics.HTTP_REQUEST_SECONDS.observe(elapsed, request.method, route, str(status))
+    return elapsed
+
+
+def finish_request(response):
+    """after_request hook: access log, request histogram and Server-Timing header."""
+    response = access_log.finish_request(response)
+    state = g.get('instrumentation')
+    if state is not None and not state['observed']:
+        try:
+            elapsed = _observe(state, response.status_code)
+            if SERVER_TIMING_ENABLED:
+                response.headers.add('Server-Timing', server_timing(state['timings'], elapsed))
+        except Exception as e:
+            logger.error("Error recording request metrics: %s", e)
+    return response
+
+
+def teardown_request(exc=None):
+    """Account for requests that ended in an unhandled exception and stop the timing counters."""
+    access_log.teardown_request(exc)
+    state = g.pop('instrumentation', None)
+    if state is None:
+        return
+    try:
+        if not state['observed']:
+            _observe(state, access_log.exception_status(exc))
+    finally:
+        request_timing.end(state['token'])
+
+
+def init_app(app):
+    """Register the instrumentation hooks on a Flask app."""
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    app.teardown_request(teardown_request)
+
+
+async def call_asgi(app, route, scope, receive, send):
+    """Call an ASGI endpoint with the same timing, metrics and access log as a Flask request."""
+    start = time.perf_counter()
+    timings, token = request_timing.begin()
+    status = 500
+    error = None
+
+    async def send_with_timing(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+            if SERVER_TIMING_ENABLED:
+                value = server_timing(timings, time.perf_counter() - start).encode('latin-1')
+                message = dict(message, headers=[*message.get('headers', ()), (b'server-timing', value)])
+        await send(message)
+
+    try:
+        await app(scope, receive, send_with_timing)
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        try:
+            elapsed = time.perf_counter() - start
+            metrics.HTTP_REQUEST_SECONDS.observe(elapsed, scope['method'], route, str(status))
+            access_log.log_asgi_request(scope['method'], scope['path'], route, status, elapsed, timings, error)
+        except Exception as e:
+            logger.error("Error recording request metrics: %s", e)
+        finally:
+            request_timing.end(token)
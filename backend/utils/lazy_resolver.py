@@ -0,0 +1,75 @@
+"""
+Connexion resolver that imports controller modules on first use.
+
+Controllers import their services, and the services pull in requests,
+numpy, the Dify client and so on, so importing every controller while the
+API is added makes each worker start pay for endpoints it may never serve.
+LazyResolver hands connexion a LazyFunction per operation instead: only
+the module is located at startup (so a wrong operationId still fails
+fast), and it is imported the first time one of its operations is called.
+"""
+
+import asyncio
+import importlib.util
+import os
+import threading
+from connexion.resolver import Resolver, ResolverError
+from connexion.utils import get_function_from_name
+
+LAZY_CONTROLLERS = os.environ.get("LAZY_CONTROLLERS", "true").lower() in ("1", "true", "yes")
+
+
+class LazyFunction:
+    """Stand-in for a controller function that imports it on first call."""
+
+    __slots__ = ("operation_id", "_function", "_lock")
+
+    def __init__(self, operation_id):
+        self.operation_id = operation_id
+        self._function = None
+        self._lock = threading.Lock()
+
+    @property
+    def __name__(self):
+        return self.operation_id.rpartition(".")[2]
+
+    @property
+    def __wrapped__(self):
+        # Connexion unwraps view functions to read their signature on each call
+        return self.resolve()
+
+    def resolve(self):
+        if self._function is None:
+            with self._lock:
+                if self._function is None:
+                    function = get_function_from_name(self.operation_id)
+                    if asyncio.iscoroutinefunction(function):
+                        # Connexion's Flask decorator cannot tell this stand-in is async
+                        from asgiref.sync import async_to_sync
+                        function = async_to_sync(function)
+                    self._function = function
+        return self._function
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+    def __repr__(self):
+        return f"<LazyFunction {self.operation_id}>"
+
+
+class LazyResolver(Resolver):
+    """Resolve operationIds to LazyFunctions (or eagerly when LAZY_CONTROLLERS is off)."""
+
+    def resolve_function_from_operation_id(self, operation_id):
+        if not LAZY_CONTROLLERS:
+            return super().resolve_function_from_operation_id(operation_id)
+        module_name = operation_id.rpartition(".")[0]
+        if not module_name:
+            raise ResolverError(f'Cannot resolve operationId "{operation_id}"! Expected module.function')
+        try:
+            found = importlib.util.find_spec(module_name) is not None
+        except (ImportError, ValueError) as e:
+            raise ResolverError(f'Cannot resolve operationId "{operation_id}"! Import error was "{e}"')
+        if not found:
+            raise ResolverError(f'Cannot resolve operationId "{operation_id}"! Module {module_name} not found')
+        return LazyFunction(operation_id)
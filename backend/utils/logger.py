@@ -1,18 +1,53 @@
+import atexit
 import logging
 import os
+import queue
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+# Write records from a background thread so request threads never wait on disk
+LOG_ASYNC = os.environ.get("LOG_ASYNC", "true").lower() in ("1", "true", "yes")
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+
+_listener = None
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full."""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+def _restart_listener():
+    """The listener thread does not survive a fork; give the child its own."""
+    global _listener
+    if _listener is not None:
+        _listener = QueueListener(_listener.queue, *_listener.handlers, respect_handler_level=True)
+        _listener.start()
+
 
 def setup_logger():
     """Setup logger configuration for the application."""
+    global _listener
+
+    # Create a logger
+    logger = logging.getLogger('innolab')
+    if logger.handlers:
+        return logger  # Already configured; utils/__init__ calls this again
+    logger.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+
     # Create logs directory if it doesn't exist
     log_dir = 'logs'
     if not os.path.exists(log_dir):
         os.makedirs(log_dir)
 
-    # Create a logger
-    logger = logging.getLogger('innolab')
-    logger.setLevel(logging.INFO)
-
     # Create handlers
     console_handler = logging.StreamHandler()
     today = datetime.now().strftime('%Y-%m-%d')
@@ -24,9 +59,18 @@ def setup_logger():
     file_handler.setFormatter(log_format)
 
     # Add handlers to the logger
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
+    if LOG_ASYNC:
+        records = queue.Queue(LOG_QUEUE_SIZE)
+        logger.addHandler(DroppingQueueHandler(records))
+        _listener = QueueListener(records, console_handler, file_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(lambda: _listener.stop())  # Flush what is still queued
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=_restart_listener)
+    else:
+        logger.addHandler(console_handler)
+        logger.addHandler(file_handler)
 
     return logger
 
-logger = setup_logger()
+logger = setup_logger()
\ No newline at end of file
@@ -0,0 +1,254 @@
+"""
+Process-wide MongoDB connection manager.
+
+A single MongoClient (and therefore a single socket pool) is shared by every
+database helper and service in the worker process. The client is recreated
+lazily after a fork so gunicorn workers never reuse the parent's sockets.
+The async handlers (utils.async_app) get an AsyncMongoClient with the same
+options and listeners, one per event loop.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from pymongo import AsyncMongoClient, MongoClient, monitoring
+from pymongo.errors import PyMongoError
+from .logger import logger
+from .request_timing import CommandTimingListener
+
+MONGODB_URL = os.environ.get("MONGODB_URL", "mongodb://mongodb:27017")
+MONGODB_DATABASE = os.environ.get("MONGODB_DATABASE", "SugoiApp")
+FIXCHAIN_RAG_DATABASE = os.environ.get("FIXCHAIN_RAG_DATABASE", "FixChainRAG")
+
+MONGODB_MAX_POOL_SIZE = int(os.environ.get("MONGODB_MAX_POOL_SIZE", "50"))
+MONGODB_MIN_POOL_SIZE = int(os.environ.get("MONGODB_MIN_POOL_SIZE", "0"))
+MONGODB_MAX_IDLE_TIME_MS = int(os.environ.get("MONGODB_MAX_IDLE_TIME_MS", "300000"))
+MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get("MONGODB_WAIT_QUEUE_TIMEOUT_MS", "10000"))
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Collect connection pool counters from pymongo CMAP events."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.checkins = 0
+            self.checkout_failures = 0
+            self.connections_created = 0
+            self.connections_closed = 0
+            self.total_wait_time = 0.0
+            self.max_wait_time = 0.0
+            self.pools_cleared = 0
+
+    def _record_wait(self, event):
+        duration = getattr(event, "duration", None)
+        if duration is None:
+            return
+        self.total_wait_time += duration
+        if duration > self.max_wait_time:
+            self.max_wait_time = duration
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pools_cleared += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.connections_created += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections_closed += 1
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+            self._record_wait(event)
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checkouts += 1
+            self._record_wait(event)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checkins += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "checked_out": self.checkouts - self.checkins,
+                "checkout_failures": self.checkout_failures,
+                "open_connections": self.connections_created - self.connections_closed,
+                "connections_created": self.connections_created,
+                "connections_closed": self.connections_closed,
+                "pools_cleared": self.pools_cleared,
+                "avg_wait_ms": round(self.total_wait_time / self.checkouts * 1000, 3) if self.checkouts else 0,
+                "max_wait_ms": round(self.max_wait_time * 1000, 3),
+            }
+
+
+class MongoConnectionManager:
+    """Own the shared MongoClient for the current process."""
+
+    def __init__(self, url=MONGODB_URL, **client_options):
+        self.url = url
+        self.client_options = {
+            "maxPoolSize": MONGODB_MAX_POOL_SIZE,
+            "minPoolSize": MONGODB_MIN_POOL_SIZE,
+            "maxIdleTimeMS": MONGODB_MAX_IDLE_TIME_MS,
+            "waitQueueTimeoutMS": MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+            "serverSelectionTimeoutMS": MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        }
+        self.client_options.update(client_options)
+        self.metrics = PoolMetricsListener()
+        self.command_timer = CommandTimingListener()
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._async_clients = {}  # event loop -> AsyncMongoClient, like async_http._clients
+        self._async_pid = None
+
+    @property
+    def client(self):
+        """Return the shared client, creating it on first use or after a fork."""
+        client = self._client
+        if client is not None and self._pid == os.getpid():
+            return client
+        with self._lock:
+            if self._client is None or self._pid != os.getpid():
+                self._client = MongoClient(
+                    self.url,
+                    event_listeners=[self.metrics, self.command_timer],
+                    **self.client_options,
+                )
+                self._pid = os.getpid()
+                logger.info("MongoDB client created (pid=%s, maxPoolSize=%s)",
+                            self._pid, self.client_options["maxPoolSize"])
+            return self._client
+
+    @property
+    def async_client(self):
+        """Return the AsyncMongoClient of the running event loop, creating it on first use."""
+        loop = asyncio.get_running_loop()
+        if self._async_pid != os.getpid():
+            self._async_clients = {}  # Inherited across fork; the parent owns their sockets
+            self._async_pid = os.getpid()
+        client = self._async_clients.get(loop)
+        if client is None:
+            # An AsyncMongoClient is bound to the loop it was first used on; the clients of
+            # loops that are gone can no longer be closed, only dropped
+            for stale in [other for other in self._async_clients if other.is_closed()]:
+                del self._async_clients[stale]
+            client = self._async_clients[loop] = AsyncMongoClient(
+                self.url,
+                event_listeners=[self.metrics, self.command_timer],
+                **self.client_options,
+            )
+            logger.info("Async MongoDB client created (pid=%s, maxPoolSize=%s)",
+                        self._async_pid, self.client_options["maxPoolSize"])
+        return client
+
+    def get_database(self, name=MONGODB_DATABASE):
+        return self.client[name]
+
+    def get_async_database(self, name=MONGODB_DATABASE):
+        return self.async_client[name]
+
+    def ping(self):
+        """Run a ping round trip and return its latency in milliseconds, or None on failure."""
+        try:
+            start = time.perf_counter()
+            self.client.admin.command("ping")
+            return round((time.perf_counter() - start) * 1000, 3)
+        except PyMongoError as e:
+            logger.error("MongoDB health check failed: %s", e)
+            return None
+
+    def reset_after_fork(self):
+        """Drop the inherited client without closing the parent's sockets."""
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._async_clients = {}
+        self._async_pid = None
+        self.metrics = PoolMetricsListener()
+
+    def close(self):
+        with self._lock:
+            if self._client is not None and self._pid == os.getpid():
+                self._client.close()
+            self._client = None
+            self._pid = None
+
+    async def aclose(self):
+        """Close the async client of the running loop and drop those of closed loops (lifespan shutdown)."""
+        if self._async_pid != os.getpid():
+            return
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.pop(loop, None)
+        for stale in [other for other in self._async_clients if other.is_closed()]:
+            del self._async_clients[stale]
+        if client is not None:
+            await client.close()
+
+    def stats(self):
+        return {
+            "pid": os.getpid(),
+            "connected": self._client is not None and self._pid == os.getpid(),
+            "max_pool_size": self.client_options["maxPoolSize"],
+            "min_pool_size": self.client_options["minPoolSize"],
+            **self.metrics.snapshot(),
+        }
+
+
+manager = MongoConnectionManager()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=manager.reset_after_fork)
+
+
+def get_client():
+    return manager.client
+
+
+def get_db():
+    """Handle for the main SugoiApp database."""
+    return manager.get_database(MONGODB_DATABASE)
+
+
+def get_rag_db():
+    """Handle for the FixChainRAG vector/reasoning database."""
+    return manager.get_database(FIXCHAIN_RAG_DATABASE)
+
+
+def get_async_db():
+    """Async handle for the main SugoiApp database; only usable on the event loop."""
+    return manager.get_async_database(MONGODB_DATABASE)
+
+
+def get_pool_stats():
+    return manager.stats()
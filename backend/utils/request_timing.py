@@ -0,0 +1,109 @@
+"""
+Per-request timing counters.
+
+Work a request waits on is added to named spans of the current request:
+MongoDB commands ('db', measured by a pymongo CommandListener), JSON
+serialization ('serialize', measured by utils.serializer) and calls to
+external services ('dify', 'codex', 'embedding'). The counters live in a
+ContextVar that utils.instrumentation sets for the duration of a request;
+outside a request only the process-wide histograms in utils.metrics are
+updated.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pymongo import monitoring
+from . import metrics
+
+
+class RequestTimings:
+    __slots__ = ('spans',)
+
+    def __init__(self):
+        self.spans = {}  # name -> [seconds, count]
+
+    def add(self, name, seconds):
+        span = self.spans.get(name)
+        if span is None:
+            self.spans[name] = [seconds, 1]
+        else:
+            span[0] += seconds
+            span[1] += 1
+
+    def seconds(self, name):
+        return self.spans.get(name, (0.0, 0))[0]
+
+    def count(self, name):
+        return self.spans.get(name, (0.0, 0))[1]
+
+
+_current = ContextVar('request_timings', default=None)
+
+
+def begin():
+    """Start counting for the current request; returns (timings, token for end())."""
+    timings = RequestTimings()
+    return timings, _current.set(timings)
+
+
+def end(token):
+    try:
+        _current.reset(token)
+    except ValueError:  # Token from another context
+        _current.set(None)
+
+
+def current():
+    return _current.get()
+
+
+def record(name, seconds):
+    """Add time to a span of the current request, if there is one."""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+def record_serialize(seconds):
+    record('serialize', seconds)
+
+
+def record_external(service, endpoint, seconds):
+    """Count an external call in the current request and in external_call_duration_seconds."""
+    record(service, seconds)
+    metrics.EXTERNAL_CALL_SECONDS.observe(seconds, service, endpoint)
+
+
+@contextmanager
+def external_call(service, endpoint):
+    """Time the enclosed block as a call to an external service."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_external(service, endpoint, time.perf_counter() - start)
+
+
+class CommandTimingListener(monitoring.CommandListener):
+    """Time MongoDB commands per collection and add them to the current request's 'db' span."""
+
+    def __init__(self):
+        self._collections = {}  # (connection, request id) -> collection, from the started event
+
+    def started(self, event):
+        name = event.command_name
+        collection = event.command.get('collection' if name == 'getMore' else name)
+        self._collections[(event.connection_id, event.request_id)] = collection if isinstance(collection, str) else ''
+
+    def _record(self, event):
+        seconds = event.duration_micros / 1e6
+        collection = self._collections.pop((event.connection_id, event.request_id), '')
+        metrics.MONGODB_COMMAND_SECONDS.observe(seconds, event.database_name, collection, event.command_name)
+        record('db', seconds)
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        self._record(event)
@@ -0,0 +1,180 @@
+"""
+BSON-aware JSON serialization.
+
+Every response used to be converted twice: serialize_value/serialize_doc
+rebuilt each document recursively to turn ObjectIds and datetimes into
+strings, then the JSON encoder walked the copy again. Here the encoder
+does the conversion itself through a `default` hook, so a response is
+walked once. Conversions are looked up in a table keyed by exact type, so
+the common values cost one dict lookup rather than a chain of isinstance
+checks.
+
+orjson is used when it is installed (JSON_BACKEND=auto or orjson); it
+handles datetime, date and UUID natively and only calls back for the BSON
+types. Without it the stdlib encoder is used with the same hook and the
+output is the same JSON, compact and UTF-8.
+
+RawBSONDocument results (find with document_class=RawBSONDocument, useful
+for projections that go straight to the client) are decoded in one C call
+at serialization time instead of key by key.
+
+to_jsonable() is for callers that need Python values rather than JSON
+text (serialize_doc, serialize_value); containers are only copied when
+something in them has to be converted.
+"""
+
+import base64
+import json
+import os
+import time
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+import bson
+from bson import ObjectId
+from bson.binary import Binary
+from bson.decimal128 import Decimal128
+from bson.raw_bson import RawBSONDocument
+from .logger import logger
+from .request_timing import record_serialize
+
+try:
+    import orjson
+except ImportError:  # Optional; the stdlib encoder is used instead
+    orjson = None
+
+JSON_BACKEND = os.environ.get("JSON_BACKEND", "auto").lower()  # auto, orjson, json
+
+if JSON_BACKEND == 'orjson' and orjson is None:
+    logger.warning("JSON_BACKEND=orjson but orjson is not installed, using json")
+USE_ORJSON = orjson is not None and JSON_BACKEND in ('auto', 'orjson')
+
+# Values the encoder writes as they are
+_NATIVE = frozenset((str, int, float, bool, type(None)))
+
+
+def _raw_document(value):
+    return bson.decode(value.raw)
+
+
+def _binary(value):
+    return base64.b64encode(value).decode('ascii')
+
+
+_CONVERTERS = {
+    ObjectId: str,
+    datetime: datetime.isoformat,
+    date: date.isoformat,
+    uuid.UUID: str,
+    Decimal: float,
+    Decimal128: lambda value: float(value.to_decimal()),
+    Binary: _binary,
+    bytes: _binary,
+    RawBSONDocument: _raw_document,
+    tuple: list,
+    set: list,
+    frozenset: list,
+}
+
+
+def _subclass_converter(value):
+    for base, convert in _CONVERTERS.items():
+        if isinstance(value, base):
+            return convert
+    return None
+
+
+def _fallback(value):
+    """Conversion for subclasses and non-BSON objects, or None."""
+    convert = _subclass_converter(value)
+    if convert is not None:
+        return convert
+    if hasattr(value, 'tolist'):  # numpy arrays and scalars
+        return lambda v: v.tolist()
+    if hasattr(value, '__dict__'):
+        return lambda v: v.__dict__
+    return None
+
+
+def default(value):
+    """`default` hook for json.dumps/orjson.dumps; raises TypeError for unsupported values."""
+    convert = _CONVERTERS.get(type(value)) or _fallback(value)
+    if convert is None:
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+    return convert(value)
+
+
+def to_jsonable(value):
+    """
+    JSON-compatible version of a value: ObjectIds become strings, datetimes
+    ISO 8601 strings. Dicts and lists are returned as-is when nothing in
+    them changes, otherwise copied once; other values are left alone.
+    """
+    kind = type(value)
+    if kind in _NATIVE:
+        return value
+    if kind is dict:
+        copy = None
+        for key, item in value.items():
+            converted = to_jsonable(item)
+            if converted is not item:
+                if copy is None:
+                    copy = dict(value)
+                copy[key] = converted
+        return value if copy is None else copy
+    if kind is list:
+        copy = None
+        for index, item in enumerate(value):
+            converted = to_jsonable(item)
+            if converted is not item:
+                if copy is None:
+                    copy = list(value)
+                copy[index] = converted
+        return value if copy is None else copy
+    if isinstance(value, dict):  # SON, OrderedDict
+        return to_jsonable(dict(value))
+    if isinstance(value, list):
+        return to_jsonable(list(value))
+    convert = _CONVERTERS.get(kind) or _subclass_converter(value)
+    if convert is None:
+        return value
+    converted = convert(value)
+    # Raw documents and sets become containers that may still hold BSON values
+    return to_jsonable(converted) if type(converted) in (dict, list) else converted
+
+
+if USE_ORJSON:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def _encode_bytes(value):
+        return orjson.dumps(value, default=default, option=_ORJSON_OPTIONS)
+
+    def _encode_text(value):
+        return _encode_bytes(value).decode('utf-8')
+
+    loads = orjson.loads
+else:
+    _encoder = json.JSONEncoder(default=default, ensure_ascii=False, separators=(',', ':'))
+
+    _encode_text = _encoder.encode
+
+    def _encode_bytes(value):
+        return _encoder.encode(value).encode('utf-8')
+
+    loads = json.loads
+
+
+def dumps_bytes(value):
+    """UTF-8 JSON for a value."""
+    start = time.perf_counter()
+    data = _encode_bytes(value)
+    record_serialize(time.perf_counter() - start)
+    return data
+
+
+def dumps(value, **kwargs):
+    """JSON text for a value; json.dumps-style keyword arguments (cls, indent) are ignored."""
+    start = time.perf_counter()
+    text = _encode_text(value)
+    record_serialize(time.perf_counter() - start)
+    return text
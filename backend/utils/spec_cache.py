@@ -0,0 +1,126 @@
+"""
+Cached, pre-validated API specification.
+
+Parsing swagger.yml with PyYAML and validating it against the Swagger 2
+schema costs a few hundred milliseconds on every worker start. load_spec()
+stores the parsed spec as JSON together with a SHA-256 of the YAML source
+and the connexion version that validated it. When both still match, the
+JSON is loaded instead. Either way the spec returned has been validated,
+so connexion's own validation is skipped while the API is added
+(prevalidated()). Editing swagger.yml or upgrading connexion
+invalidates the cache.
+
+The cache can be built ahead of time, e.g. while building the image:
+
+    python -m utils.spec_cache swagger/swagger.yml
+"""
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from importlib.metadata import PackageNotFoundError, version
+import yaml
+from .logger import logger
+
+SWAGGER_CACHE_ENABLED = os.environ.get("SWAGGER_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+SWAGGER_CACHE_DIR = os.environ.get(
+    "SWAGGER_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "spec_cache"),
+)
+
+# libyaml is several times faster than the pure Python loader connexion uses
+_YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def _connexion_version():
+    try:
+        return version("connexion")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def _digest(source):
+    return hashlib.sha256(source + _connexion_version().encode()).hexdigest()
+
+
+def _cache_path(spec_path):
+    return os.path.join(SWAGGER_CACHE_DIR, os.path.basename(spec_path) + ".json")
+
+
+def _read_cache(path, digest):
+    try:
+        with open(path, "rb") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cached, dict) or cached.get("digest") != digest:
+        return None
+    return cached.get("spec")
+
+
+def _write_cache(path, digest, spec):
+    tmp_path = None
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"digest": digest, "spec": spec}, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning("Could not write spec cache %s: %s", path, e)
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def validate(spec):
+    """Validate a spec the way connexion does; raises InvalidSpecification."""
+    from connexion.spec import Specification
+    Specification.from_dict(spec)
+
+
+def load_spec(spec_path):
+    """
+    Load a YAML API specification, from the cache when it is up to date.
+
+    Args:
+        spec_path: Path of the YAML specification.
+
+    Returns:
+        tuple: (spec dict, True if the spec was validated by an earlier run)
+    """
+    with open(spec_path, "rb") as f:
+        source = f.read()
+    digest = _digest(source)
+    cache_path = _cache_path(spec_path)
+    if SWAGGER_CACHE_ENABLED:
+        spec = _read_cache(cache_path, digest)
+        if spec is not None:
+            return spec, True
+
+    # Round trip through JSON so a fresh spec and a cached one are identical
+    spec = json.loads(json.dumps(yaml.load(source, Loader=_YamlLoader), default=str))
+    validate(spec)
+    if SWAGGER_CACHE_ENABLED:
+        _write_cache(cache_path, digest, spec)
+    return spec, False
+
+
+@contextmanager
+def prevalidated():
+    """Skip connexion's schema validation for specs loaded inside the block."""
+    from connexion.spec import Specification
+    original = Specification.__dict__["_validate_spec"]
+    Specification._validate_spec = classmethod(lambda cls, spec: None)
+    try:
+        yield
+    finally:
+        Specification._validate_spec = original
+
+
+if __name__ == "__main__":
+    for path in sys.argv[1:] or [os.environ["SWAGGER_PATH"]]:
+        _, cached = load_spec(path)
+        print(f"{path}: {'up to date' if cached else 'validated and cached'} ({_cache_path(path)})")
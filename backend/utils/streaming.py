@@ -0,0 +1,119 @@
+"""
+Streamed JSON responses for large list endpoints.
+
+return_status() needs the whole result in memory: the cursor is turned
+into a list and the JSON provider builds one string from it. A streamed response instead iterates the cursor and
+converts and writes each document as it arrives, so memory stays at about
+one batch of documents.
+
+Clients opt in per request with ?stream=json, which returns the same
+envelope as return_status with the result array streamed, or with
+?stream=ndjson (or Accept: application/x-ndjson), which returns one
+document per line. The status has already been sent when an error happens
+mid-stream, so the error is reported in the body: an "error" key after the
+array, or a final {"error": ...} line.
+"""
+
+import json
+from flask import Response, request
+from . import serializer
+from .logger import logger
+
+STREAM_FORMATS = ('json', 'ndjson')
+STREAM_MIMETYPES = {'json': 'application/json', 'ndjson': 'application/x-ndjson'}
+STREAM_FLUSH_BYTES = 64 * 1024
+
+
+def stream_format():
+    """Streaming format requested by the current request, or None; raises ValueError."""
+    value = (request.args.get('stream') or '').lower()
+    if not value:
+        return 'ndjson' if 'application/x-ndjson' in request.headers.get('Accept', '') else None
+    if value in ('1', 'true', 'yes'):
+        return 'json'
+    if value in ('0', 'false', 'no'):
+        return None
+    if value not in STREAM_FORMATS:
+        raise ValueError(f"stream must be one of: {', '.join(STREAM_FORMATS)}")
+    return value
+
+
+def _dumps(value):
+    try:
+        return serializer.dumps(value)
+    except TypeError:
+        return json.dumps(serializer.to_jsonable(value), ensure_ascii=False, default=str)
+
+
+def _buffered(parts):
+    """Join small pieces into chunks of about STREAM_FLUSH_BYTES."""
+    buffer = []
+    size = 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= STREAM_FLUSH_BYTES:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def _json_parts(documents, message, counter):
+    envelope = json.dumps({"status_code": "Success", "status": 200, "message": message}, ensure_ascii=False)
+    yield envelope[:-1] + ', "result": ['
+    try:
+        for document in documents:
+            yield (',' if counter[0] else '') + _dumps(document)
+            counter[0] += 1
+    except Exception as e:
+        logger.error("Streamed response failed after %d documents: %s", counter[0], e)
+        yield '], "error": ' + json.dumps(str(e)) + '}'
+        return
+    yield ']}'
+
+
+def _ndjson_parts(documents, counter):
+    try:
+        for document in documents:
+            yield _dumps(document) + '\n'
+            counter[0] += 1
+    except Exception as e:
+        logger.error("Streamed response failed after %d documents: %s", counter[0], e)
+        yield json.dumps({"error": str(e)}) + '\n'
+
+
+def stream_response(documents, fmt, message='Success'):
+    """
+    Stream an iterable of documents (typically a pymongo cursor) in the given format.
+
+    The first document is fetched before the response starts, so a failing
+    query still surfaces as an exception in the caller. The cursor is closed
+    when the stream ends or the client disconnects.
+    """
+    iterator = iter(documents)
+    try:
+        first = [next(iterator)]
+    except StopIteration:
+        first = []
+    except Exception:
+        getattr(documents, 'close', lambda: None)()
+        raise
+
+    def generate():
+        counter = [0]
+
+        def all_documents():
+            yield from first
+            yield from iterator
+
+        parts = _json_parts(all_documents(), message, counter) if fmt == 'json' else _ndjson_parts(all_documents(), counter)
+        try:
+            yield from _buffered(parts)
+        finally:
+            getattr(documents, 'close', lambda: None)()
+            logger.info("Streamed %d documents as %s", counter[0], fmt)
+
+    # Ask proxies not to buffer the body, or the memory saving moves to them
+    return Response(generate(), mimetype=STREAM_MIMETYPES[fmt], headers={'X-Accel-Buffering': 'no'})
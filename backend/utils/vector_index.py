@@ -0,0 +1,537 @@
+"""
+In-process approximate nearest-neighbour index over embedding vectors.
+
+Rows are L2-normalised float32 vectors, so cosine similarity is a dot
+product. Small or narrowly filtered candidate sets are scanned exactly;
+larger ones go through an IVF layer: spherical k-means centroids, and only
+the nprobe closest inverted lists are scored. Each row carries categorical
+metadata codes used as pre-filters before scoring.
+
+Rows are append-only: a document whose vector or metadata changed gets a
+new row and its old one is tombstoned, as are removed documents. Saving
+drops tombstoned rows.
+
+The index persists under VECTOR_INDEX_PATH as a raw float32 file that is
+memory-mapped on load, plus a small .npz manifest (ids, live flags,
+metadata codes, IVF state, Mongo sync position). After a restart only
+documents updated since the manifest are read from Mongo.
+"""
+
+import fcntl
+import glob
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+import numpy as np
+from bson import ObjectId
+from .logger import logger
+from .vector_codec import decode_vector, VECTOR_BSON_TYPES
+
+VECTOR_INDEX_PATH = os.environ.get("VECTOR_INDEX_PATH", "data/vector_index")
+VECTOR_INDEX_IVF_MIN_ROWS = int(os.environ.get("VECTOR_INDEX_IVF_MIN_ROWS", "4096"))
+VECTOR_INDEX_NPROBE = int(os.environ.get("VECTOR_INDEX_NPROBE", "8"))
+VECTOR_INDEX_SYNC_INTERVAL = float(os.environ.get("VECTOR_INDEX_SYNC_INTERVAL", "5"))
+VECTOR_INDEX_SAVE_INTERVAL = float(os.environ.get("VECTOR_INDEX_SAVE_INTERVAL", "30"))
+
+# updated_at stamps from different writers are only roughly ordered, so each
+# sync re-reads this far behind its last position and skips unchanged rows
+SYNC_SLACK = timedelta(seconds=60)
+SCORE_CHUNK_ROWS = 65536
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_LIST = 64
+MAX_IVF_LISTS = 1024
+
+
+def _grow(array, capacity):
+    grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class VectorIndex:
+    def __init__(self, name, filter_fields=(), root=VECTOR_INDEX_PATH):
+        self.name = name
+        self.filter_fields = tuple(filter_fields)
+        self.root = root
+        self.dim = None
+        self.sync_position = None
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        self._count = 0
+        self._ids = []
+        self._positions = {}        # id -> its live row
+        self._live = np.zeros(0, dtype=bool)
+        self._deleted = 0
+        self._layout = 0            # bumped when saving compacts rows away
+        self._training = False
+        self._base = None           # memory-mapped rows from the last save
+        self._base_count = 0
+        self._tail = None           # rows added since then
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._codes = {f: np.zeros(0, dtype=np.int32) for f in self.filter_fields}
+        self._vocab = {f: [] for f in self.filter_fields}
+        self._vocab_index = {f: {} for f in self.filter_fields}
+        self._centroids = None
+        self._trained_count = 0
+        self._dirty = False
+        self._last_sync = 0.0
+        self._last_save = time.monotonic()
+        self._vectors_file = None
+
+    def __len__(self):
+        return len(self._positions)
+
+    # Row storage
+
+    def _reserve(self, extra):
+        needed = self._count + extra
+        if len(self._assign) < needed:
+            capacity = max(needed, 2 * len(self._assign), 1024)
+            self._assign = _grow(self._assign, capacity)
+            self._live = _grow(self._live, capacity)
+            for field in self.filter_fields:
+                self._codes[field] = _grow(self._codes[field], capacity)
+        tail_needed = needed - self._base_count
+        if self._tail is None:
+            self._tail = np.zeros((max(tail_needed, 1024), self.dim), dtype=np.float32)
+        elif len(self._tail) < tail_needed:
+            self._tail = _grow(self._tail, max(tail_needed, 2 * len(self._tail)))
+
+    def _code(self, field, value):
+        key = "" if value is None else str(value)
+        index = self._vocab_index[field]
+        if key not in index:
+            index[key] = len(self._vocab[field])
+            self._vocab[field].append(key)
+        return index[key]
+
+    def _rows(self, base, tail, base_count, positions):
+        """Vectors for sorted row positions, read from the memmap and the tail."""
+        split = np.searchsorted(positions, base_count)
+        parts = []
+        if split:
+            parts.append(base[positions[:split]])
+        if split < len(positions):
+            parts.append(tail[positions[split:] - base_count])
+        if not parts:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def _unchanged(self, position, vector, meta):
+        stored = self._rows(self._base, self._tail, self._base_count, np.array([position]))[0]
+        if not np.array_equal(stored, vector):
+            return False
+        for field in self.filter_fields:
+            value = meta.get(field)
+            code = self._vocab_index[field].get("" if value is None else str(value))
+            if self._codes[field][position] != code:
+                return False
+        return True
+
+    def _tombstone(self, item_ids):
+        removed = 0
+        for item_id in item_ids:
+            position = self._positions.pop(item_id, None)
+            if position is not None:
+                self._live[position] = False
+                removed += 1
+        self._deleted += removed
+        return removed
+
+    def add(self, items):
+        """Add or replace (id, vector, metadata) items; returns the number of rows written or removed.
+
+        A known id whose vector or metadata changed gets a new row and its old
+        row is tombstoned; a known id that comes with no vector is removed.
+        Unchanged rows and unusable vectors are skipped.
+        """
+        latest = {}
+        for item_id, vector, meta in items:
+            if item_id is not None:
+                latest[item_id] = (vector, meta)  # The last write of an id in the batch wins
+        with self._lock:
+            rows = []
+            cleared = []
+            replaced = []
+            for item_id, (vector, meta) in latest.items():
+                if vector is None:
+                    cleared.append(item_id)
+                    continue
+                try:
+                    vector = decode_vector(vector).ravel()
+                except ValueError as e:
+                    logger.warning("Skipping %s vector %s: %s", self.name, item_id, e)
+                    continue
+                if self.dim is None and vector.size:
+                    self.dim = vector.size
+                if vector.size != self.dim:
+                    logger.warning("Skipping %s vector %s with %s dimensions (index has %s)",
+                                   self.name, item_id, vector.size, self.dim)
+                    continue
+                norm = float(np.linalg.norm(vector))
+                if not norm or not np.isfinite(norm):
+                    continue
+                vector = vector / norm
+                meta = meta or {}
+                position = self._positions.get(item_id)
+                if position is not None:
+                    if self._unchanged(position, vector, meta):
+                        continue
+                    replaced.append(item_id)
+                rows.append((item_id, vector, meta))
+            removed = self._tombstone(cleared)
+            self._tombstone(replaced)
+            if not rows:
+                if removed:
+                    self._dirty = True
+                return removed
+
+            self._reserve(len(rows))
+            start = self._count
+            block = np.stack([vector for _, vector, _ in rows])
+            self._tail[start - self._base_count:start - self._base_count + len(rows)] = block
+            for offset, (item_id, _, meta) in enumerate(rows):
+                position = start + offset
+                self._ids.append(item_id)
+                self._positions[item_id] = position
+                for field in self.filter_fields:
+                    self._codes[field][position] = self._code(field, meta.get(field))
+            self._live[start:start + len(rows)] = True
+            if self._centroids is not None:
+                self._assign[start:start + len(rows)] = np.argmax(block @ self._centroids.T, axis=1)
+            self._count += len(rows)
+            self._dirty = True
+            train = (not self._training and self._count >= VECTOR_INDEX_IVF_MIN_ROWS
+                     and self._count >= 2 * self._trained_count)
+
+        if train:
+            self._train()
+        return len(rows) + removed
+
+    def remove(self, item_ids):
+        """Tombstone the rows of deleted documents; returns how many were indexed."""
+        with self._lock:
+            removed = self._tombstone(item_ids)
+            if removed:
+                self._dirty = True
+            return removed
+
+    # IVF
+
+    def _train(self):
+        """Fit spherical k-means centroids on a sample and reassign every row.
+
+        Runs outside the lock so searches carry on; rows added meanwhile are
+        assigned when the centroids are installed.
+        """
+        with self._lock:
+            if self._training:
+                return
+            self._training = True
+            count, layout = self._count, self._layout
+            base, tail, base_count = self._base, self._tail, self._base_count
+        try:
+            self._fit(count, layout, base, tail, base_count)
+        finally:
+            with self._lock:
+                self._training = False
+
+    def _fit(self, count, layout, base, tail, base_count):
+        start = time.perf_counter()
+        n_lists = min(MAX_IVF_LISTS, max(1, int(np.sqrt(count))))
+        rng = np.random.default_rng(count)
+        sample_size = min(count, n_lists * KMEANS_SAMPLE_PER_LIST)
+        sample = self._rows(base, tail, base_count, np.sort(rng.choice(count, sample_size, replace=False)))
+        centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+        for _ in range(KMEANS_ITERATIONS):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            filled = norms[:, 0] > 0
+            centroids[filled] = sums[filled] / norms[filled]
+
+        trained = np.zeros(count, dtype=np.int32)
+        for chunk_start in range(0, count, SCORE_CHUNK_ROWS):
+            positions = np.arange(chunk_start, min(count, chunk_start + SCORE_CHUNK_ROWS))
+            block = self._rows(base, tail, base_count, positions)
+            trained[positions] = np.argmax(block @ centroids.T, axis=1)
+
+        with self._lock:
+            if self._layout != layout:
+                return  # A save compacted the rows meanwhile; the next add retrains
+            assign = np.zeros(len(self._assign), dtype=np.int32)
+            assign[:count] = trained
+            if self._count > count:
+                positions = np.arange(count, self._count)
+                block = self._rows(self._base, self._tail, self._base_count, positions)
+                assign[positions] = np.argmax(block @ centroids.T, axis=1)
+            self._centroids = centroids
+            self._assign = assign
+            self._trained_count = count
+            self._dirty = True
+        logger.info("Trained %s IVF lists for %s index (%s rows) in %.0f ms",
+                    n_lists, self.name, count, (time.perf_counter() - start) * 1000)
+
+    # Search
+
+    def search(self, vector, k=10, filters=None, exclude_ids=None):
+        """Return (hits, stats); hits are (id, cosine score) pairs, best first."""
+        query = np.asarray(vector, dtype=np.float32).ravel()
+        if self.dim is not None and query.size != self.dim:
+            raise ValueError(f"Query vector must have {self.dim} dimensions")
+        norm = float(np.linalg.norm(query))
+        if not norm:
+            raise ValueError("Query vector must be non-zero")
+        query = query / norm
+
+        with self._lock:
+            count = self._count
+            base, tail, base_count = self._base, self._tail, self._base_count
+            assign, centroids, ids = self._assign, self._centroids, self._ids
+            mask = self._live[:count].copy()
+            for field, value in (filters or {}).items():
+                if field not in self._codes:
+                    raise ValueError(f"Unsupported filter field: {field}")
+                values = value if isinstance(value, (list, tuple, set)) else [value]
+                codes = [self._vocab_index[field][str(v)] for v in values if str(v) in self._vocab_index[field]]
+                mask &= np.isin(self._codes[field][:count], codes)
+            for item_id in exclude_ids or ():
+                position = self._positions.get(item_id)
+                if position is not None and position < count:
+                    mask[position] = False
+
+        candidates = np.flatnonzero(mask)
+        mode = 'exact'
+        if centroids is not None and len(candidates) > VECTOR_INDEX_IVF_MIN_ROWS:
+            probes = np.argsort(-(centroids @ query))[:VECTOR_INDEX_NPROBE]
+            probed = candidates[np.isin(assign[candidates], probes)]
+            if len(probed) >= k:
+                candidates, mode = probed, 'ivf'
+
+        scores = np.empty(len(candidates), dtype=np.float32)
+        for chunk_start in range(0, len(candidates), SCORE_CHUNK_ROWS):
+            positions = candidates[chunk_start:chunk_start + SCORE_CHUNK_ROWS]
+            scores[chunk_start:chunk_start + len(positions)] = self._rows(base, tail, base_count, positions) @ query
+
+        k = min(k, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k] if k else np.zeros(0, dtype=np.int64)
+        top = top[np.argsort(-scores[top])]
+        hits = [(ids[candidates[i]], float(scores[i])) for i in top]
+        return hits, {'mode': mode, 'scanned': int(len(candidates)), 'index_size': count}
+
+    def vector(self, item_id):
+        with self._lock:
+            position = self._positions.get(item_id)
+            if position is None:
+                return None
+            return self._rows(self._base, self._tail, self._base_count, np.array([position]))[0]
+
+    # Mongo sync
+
+    def _sync_since(self):
+        """updated_at to resume from, or None for a full build."""
+        if not self.sync_position:
+            return None
+        if ObjectId.is_valid(self.sync_position):
+            # Indexes saved before syncing on updated_at kept the last ObjectId read
+            return ObjectId(self.sync_position).generation_time
+        return datetime.fromisoformat(self.sync_position)
+
+    def sync(self, collection, id_field, vector_field='embedding', batch_size=1000):
+        """Apply documents written or updated since the last sync; returns the number of changed rows.
+
+        Documents are read in updated_at order, so an updated vector replaces
+        the old row and a cleared one removes it. Deleted documents are not
+        seen here and must be passed to remove().
+        """
+        if not self._sync_lock.acquire(blocking=False):
+            return 0  # Another thread is already syncing
+        try:
+            since = self._sync_since()
+            if since is None:
+                query = {vector_field: {'$type': VECTOR_BSON_TYPES}}
+            else:
+                query = {'updated_at': {'$gte': since - SYNC_SLACK}}
+            projection = {'_id': 0, id_field: 1, vector_field: 1, 'updated_at': 1}
+            projection.update({field: 1 for field in self.filter_fields})
+
+            changed = 0
+            batch = []
+            last_updated = None
+            for doc in collection.find(query, projection).sort('updated_at', 1).batch_size(batch_size):
+                batch.append((doc.get(id_field), doc.get(vector_field), doc))
+                if isinstance(doc.get('updated_at'), datetime):
+                    last_updated = doc['updated_at']
+                if len(batch) >= batch_size:
+                    changed += self.add(batch)
+                    batch = []
+            changed += self.add(batch)
+            if last_updated is not None:
+                self.sync_position = last_updated.isoformat()
+            self._last_sync = time.monotonic()
+            if changed:
+                logger.info("Synced %s changed vectors into %s index (%s live)", changed, self.name, len(self))
+            self.maybe_save()
+            return changed
+        finally:
+            self._sync_lock.release()
+
+    def ensure_synced(self, collection, id_field, vector_field='embedding'):
+        if time.monotonic() - self._last_sync >= VECTOR_INDEX_SYNC_INTERVAL:
+            self.sync(collection, id_field, vector_field)
+
+    # Persistence
+
+    def _manifest_path(self):
+        return os.path.join(self.root, f"{self.name}.npz")
+
+    def load(self):
+        """Map a previously saved index; returns False when there is none (or it is unreadable)."""
+        path = self._manifest_path()
+        if not os.path.exists(path):
+            return False
+        try:
+            with np.load(path) as data:
+                count = int(data['count'])
+                dim = int(data['dim'])
+                vectors_file = str(data['vectors_file'])
+                base = np.memmap(os.path.join(self.root, vectors_file), dtype=np.float32,
+                                 mode='r', shape=(count, dim))
+                ids = [str(i) for i in data['ids']]
+                live = data['live'].astype(bool) if 'live' in data else np.ones(count, dtype=bool)
+                codes = {f: data[f'codes_{f}'].astype(np.int32) for f in self.filter_fields}
+                vocab = {f: [str(v) for v in data[f'vocab_{f}']] for f in self.filter_fields}
+                centroids = data['centroids'] if data['centroids'].size else None
+                assign = data['assign'].astype(np.int32)
+                trained_count = int(data['trained_count'])
+                sync_position = str(data['sync_position']) or None
+        except Exception as e:
+            logger.warning("Could not load %s vector index, rebuilding from Mongo: %s", self.name, e)
+            return False
+
+        with self._lock:
+            self.dim = dim
+            self._count = self._base_count = count
+            self._base = base
+            self._tail = None
+            self._vectors_file = vectors_file
+            self._ids = ids
+            self._live = live
+            self._deleted = int(count - live.sum())
+            self._positions = {item_id: i for i, item_id in enumerate(ids) if live[i]}
+            self._layout += 1
+            self._codes = codes
+            self._vocab = vocab
+            self._vocab_index = {f: {v: i for i, v in enumerate(vocab[f])} for f in self.filter_fields}
+            self._centroids = centroids
+            self._assign = assign
+            self._trained_count = trained_count
+            self.sync_position = sync_position
+            self._dirty = False
+        logger.info("Loaded %s vector index with %s rows", self.name, len(self._positions))
+        return True
+
+    def maybe_save(self):
+        if self._dirty and time.monotonic() - self._last_save >= VECTOR_INDEX_SAVE_INTERVAL:
+            self.save()
+
+    def save(self):
+        """Write the live vectors and manifest atomically; other processes' saves are serialised by a file lock.
+
+        Tombstoned rows are left out, so row positions change: rows added or
+        removed while the file is written are carried over when it is mapped.
+        """
+        with self._lock:
+            if not self._dirty or not self._count:
+                return False
+            count, dim = self._count, self.dim
+            base, tail, base_count = self._base, self._tail, self._base_count
+            keep = np.flatnonzero(self._live[:count])
+            kept = len(keep)
+            if not kept:
+                return False
+            manifest = {
+                'count': kept,
+                'dim': dim,
+                'ids': np.array([self._ids[i] for i in keep], dtype=str),
+                'live': np.ones(kept, dtype=bool),
+                'centroids': self._centroids if self._centroids is not None else np.zeros((0, dim), dtype=np.float32),
+                'assign': self._assign[keep],
+                'trained_count': self._trained_count,
+                'sync_position': self.sync_position or '',
+            }
+            for field in self.filter_fields:
+                manifest[f'codes_{field}'] = self._codes[field][keep]
+                manifest[f'vocab_{field}'] = np.array(self._vocab[field], dtype=str)
+            self._dirty = False
+            self._last_save = time.monotonic()
+
+        os.makedirs(self.root, exist_ok=True)
+        vectors_file = f"{self.name}.{uuid.uuid4().hex[:12]}.f32"
+        manifest['vectors_file'] = vectors_file
+        try:
+            with open(os.path.join(self.root, f"{self.name}.lock"), 'w') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                mapped = np.memmap(os.path.join(self.root, vectors_file), dtype=np.float32,
+                                   mode='w+', shape=(kept, dim))
+                for chunk_start in range(0, kept, SCORE_CHUNK_ROWS):
+                    positions = keep[chunk_start:chunk_start + SCORE_CHUNK_ROWS]
+                    mapped[chunk_start:chunk_start + len(positions)] = self._rows(base, tail, base_count, positions)
+                mapped.flush()
+                del mapped
+                tmp_path = self._manifest_path() + '.tmp.npz'
+                np.savez(tmp_path, **manifest)
+                os.replace(tmp_path, self._manifest_path())
+                for old in glob.glob(os.path.join(self.root, f"{self.name}.*.f32")):
+                    if os.path.basename(old) != vectors_file:
+                        os.remove(old)  # Open maps of it stay valid until unmapped
+        except Exception as e:
+            logger.error("Failed to save %s vector index: %s", self.name, e)
+            with self._lock:
+                self._dirty = True
+            return False
+
+        with self._lock:
+            # Saved rows become the new base; rows added while saving stay in a fresh tail after it
+            added = np.arange(count, self._count)
+            rows = np.concatenate([keep, added])
+            new_tail = np.zeros((max(len(added), 1024), dim), dtype=np.float32)
+            if len(added):
+                new_tail[:len(added)] = self._rows(self._base, self._tail, self._base_count, added)
+            capacity = max(len(rows), 1024)
+            self._live = _grow(self._live[rows], capacity)
+            self._assign = _grow(self._assign[rows], capacity)
+            for field in self.filter_fields:
+                self._codes[field] = _grow(self._codes[field][rows], capacity)
+            self._ids = [self._ids[i] for i in rows]
+            self._positions = {item_id: i for i, item_id in enumerate(self._ids) if self._live[i]}
+            self._deleted = len(rows) - len(self._positions)
+            self._count = len(rows)
+            self._base = np.memmap(os.path.join(self.root, vectors_file), dtype=np.float32,
+                                   mode='r', shape=(kept, dim))
+            self._base_count = kept
+            self._tail = new_tail
+            self._vectors_file = vectors_file
+            if kept < count:
+                self._layout += 1  # Rows moved, so an IVF fit running on the old positions is void
+            if self._deleted:
+                self._dirty = True  # Rows removed while saving are still tombstones on disk
+        logger.info("Saved %s vector index with %s rows", self.name, kept)
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'name': self.name,
+                'rows': len(self._positions),
+                'deleted_rows': self._deleted,
+                'dimensions': self.dim,
+                'mapped_rows': self._base_count,
+                'ivf_lists': 0 if self._centroids is None else len(self._centroids),
+                'trained_rows': self._trained_count,
+                'filter_fields': list(self.filter_fields),
+                'sync_position': self.sync_position,
+            }
@@ -98,6 +98,11 @@ function mapApiBugToBug(apiBug: any): Bug {
   };
 }
 
+// Stored images come back as API download paths; data URLs are passed through
+function resolveImageUrl(image: string): string {
+  return image.startsWith('/') ? `${apiClient.defaults.baseURL || ''}${image}` : image;
+}
+
 // Helper function to map API response to BugFix interface
 function mapApiBugFixToBugFix(apiBugFix: any): BugFix {
   return {
@@ -108,7 +113,7 @@ function mapApiBugFixToBugFix(apiBugFix: any): BugFix {
     fix_status: apiBugFix.fix_status,
     created_at: apiBugFix.created_at,
     updated_at: apiBugFix.updated_at,
-    images: apiBugFix.images || []
+    images: (apiBugFix.images || []).map(resolveImageUrl)
   };
 }
 